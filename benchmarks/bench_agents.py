@@ -0,0 +1,98 @@
+"""
+Drive the prod SocialAgent path against the local LLM stub and report latency,
+throughput, retries and schema failures.
+
+    python -m benchmarks.bench_agents --requests 200 --concurrency 16 \
+        --latency lognormal:-0.7,0.5 --rate-limit-p 0.05
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PERCEPTION_PROFILE = {
+    "media_id": 1,
+    "faces": [{"gender": "female", "age": 27, "expression": "smiling"}],
+    "posture": [{"alignment_score": 8.1, "tips": ["Relax shoulders"]}],
+    "fashion": [{"type": "jacket", "score": 0.91, "dominant_color": "#1f2a44"}],
+    "environment": {"objects": [{"label": "person", "score": 0.98}]},
+    "summaries": {"posture_grade": "Excellent", "overall_score": 8},
+}
+
+
+def _start_stub(port: int, args) -> object:
+    import uvicorn
+    from benchmarks.llm_stub import create_app
+
+    app = create_app(
+        mode="replay",
+        cassette_path=args.cassette,
+        latency=args.latency,
+        rate_limit_p=args.rate_limit_p,
+        rpm=args.rpm,
+        seed=args.seed,
+    )
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return app
+
+
+def _pct(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--cassette", default="benchmarks/cassettes/llm.jsonl")
+    parser.add_argument("--latency", default="lognormal:-0.7,0.5")
+    parser.add_argument("--rate-limit-p", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=0)
+    parser.add_argument("--seed", default="bench")
+    parser.add_argument("--distinct", type=int, default=10, help="distinct prompts (cache/replay key spread)")
+    args = parser.parse_args()
+
+    os.environ["LIFEMIRROR_MODE"] = "prod"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+    app = _start_stub(args.port, args)
+
+    from src.agents.social_agent import SocialAgent
+    from src.agents.base_agent import AgentInput
+
+    def one(i):
+        profile = {**PERCEPTION_PROFILE, "media_id": i % args.distinct}
+        t0 = time.perf_counter()
+        res = SocialAgent().run(AgentInput(media_id=str(i), data={"perception_data": profile}))
+        return time.perf_counter() - t0, res
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(one, range(args.requests)))
+    wall = time.perf_counter() - t0
+
+    latencies = [lat for lat, _ in results]
+    failures = [res.error for _, res in results if not res.success]
+    stats = app.state.stats.snapshot()
+
+    print(f"requests={args.requests} concurrency={args.concurrency} wall={wall:.2f}s "
+          f"throughput={args.requests / wall:.1f}/s")
+    print(f"latency p50={_pct(latencies, .5):.3f}s p95={_pct(latencies, .95):.3f}s "
+          f"p99={_pct(latencies, .99):.3f}s mean={statistics.mean(latencies):.3f}s")
+    print(f"agent failures={len(failures)} stub={stats}")
+    for err in sorted(set(failures))[:5]:
+        print(f"  failure: {err[:200]}")
+
+
+if __name__ == "__main__":
+    main()
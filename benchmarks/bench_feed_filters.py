@@ -0,0 +1,117 @@
+"""
+Rows fetched per returned feed item with min_percentile filtered in Python after LIMIT
+(old behaviour, emulated by paging until the page is full) vs in SQL (current).
+
+"fetched" counts rows sent to the application; "read" counts media rows Postgres
+actually read to produce them (seq_tup_read + idx_tup_fetch from
+pg_stat_xact_user_tables, diffed around each page), which is where a filter that
+Postgres has to skip rows for shows up.
+
+Reuses the seeded `bench_media` schema from bench_media_lookup:
+
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_feed_filters \
+        --media 1000000 --users 20000 --pages 50 --min-percentile 90
+"""
+import argparse
+import os
+import statistics
+import time
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.bench_media_lookup import _engine, seed
+
+FEED_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_media_feed_newest ON media (created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_media_feed_highest ON media "
+    "((COALESCE(((metadata -> 'social' -> 'percentile' ->> 'overall')::numeric), -1)) DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_media_social_percentile ON media "
+    "(((metadata -> 'social' -> 'percentile' ->> 'overall')::numeric) DESC NULLS LAST)",
+]
+
+
+READ_SQL = text(
+    "SELECT COALESCE(seq_tup_read, 0) + COALESCE(idx_tup_fetch, 0) "
+    "FROM pg_stat_xact_user_tables WHERE relname = 'media'"
+)
+
+
+def rows_read(db) -> int:
+    """Media rows read so far in the current transaction."""
+    return db.execute(READ_SQL).scalar() or 0
+
+
+def python_filtered_page(agent, limit, min_percentile, sort_by, cursor):
+    """Old behaviour: fetch `limit` rows, drop those under min_percentile, fetch again until full."""
+    items, fetched = [], 0
+    while len(items) < limit:
+        page = agent.get_feed_page(limit=limit, sort_by=sort_by, cursor=cursor)
+        fetched += limit
+        for it in page["items"]:
+            pct = (it["perception"].get("percentile") or {}).get("overall")
+            if pct is not None and pct >= min_percentile:
+                items.append(it)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    return items[:limit], fetched, cursor
+
+
+def sql_filtered_page(agent, limit, min_percentile, sort_by, cursor):
+    page = agent.get_feed_page(limit=limit, sort_by=sort_by, min_percentile=min_percentile, cursor=cursor)
+    # Every row sent back is returned; what the filter skipped is only visible in rows_read
+    return page["items"], len(page["items"]), page["next_cursor"]
+
+
+def run(Session, fn, pages, limit, min_percentile, sort_by):
+    from src.agents.public_feed_agent import PublicFeedAgent
+
+    returned = fetched = read = 0
+    latencies = []
+    cursor = None
+    with Session() as db:  # one transaction, so the pg_stat_xact counters keep accumulating
+        agent = PublicFeedAgent(db)
+        agent.mock_mode = False
+        for _ in range(pages):
+            before = rows_read(db)
+            t0 = time.perf_counter()
+            items, n_fetched, cursor = fn(agent, limit, min_percentile, sort_by, cursor)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            read += rows_read(db) - before
+            returned += len(items)
+            fetched += n_fetched
+            if cursor is None:
+                break
+    return returned, fetched, read, statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--media", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--blob-kb", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--min-percentile", type=int, default=90)
+    args = parser.parse_args()
+
+    engine = _engine(os.environ["DATABASE_URL"])
+    seed(engine, args.media, args.users, args.blob_kb)
+    with engine.begin() as conn:
+        for ddl in FEED_INDEXES:
+            conn.execute(text(ddl))
+        conn.execute(text("ANALYZE media"))
+    Session = sessionmaker(bind=engine)
+
+    print(f"min_percentile={args.min_percentile}, {args.pages} pages of {args.limit}")
+    for sort_by in ("newest", "highest"):
+        for label, fn in (("python filter", python_filtered_page), ("sql filter", sql_filtered_page)):
+            returned, fetched, read, p50 = run(Session, fn, args.pages, args.limit, args.min_percentile, sort_by)
+            per_item = (lambda n: n / returned if returned else float("inf"))
+            print(f"  {sort_by:<8} {label:<14} returned {returned:6d}  fetched {fetched:7d}  read {read:9d}  "
+                  f"fetched/item {per_item(fetched):6.2f}  read/item {per_item(read):8.2f}  page p50 {p50:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
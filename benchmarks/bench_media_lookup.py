@@ -0,0 +1,156 @@
+"""
+Latest/recent media lookups at scale: the old full-row ORM queries vs the projected
+queries in src.db.media_repository, with and without idx_media_user_created.
+
+Seeds an isolated `bench_media` schema in DATABASE_URL (Postgres) once, then times
+random users' lookups:
+
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_media_lookup \
+        --media 1000000 --users 20000 --blob-kb 4 --iterations 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+SCHEMA = "bench_media"
+SEED_CHUNK = 100_000
+
+
+def _engine(url: str):
+    return create_engine(url, connect_args={"options": f"-csearch_path={SCHEMA}"})
+
+
+def seed(engine, n_media: int, n_users: int, blob_kb: int):
+    from src.db.models import Base, Media, User
+
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}"))
+        # media's search_text index uses gin_trgm_ops (migration 022)
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    Base.metadata.create_all(engine, tables=[User.__table__, Media.__table__])
+
+    with engine.begin() as conn:
+        # The index is toggled per run below
+        conn.execute(text("DROP INDEX IF EXISTS idx_media_user_created"))
+        have = conn.execute(text("SELECT count(*) FROM media")).scalar()
+        if have >= n_media:
+            print(f"Reusing {have} seeded media rows")
+            return
+        conn.execute(text("TRUNCATE media, users CASCADE"))
+        conn.execute(text("""
+            INSERT INTO users (id, email, opt_in_public_analysis, is_active)
+            SELECT gen_random_uuid(), 'bench' || g || '@example.com', g % 2 = 0, true
+            FROM generate_series(1, :n) g
+        """), {"n": n_users})
+
+    for start in range(0, n_media, SEED_CHUNK):
+        stop = min(start + SEED_CHUNK, n_media)
+        with engine.begin() as conn:
+            conn.execute(text("""
+                WITH u AS (SELECT array_agg(id) AS ids FROM users)
+                INSERT INTO media (id, user_id, storage_url, mime, created_at, metadata)
+                SELECT
+                    gen_random_uuid(),
+                    u.ids[1 + (g % array_length(u.ids, 1))],
+                    's3://bench/' || g,
+                    'image/jpeg',
+                    now() - random() * interval '365 days',
+                    jsonb_build_object(
+                        'social', jsonb_build_object(
+                            'social_score', round((random() * 10)::numeric, 2),
+                            'tags', '["confident", "warm"]'::jsonb,
+                            'percentile', jsonb_build_object('overall', (random() * 100)::int)
+                        ),
+                        'objects', repeat('x', :blob)
+                    )
+                FROM generate_series(:start, :stop - 1) g, u
+            """), {"start": start, "stop": stop, "blob": blob_kb * 1024})
+        print(f"Seeded {stop}/{n_media} media")
+
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE users"))
+        conn.execute(text("ANALYZE media"))
+
+
+def legacy_latest(db, user_id):
+    from src.db.models import Media
+    return db.query(Media).filter(Media.user_id == user_id).order_by(Media.created_at.desc()).first()
+
+
+def legacy_recent(db, user_id):
+    from src.db.models import Media
+    rows = db.query(Media).filter(Media.user_id == user_id).order_by(Media.created_at.desc()).limit(5).all()
+    return [m.metadata.get("social") for m in rows if m.metadata and "social" in m.metadata]
+
+
+def repo_latest(db, user_id):
+    from src.db.media_repository import latest_media
+    return latest_media(db, user_id)
+
+
+def repo_recent(db, user_id):
+    from src.db.media_repository import recent_media
+    return [r.social for r in recent_media(db, user_id, 5, with_key="social")]
+
+
+CASES = [
+    ("latest  full row", legacy_latest),
+    ("latest  projected", repo_latest),
+    ("recent5 full row", legacy_recent),
+    ("recent5 projected", repo_recent),
+]
+
+
+def time_case(Session, fn, user_ids, iterations: int):
+    samples = []
+    with Session() as db:
+        for _ in range(iterations):
+            uid = random.choice(user_ids)
+            t0 = time.perf_counter()
+            fn(db, uid)
+            samples.append((time.perf_counter() - t0) * 1000)
+            db.expunge_all()
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--media", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--blob-kb", type=int, default=4, help="padding per metadata blob")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    engine = _engine(os.environ["DATABASE_URL"])
+    seed(engine, args.media, args.users, args.blob_kb)
+    Session = sessionmaker(bind=engine)
+
+    with engine.connect() as conn:
+        user_ids = list(conn.execute(text("SELECT id FROM users")).scalars())
+
+    for indexed in (False, True):
+        with engine.begin() as conn:
+            if indexed:
+                conn.execute(text("CREATE INDEX IF NOT EXISTS idx_media_user_created ON media (user_id, created_at DESC)"))
+                conn.execute(text("ANALYZE media"))
+            else:
+                conn.execute(text("DROP INDEX IF EXISTS idx_media_user_created"))
+
+        # Fewer iterations without the index: every lookup is a sequential scan
+        iterations = args.iterations if indexed else max(10, args.iterations // 100)
+        print(f"\n{'with' if indexed else 'without'} idx_media_user_created ({iterations} lookups per case)")
+        for label, fn in CASES:
+            p50, p95 = time_case(Session, fn, user_ids, iterations)
+            print(f"  {label:<20} p50 {p50:8.2f} ms   p95 {p95:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
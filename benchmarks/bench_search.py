@@ -0,0 +1,86 @@
+"""
+Public feed search latency: the old alias/metadata ILIKE (join + JSON text cast per row)
+vs the trigram-indexed media.search_text, for random alias fragments.
+
+Reuses the seeded `bench_media` schema from bench_media_lookup, gives users aliases and
+backfills search_text once:
+
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_search \
+        --media 1000000 --users 20000 --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+from sqlalchemy import text
+
+from benchmarks.bench_media_lookup import _engine, seed
+from src.services.search import MEDIA_SEARCH_TEXT_SQL
+
+LEGACY_SQL = text("""
+    SELECT m.id FROM media m JOIN users u ON u.id = m.user_id
+    WHERE u.opt_in_public_analysis
+      AND (u.public_alias ILIKE :q OR (m.metadata -> 'social' ->> 'tags') ILIKE :q)
+    ORDER BY m.created_at DESC, m.id DESC LIMIT 20
+""")
+
+TRGM_SQL = text("""
+    SELECT m.id FROM media m JOIN users u ON u.id = m.user_id
+    WHERE u.opt_in_public_analysis AND m.search_text ILIKE :q
+    ORDER BY word_similarity(:raw, m.search_text) DESC, m.id DESC LIMIT 20
+""")
+
+
+def prepare(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(text("ALTER TABLE media ADD COLUMN IF NOT EXISTS search_text TEXT"))
+        conn.execute(text("UPDATE users SET public_alias = substr(md5(id::text), 1, 8) WHERE public_alias IS NULL"))
+        conn.execute(text(f"""
+            UPDATE media SET search_text = {MEDIA_SEARCH_TEXT_SQL.format(alias='u.public_alias')}
+            FROM users u WHERE u.id = media.user_id AND media.search_text IS NULL
+        """))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_media_search_trgm ON media USING GIN (search_text gin_trgm_ops)"))
+        conn.execute(text("ANALYZE media"))
+        return list(conn.execute(text("SELECT public_alias FROM users WHERE opt_in_public_analysis")).scalars())
+
+
+def time_queries(engine, sql, fragments):
+    samples = []
+    with engine.connect() as conn:
+        for frag in fragments:
+            t0 = time.perf_counter()
+            conn.execute(sql, {"q": f"%{frag}%", "raw": frag}).all()
+            samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--media", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--blob-kb", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    engine = _engine(os.environ["DATABASE_URL"])
+    seed(engine, args.media, args.users, args.blob_kb)
+    aliases = prepare(engine)
+    fragments = []
+    for alias in random.sample(aliases, args.queries):
+        start = random.randint(0, 3)
+        fragments.append(alias[start:start + 5])
+
+    # The legacy query scans every row; a handful of queries is enough to see it
+    for label, sql, n in (("legacy ilike", LEGACY_SQL, max(5, args.queries // 20)), ("trigram", TRGM_SQL, args.queries)):
+        p50, p95 = time_queries(engine, sql, fragments[:n])
+        print(f"  {label:<14} {n:4d} queries  p50 {p50:8.2f} ms   p95 {p95:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Social graph ranking: exact TagIndex vs the MinHash/LSH shortlist re-ranked exactly,
+on a synthetic public population with Zipf-distributed tags (a few very common ones).
+Reports recall@5 of the similar list against the exact result and per-query latency.
+No database needed:
+
+    python -m benchmarks.bench_social_rank --users 300000 --queries 200
+"""
+import argparse
+import random
+import statistics
+import time
+
+import numpy as np
+
+from src.agents.social_graph_agent import SocialGraphAgent
+from src.services.minhash import MinHashLSH, signature
+from src.services.tag_index import TagIndex
+
+
+def population(rng, n_users, n_tags):
+    weights = 1.0 / np.arange(1, n_tags + 1)
+    weights /= weights.sum()
+    np_rng = np.random.default_rng(rng.randint(0, 2**31))
+    users = []
+    for i in range(n_users):
+        k = rng.randint(1, 5)
+        tags = sorted({f"tag{t}" for t in np_rng.choice(n_tags, size=k, p=weights)})
+        users.append({"user_id": f"u{i}", "alias": f"User {i}", "score": rng.randint(20, 95),
+                      "tags": tags, "media_id": f"m{i}"})
+    return users
+
+
+def timed(fn, queries):
+    samples, results = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        results.append(fn(*q))
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return results, statistics.median(samples), samples[max(0, int(len(samples) * 0.95) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=300_000)
+    parser.add_argument("--tags", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    users = population(rng, args.users, args.tags)
+    t0 = time.perf_counter()
+    index = TagIndex.from_entries(users)
+    print(f"  tag index build  {time.perf_counter() - t0:8.2f} s")
+    t0 = time.perf_counter()
+    lsh = MinHashLSH()
+    for u in users:
+        lsh.add(u["user_id"], signature(u["tags"]))
+    print(f"  lsh build        {time.perf_counter() - t0:8.2f} s  ({len(lsh)} signatures)")
+
+    queries = [(u["score"], u["tags"], index, u["user_id"]) for u in rng.sample(users, args.queries)]
+    exact, p50, p95 = timed(SocialGraphAgent._rank_users, queries)
+    print(f"  exact            p50 {p50:8.2f} ms   p95 {p95:8.2f} ms")
+
+    index.lsh = lsh
+    approx, p50, p95 = timed(SocialGraphAgent._rank_users, queries)
+    index.lsh = None
+
+    def value(q, u):
+        return round(0.7 * SocialGraphAgent._jaccard(q[1], u["tags"]) + 0.3 * (1 - abs(q[0] - u["score"]) / 100), 9)
+
+    # Ties make ids ambiguous, so recall compares the ranked values
+    hits = total = 0
+    for q, (ex_sim, _), (ap_sim, _) in zip(queries, exact, approx):
+        expected = [value(q, u) for u in ex_sim]
+        got = [value(q, u) for u in ap_sim]
+        for v in got:
+            if v in expected:
+                expected.remove(v)
+                hits += 1
+        total += len(ex_sim)
+    print(f"  lsh + re-rank    p50 {p50:8.2f} ms   p95 {p95:8.2f} ms   recall@5 {hits / max(1, total):.3f}")
+
+
+if __name__ == "__main__":
+    main()
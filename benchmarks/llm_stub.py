@@ -0,0 +1,267 @@
+"""
+OpenAI-compatible record/replay stub for benchmarking the prod agent code path offline.
+
+    # record real responses once (needs OPENAI_API_KEY)
+    STUB_MODE=record uvicorn --factory benchmarks.llm_stub:create_app --port 8089
+    # replay them, with simulated latency and 429s
+    STUB_MODE=replay STUB_LATENCY=lognormal:-0.5,0.4 STUB_RATE_LIMIT_P=0.05 \
+        uvicorn --factory benchmarks.llm_stub:create_app --port 8089
+
+Point the agents at it with OPENAI_BASE_URL=http://localhost:8089/v1 and LIFEMIRROR_MODE=prod.
+Responses are keyed by a hash of (model, messages, response_format). Every response is
+validated against the output schema of the agent that sent it (matched by system prompt);
+counters are served at GET /stub/stats.
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+
+STUB_MODE = os.getenv("STUB_MODE", "replay")  # replay | record
+STUB_CASSETTE = os.getenv("STUB_CASSETTE", "benchmarks/cassettes/llm.jsonl")
+STUB_ON_MISS = os.getenv("STUB_ON_MISS", "synthesize")  # synthesize | error
+STUB_LATENCY = os.getenv("STUB_LATENCY", "fixed:0")
+STUB_RATE_LIMIT_P = float(os.getenv("STUB_RATE_LIMIT_P", "0"))
+STUB_RPM = int(os.getenv("STUB_RPM", "0"))  # 0 = unlimited
+STUB_SEED = os.getenv("STUB_SEED")
+UPSTREAM_BASE_URL = os.getenv("STUB_UPSTREAM_BASE_URL", "https://api.openai.com/v1")
+
+
+def request_key(body: Dict[str, Any]) -> str:
+    canonical = {
+        "model": body.get("model"),
+        "messages": body.get("messages"),
+        "response_format": body.get("response_format"),
+    }
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+class LatencyModel:
+    """
+    Parses "fixed:S", "uniform:LO,HI", "normal:MEAN,STD" or "lognormal:MU,SIGMA" (seconds).
+    """
+
+    def __init__(self, spec: str, rng: random.Random):
+        kind, _, args = spec.partition(":")
+        self.kind = kind
+        self.args = [float(a) for a in args.split(",") if a]
+        self.rng = rng
+
+    def sample(self) -> float:
+        a = self.args
+        if self.kind == "fixed":
+            return a[0] if a else 0.0
+        if self.kind == "uniform":
+            return self.rng.uniform(a[0], a[1])
+        if self.kind == "normal":
+            return max(0.0, self.rng.gauss(a[0], a[1]))
+        if self.kind == "lognormal":
+            return self.rng.lognormvariate(a[0], a[1])
+        raise ValueError(f"Unknown latency model: {self.kind}")
+
+
+class Cassette:
+    """Append-only JSONL store of {key, agent, content} records."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        row = json.loads(line)
+                        self.entries[row["key"]] = row
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(key)
+
+    def put(self, key: str, agent: Optional[str], content: str):
+        row = {"key": key, "agent": agent, "content": content}
+        with self._lock:
+            self.entries[key] = row
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(row) + "\n")
+
+
+def agent_schemas() -> Dict[str, Tuple[str, type]]:
+    """system prompt -> (agent name, schema the LLM output must satisfy)"""
+    from src.agents.social_agent import SocialAgent
+    from src.agents.vibe_compare_agent import VibeComparisonAgent
+    from src.agents.perception_history_agent import PerceptionHistoryAgent
+    from src.agents.fixit_agent import FixitAgent
+    from src.agents.reverse_analysis_agent import ReverseAnalysisAgent
+    from src.agents.vibe_analysis_agent import VibeAnalysisAgent
+
+    out = {}
+    for cls in (SocialAgent, VibeComparisonAgent, PerceptionHistoryAgent,
+                FixitAgent, ReverseAnalysisAgent, VibeAnalysisAgent):
+        out[cls.system_prompt] = (cls.name, getattr(cls, "llm_schema", cls.output_schema))
+    return out
+
+
+def synthesize(schema: type) -> Dict[str, Any]:
+    """Smallest plausible instance of a pydantic model, for cassette misses."""
+    js = schema.model_json_schema()
+    out = {}
+    for name, prop in js.get("properties", {}).items():
+        t = prop.get("type")
+        if t == "string":
+            out[name] = f"stub {name}"
+        elif t in ("integer", "number"):
+            lo = prop.get("minimum", 0)
+            hi = prop.get("maximum", lo + 10)
+            v = (lo + hi) / 2
+            out[name] = int(v) if t == "integer" else v
+        elif t == "array":
+            items = prop.get("items", {})
+            out[name] = [f"stub-{i}" for i in range(3)] if items.get("type") == "string" else []
+        elif t == "object":
+            out[name] = {}
+        else:
+            out[name] = None
+    return out
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def inc(self, key: str, n: int = 1):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + n
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+
+def _completion(body: Dict[str, Any], content: str) -> Dict[str, Any]:
+    return {
+        "id": f"chatcmpl-stub-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content},
+        }],
+        "usage": {
+            "prompt_tokens": math.ceil(len(json.dumps(body.get("messages", []))) / 4),
+            "completion_tokens": math.ceil(len(content) / 4),
+            "total_tokens": 0,
+        },
+    }
+
+
+def _rate_limited(msg: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        headers={"retry-after": "1"},
+        content={"error": {"message": msg, "type": "rate_limit_exceeded", "code": "rate_limit_exceeded"}},
+    )
+
+
+def create_app(
+    mode: str = STUB_MODE,
+    cassette_path: str = STUB_CASSETTE,
+    latency: str = STUB_LATENCY,
+    rate_limit_p: float = STUB_RATE_LIMIT_P,
+    rpm: int = STUB_RPM,
+    on_miss: str = STUB_ON_MISS,
+    seed: Optional[str] = STUB_SEED,
+    schemas: Optional[Dict[str, Tuple[str, type]]] = None,
+) -> FastAPI:
+    rng = random.Random(seed)
+    latency_model = LatencyModel(latency, rng)
+    cassette = Cassette(cassette_path)
+    if schemas is None:
+        schemas = agent_schemas()
+    stats = Stats()
+    window = {"start": time.monotonic(), "n": 0}
+    window_lock = threading.Lock()
+
+    app = FastAPI(title="LifeMirror LLM stub")
+    app.state.stats = stats
+    app.state.cassette = cassette
+
+    def over_rpm() -> bool:
+        if not rpm:
+            return False
+        with window_lock:
+            now = time.monotonic()
+            if now - window["start"] >= 60:
+                window["start"], window["n"] = now, 0
+            window["n"] += 1
+            return window["n"] > rpm
+
+    def validate(agent_schema, content: str) -> bool:
+        if agent_schema is None:
+            return True
+        try:
+            agent_schema[1].model_validate_json(content)
+            return True
+        except ValidationError:
+            stats.inc(f"schema_failures:{agent_schema[0]}")
+            return False
+
+    # Handlers are sync so simulated latency blocks a threadpool worker, like a real upstream call would
+    @app.post("/v1/chat/completions")
+    def chat_completions(body: Dict[str, Any]):
+        stats.inc("requests")
+        if over_rpm():
+            stats.inc("rate_limited")
+            return _rate_limited("Stub RPM limit reached")
+        if rate_limit_p and rng.random() < rate_limit_p:
+            stats.inc("rate_limited")
+            return _rate_limited("Simulated rate limit")
+
+        messages = body.get("messages") or []
+        system = next((m.get("content") for m in messages if m.get("role") == "system"), None)
+        agent_schema = schemas.get(system)
+        key = request_key(body)
+
+        entry = cassette.get(key)
+        if entry is not None:
+            stats.inc("hits")
+            content = entry["content"]
+        elif mode == "record":
+            from openai import OpenAI
+            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=UPSTREAM_BASE_URL)
+            resp = client.chat.completions.create(**body)
+            content = resp.choices[0].message.content
+            cassette.put(key, agent_schema and agent_schema[0], content)
+            stats.inc("recorded")
+        elif on_miss == "synthesize" and agent_schema is not None:
+            stats.inc("synthesized")
+            content = json.dumps(synthesize(agent_schema[1]))
+        else:
+            stats.inc("misses")
+            return JSONResponse(status_code=404, content={"error": {
+                "message": f"No recording for request {key}", "type": "invalid_request_error"
+            }})
+
+        validate(agent_schema, content)
+        delay = latency_model.sample()
+        if delay:
+            time.sleep(delay)
+        return _completion(body, content)
+
+    @app.get("/stub/stats")
+    def get_stats():
+        return stats.snapshot()
+
+    return app
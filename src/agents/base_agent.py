@@ -1,12 +1,14 @@
+from contextlib import contextmanager
 from pydantic import BaseModel
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 from src.utils.tracing import log_trace
 from src.utils.validation import guardrails_validate
 
 class AgentInput(BaseModel):
-    media_id: str
-    url: str
+    media_id: Any = None  # UUID, str or 0 for user-level agents
+    url: Optional[str] = None
     context: Dict[str, Any] = {}
+    data: Dict[str, Any] = {}
 
 class AgentOutput(BaseModel):
     success: bool
@@ -17,6 +19,19 @@ class BaseAgent:
     name = "base"
     output_schema = AgentOutput  # Default schema, override in subclasses
 
+    def __init__(self, db=None):
+        # Callers already inside a unit of work pass their session; otherwise each run opens its own
+        self.db = db
+
+    @contextmanager
+    def session(self):
+        if self.db is not None:
+            yield self.db
+            return
+        from src.db.session import session_scope
+        with session_scope() as db:
+            yield db
+
     @guardrails_validate(AgentInput, AgentOutput)
     def run(self, input: AgentInput) -> AgentOutput:
         raise NotImplementedError
@@ -0,0 +1,18 @@
+from .base_agent import BaseAgent, AgentInput, AgentOutput
+from src.tools.detect_tool import DetectTool
+from src.tools.base import ToolInput
+
+class DetectAgent(BaseAgent):
+    name = "detect_agent"
+    output_schema = AgentOutput
+
+    def run(self, input: AgentInput) -> AgentOutput:
+        res = DetectTool().run(ToolInput(media_id=str(input.media_id), url=input.url))
+
+        if res.success:
+            result = AgentOutput(success=True, data={"detections": res.data.get("detections", [])})
+        else:
+            result = AgentOutput(success=False, data={}, error=res.error)
+
+        self._trace(input.dict(), result.dict())
+        return result
@@ -1,3 +1,6 @@
+from .base_agent import BaseAgent, AgentInput, AgentOutput
+
+
 class FaceAgent(BaseAgent):
     name = "face_agent"
     output_schema = AgentOutput
@@ -3,12 +3,23 @@ import os
 import tempfile
 import requests
 import numpy as np
-import cv2
 from .base_agent import BaseAgent, AgentInput, AgentOutput
 from src.tools.detect_tool import DetectTool
 from src.tools.base import ToolInput
-from src.storage.s3 import upload_file
-from sklearn.cluster import KMeans
+
+cv2 = None
+KMeans = None
+
+
+def _ensure_deps():
+    # Only the prod path crops images; mock mode must import without OpenCV/scikit-learn
+    global cv2, KMeans
+    if cv2 is None:
+        import cv2 as cv_pkg
+        cv2 = cv_pkg
+    if KMeans is None:
+        from sklearn.cluster import KMeans as kmeans_cls
+        KMeans = kmeans_cls
 
 
 # default fashion classes (can be extended)
@@ -78,6 +89,8 @@ class FashionAgent(BaseAgent):
             return result
 
         # Prod mode: call DetectTool
+        from src.storage.s3 import upload_file
+        _ensure_deps()
         tool_in = ToolInput(media_id=input.media_id, url=input.url)
         det_res = DetectTool().run(tool_in)
         if not det_res.success:
@@ -3,9 +3,9 @@ from typing import List, Optional
 from pydantic import BaseModel, Field, ValidationError
 from src.agents.base_agent import BaseAgent, AgentInput, AgentOutput
 from src.services.perception import PerceptionAggregator
-from src.db.session import get_db
 from src.agents.perception_history_agent import PerceptionHistoryAgent
-from src.db.models import Media
+from src.db.media_repository import recent_media
+from src.services.prompt_serializer import serialize_for_agent
 from sqlalchemy.orm import Session
 
 
@@ -18,27 +18,21 @@ class FixitOutput(BaseModel):
 class FixitAgent(BaseAgent):
     name = "fixit_agent"
     output_schema = FixitOutput
+    system_prompt = "You are a perception improvement and personal presentation coach."
 
     def _get_recent_perception(self, db: Session, user_id: int, recent_limit: int = 5):
         """
         Fetch perception data from the last `recent_limit` media items for the user.
         """
-        recent_media = (
-            db.query(Media)
-            .filter(Media.user_id == user_id)
-            .order_by(Media.created_at.desc())
-            .limit(recent_limit)
-            .all()
-        )
+        rows = recent_media(db, user_id, recent_limit, with_key="social")
 
         return [
             {
-                "media_id": m.id,
-                "timestamp": m.created_at.isoformat(),
-                "social": m.metadata.get("social", {})
+                "media_id": r.id,
+                "timestamp": r.created_at.isoformat(),
+                "social": r.social or {}
             }
-            for m in recent_media
-            if m.metadata and "social" in m.metadata
+            for r in rows
         ]
 
     def run(self, input: AgentInput) -> AgentOutput:
@@ -60,16 +54,15 @@ class FixitAgent(BaseAgent):
             return result
 
         # --- PROD MODE ---
-        db = next(get_db())
-
         # Fetch recent perception (last N uploads)
-        recent_perception = self._get_recent_perception(db, user_id, recent_limit=recent_limit)
+        with self.session() as db:
+            recent_perception = self._get_recent_perception(db, user_id, recent_limit=recent_limit)
 
         if not recent_perception:
             return AgentOutput(success=False, data={}, error="No recent perception data found.")
 
         # Get history trends to identify improved areas
-        history_agent = PerceptionHistoryAgent()
+        history_agent = PerceptionHistoryAgent(self.db)
         history_res = history_agent.run(AgentInput(media_id=0, url=None, data={"user_id": user_id}))
         history_data = history_res.data if history_res.success else {}
 
@@ -85,6 +78,7 @@ class FixitAgent(BaseAgent):
             },
             "ignore_areas": list(improved_areas)
         }
+        payload = serialize_for_agent(self.name, filtered_data)
 
         prompt = f"""
         You are a social improvement assistant.
@@ -94,8 +88,8 @@ class FixitAgent(BaseAgent):
         - detailed_plan: a clear paragraph of improvement strategies
         - focus_areas: areas to work on, excluding any in 'ignore_areas'.
 
-        Data:
-        {filtered_data}
+        Data (JSON):
+        {payload.text}
         """
 
         try:
@@ -104,14 +98,14 @@ class FixitAgent(BaseAgent):
             resp = client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[
-                    {"role": "system", "content": "You are a perception improvement and personal presentation coach."},
+                    {"role": "system", "content": self.system_prompt},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.7,
                 response_format={"type": "json_object"}
             )
 
-            raw_json = resp.choices[0].message["content"]
+            raw_json = resp.choices[0].message.content
 
             try:
                 parsed = FixitOutput.model_validate_json(raw_json)
@@ -119,7 +113,7 @@ class FixitAgent(BaseAgent):
                 return AgentOutput(success=False, data={}, error=f"Validation failed: {ve}")
 
             result = AgentOutput(success=True, data=parsed.dict())
-            self._trace(input.dict(), result.dict())
+            self._trace({**input.dict(), "prompt_tokens": payload.tokens}, result.dict())
             return result
 
         except Exception as e:
@@ -1,11 +1,11 @@
+import json
 import os
-from typing import List
-from datetime import datetime
+from typing import List, Optional
 from pydantic import BaseModel, Field, ValidationError
 from src.agents.base_agent import BaseAgent, AgentInput, AgentOutput
-from src.db.session import get_db
-from src.db.models import Media
-from sqlalchemy.orm import Session
+from src.services.history_state import HistoryStateStore
+from src.services.prompt_serializer import serialize_for_agent
+from src.services.llm_batch import BatchRequest, new_custom_id
 
 class PerceptionHistoryOutput(BaseModel):
     trend_summary: str = Field(..., description="Natural language summary of perception changes over time.")
@@ -13,26 +13,17 @@ class PerceptionHistoryOutput(BaseModel):
     improvement_tags: List[str] = Field(..., description="Areas where the user improved.")
     decline_tags: List[str] = Field(..., description="Areas where the user declined.")
 
+class PerceptionHistoryNarrative(BaseModel):
+    """What the LLM returns; score_trend is filled in from the stored history state."""
+    trend_summary: str
+    improvement_tags: List[str]
+    decline_tags: List[str]
+
 class PerceptionHistoryAgent(BaseAgent):
     name = "perception_history_agent"
     output_schema = PerceptionHistoryOutput
-
-    def _fetch_user_media_data(self, db: Session, user_id: int):
-        media_items = (
-            db.query(Media)
-            .filter(Media.user_id == user_id)
-            .order_by(Media.created_at.asc())
-            .all()
-        )
-        history = []
-        for m in media_items:
-            if m.metadata and "social" in m.metadata:
-                history.append({
-                    "timestamp": m.created_at.isoformat(),
-                    "score": m.metadata["social"].get("social_score", None),
-                    "tags": m.metadata["social"].get("tags", [])
-                })
-        return history
+    llm_schema = PerceptionHistoryNarrative
+    system_prompt = "You are a social perception trend analysis assistant."
 
     def run(self, input: AgentInput) -> AgentOutput:
         mode = os.getenv("LIFEMIRROR_MODE", "mock")
@@ -53,46 +44,108 @@ class PerceptionHistoryAgent(BaseAgent):
             return result
 
         # --- PROD MODE ---
-        db = next(get_db())
-        history = self._fetch_user_media_data(db, user_id)
+        with self.session() as db:
+            store = HistoryStateStore(db)
+            state = store.get(user_id) or store.bootstrap(user_id)
+
+            if not state:
+                return AgentOutput(success=False, data={}, error="No history found for user.")
 
-        if not history:
-            return AgentOutput(success=False, data={}, error="No history found for user.")
+            # Nothing new since the last summary: no need to call the LLM at all
+            if state.last_summary and not state.pending:
+                result = AgentOutput(success=True, data={**state.last_summary, "score_trend": list(state.score_series or [])})
+                self._trace(input.dict(), result.dict())
+                return result
+
+            body, payload = self._build_request_body(state)
+            covered = store.pending_ids(state)
+
+        try:
+            from openai import OpenAI
+            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+            resp = client.chat.completions.create(**body)
+
+            raw_json = resp.choices[0].message.content
+            # Separate unit of work so no connection is held while waiting on the LLM
+            with self.session() as db:
+                store = HistoryStateStore(db)
+                result = self._finalize(store, store.get(user_id), raw_json, covered=covered)
+            if result.success:
+                self._trace({**input.dict(), "prompt_tokens": payload.tokens}, result.dict())
+            return result
+
+        except Exception as e:
+            return AgentOutput(success=False, data={}, error=str(e))
+
+    def _build_request_body(self, state):
+        payload = serialize_for_agent(self.name, {
+            "previous_summary": state.last_summary,
+            "stats": HistoryStateStore.stats(state),
+            "new_entries": HistoryStateStore.pending_entries(state),
+        })
 
         prompt = f"""
-        Analyze the following chronological perception history and return a JSON object with:
+        Update a user's perception trend analysis. You get the previous summary (may be null),
+        running statistics over the full history and the entries added since that summary.
+        Return a JSON object with:
         - trend_summary: a short narrative of overall changes
-        - score_trend: list of timestamp→score pairs
         - improvement_tags: areas where user improved
         - decline_tags: areas where user declined
 
-        History data:
-        {history}
+        History data (JSON):
+        {payload.text}
         """
 
+        body = {
+            "model": "gpt-4o-mini",
+            "messages": [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.7,
+            "response_format": {"type": "json_object"}
+        }
+        return body, payload
+
+    def _finalize(self, store: HistoryStateStore, state, raw_json: str, covered=None) -> AgentOutput:
         try:
-            from openai import OpenAI
-            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-            resp = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a social perception trend analysis assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                response_format={"type": "json_object"}
-            )
+            # The score series is maintained incrementally, the LLM only writes the narrative
+            parsed = PerceptionHistoryOutput.model_validate({
+                **json.loads(raw_json), "score_trend": list(state.score_series or [])
+            })
+        except (ValueError, ValidationError) as ve:
+            return AgentOutput(success=False, data={}, error=f"Validation failed: {ve}")
 
-            raw_json = resp.choices[0].message["content"]
+        summary = parsed.dict()
+        store.record_summary(state, {k: v for k, v in summary.items() if k != "score_trend"}, covered=covered)
+        return AgentOutput(success=True, data=summary)
 
-            try:
-                parsed = PerceptionHistoryOutput.model_validate_json(raw_json)
-            except ValidationError as ve:
-                return AgentOutput(success=False, data={}, error=f"Validation failed: {ve}")
+    # --- Batch mode (background refreshes) ---
+    def build_batch_request(self, user_id, media_id) -> Optional[BatchRequest]:
+        """Prepare the history refresh as a batch request instead of calling the LLM now."""
+        with self.session() as db:
+            store = HistoryStateStore(db)
+            state = store.get(user_id) or store.bootstrap(user_id)
+            if not state or (state.last_summary and not state.pending):
+                return None
+            body, _ = self._build_request_body(state)
+            covered = store.pending_ids(state)
 
-            result = AgentOutput(success=True, data=parsed.dict())
-            self._trace(input.dict(), result.dict())
-            return result
+        return BatchRequest(
+            custom_id=new_custom_id(self.name),
+            agent=self.name,
+            media_id=str(media_id),
+            metadata_key="history_summary",
+            body=body,
+            context={"user_id": str(user_id), "pending_ids": covered},
+            # A newer refresh for the user replaces this one while it is still queued
+            dedupe_key=f"{self.name}:{user_id}",
+        )
 
-        except Exception as e:
-            return AgentOutput(success=False, data={}, error=str(e))
+    def apply_batch_result(self, request: BatchRequest, raw_json: str) -> AgentOutput:
+        with self.session() as db:
+            store = HistoryStateStore(db)
+            state = store.get(request.context["user_id"])
+            if not state:
+                return AgentOutput(success=False, data={}, error="No history found for user.")
+            return self._finalize(store, state, raw_json, covered=request.context.get("pending_ids"))
@@ -1,18 +1,91 @@
+import hashlib
 import os
 from sqlalchemy.orm import Session
-from src.db.models import Media, User
-from src.utils.logging import logger
+from src.db.models import LeaderboardEntry, Media, User
+from src.db.expressions import social_percentile, social_tags_contain, feed_highest_key
+from src.services.search import relevance, search_clause, word_similarity
+from src.utils.cursor import InvalidCursor, decode_cursor, next_cursor
 from datetime import datetime, timedelta
 import random
 import uuid
-from sqlalchemy import or_
+from sqlalchemy import tuple_
 
 class PublicFeedAgent:
     def __init__(self, db: Session):
         self.db = db
         self.mock_mode = os.getenv("LIFEMIRROR_MODE") == "mock"
 
-    def get_feed(
+    # sort_by -> keyset sort key (DESC); "random" walks Media.random_key, see _random_page
+    FEED_KEYS = {
+        "newest": Media.created_at,
+        "highest": feed_highest_key,
+        "trending": Media.trending_score,
+    }
+    RANDOM_SEED_MAX = 2 ** 31 - 1
+
+    @staticmethod
+    def _sort_token(sort_by, search_query=None):
+        """
+        What a keyset cursor is bound to. Relevance keys are similarities to one query,
+        so its cursors also carry a hash of the (normalized) query and are rejected for
+        another one, like a cursor from another sort.
+        """
+        if sort_by == "relevance" and search_query:
+            digest = hashlib.sha256(search_query.strip().lower().encode()).hexdigest()[:16]
+            return f"relevance:{digest}"
+        return sort_by
+
+    @staticmethod
+    def _decode_cursor(cursor, sort_by):
+        after_key, after_id = decode_cursor(cursor, sort_by)
+        try:
+            return after_key, uuid.UUID(after_id)
+        except ValueError as e:
+            raise InvalidCursor("Malformed cursor") from e
+
+    def _random_page(self, q, key, id_col, id_of, seed, limit, offset=0, cursor=None):
+        """
+        sort_by=random without ORDER BY random(): rows are visited in (random_key, id)
+        order starting at a pivot derived from the seed and wrapping round at 1.0, as two
+        index range scans. The same seed gives the same order, so next_cursor (bound to
+        the seed) pages through it without repeats. Returns (rows, next_cursor).
+        """
+        pivot = random.Random(seed).random()
+        sort_token = f"random:{seed}"
+        after = None
+        if cursor:
+            after_key, after_id = self._decode_cursor(cursor, sort_token)
+            after = (float(after_key), after_id)  # random_key is a double; str(float) round-trips exactly
+        segments = [key >= pivot, key < pivot]
+        if after is not None and after[0] < pivot:
+            segments = segments[1:]  # the cursor is already past the wrap-around
+
+        rows, skip = [], 0 if cursor else offset
+        for i, bound in enumerate(segments):
+            seg = q.filter(bound)
+            if after is not None and i == 0:
+                seg = seg.filter(tuple_(key, id_col) > tuple_(*after))
+            got = seg.order_by(key, id_col).offset(skip).limit(limit - len(rows)).all()
+            rows.extend(got)
+            if len(rows) >= limit:
+                break
+            # This segment is exhausted; carry whatever offset it did not absorb
+            skip = max(0, skip - seg.count()) if skip and not got else 0
+
+        return rows, next_cursor(sort_token, rows, limit, key_of=lambda r: r.sort_key, id_of=id_of)
+
+    @staticmethod
+    def _search_filter(search_query):
+        """Alias or social tag substring match on the trigram-indexed media.search_text."""
+        return search_clause(Media.search_text, search_query)
+
+    def get_feed(self, limit=20, offset=0, days=None, min_percentile=None, tags=None, search_query=None, sort_by="newest"):
+        return self.get_feed_page(
+            limit=limit, offset=offset, days=days, min_percentile=min_percentile,
+            tags=tags, search_query=search_query, sort_by=sort_by
+        )["items"]
+
+    def get_feed_page(
         self,
         limit=20,
         offset=0,
@@ -20,68 +93,84 @@ class PublicFeedAgent:
         min_percentile=None,
         tags=None,
         search_query=None,
-        sort_by="newest"
+        sort_by="newest",
+        cursor=None,
+        seed=None
     ):
+        """
+        One page of the public feed as {"items", "next_cursor"}. Pass the previous page's
+        next_cursor to continue; with a cursor, offset is ignored and each page is an index
+        range scan regardless of depth. Raises InvalidCursor for a bad/mismatched cursor.
+        sort_by=random also returns the "seed" its order was drawn from; pass it back with
+        the cursor to get the next page of the same shuffle.
+        """
+        if sort_by == "random" and seed is None:
+            seed = random.randint(0, self.RANDOM_SEED_MAX)
+
         if self.mock_mode:
-            return self._mock_feed(
+            items = self._mock_feed(
                 limit=limit,
                 search_query=search_query,
                 min_percentile=min_percentile,
                 tags=tags,
-                sort_by=sort_by
+                sort_by=sort_by,
+                seed=seed
             )
-    
+            page = {"items": items, "next_cursor": None}
+            if sort_by == "random":
+                page["seed"] = seed
+            return page
+
+        if sort_by == "relevance":
+            # Ranked by trigram similarity to the query; without one it is just "newest"
+            key = relevance(Media.search_text, search_query) if search_query else Media.created_at
+        elif sort_by == "random":
+            key = Media.random_key
+        else:
+            key = self.FEED_KEYS.get(sort_by, Media.created_at)
         q = (
-            self.db.query(Media, User)
+            self.db.query(Media, User, key.label("sort_key"))
             .join(User, Media.user_id == User.id)
             .filter(User.opt_in_public_analysis == True)
         )
-    
+
         if days is not None:
             cutoff_date = datetime.utcnow() - timedelta(days=days)
             q = q.filter(Media.created_at >= cutoff_date)
-    
+
         if tags:
-            for tag in tags:
-                q = q.filter(Media.metadata['social']['tags'].astext.contains(tag))
-    
+            q = q.filter(social_tags_contain(tags))
+
+        if sort_by == "trending":
+            # Matches the partial idx_media_trending; media outside the trending window have no score
+            q = q.filter(Media.trending_score.isnot(None))
+
+        if min_percentile is not None:
+            # Same expression as the sort key for "highest", so the filter bounds that index scan
+            pct = feed_highest_key if sort_by == "highest" else social_percentile
+            q = q.filter(pct >= min_percentile)
+
         if search_query:
-            like_query = f"%{search_query}%"
-            q = q.filter(
-                or_(
-                    User.public_alias.ilike(like_query),
-                    Media.metadata['social']['tags'].astext.ilike(like_query)
-                )
-            )
-    
-        # Sorting logic
-        if sort_by == "newest":
-            q = q.order_by(Media.created_at.desc())
-        elif sort_by == "highest":
-            q = q.order_by(Media.metadata['social']['percentile']['overall'].desc().nullslast())
-        elif sort_by == "random":
-            q = q.order_by(func.random())
-        elif sort_by == "trending":
-            # trending = percentile + recency score
-            q = q.order_by(
-                (Media.metadata['social']['percentile']['overall'].cast(Float) +
-                 (100 - func.extract('epoch', now() - Media.created_at) / 3600) * 0.1)
-                .desc().nullslast()
+            q = q.filter(self._search_filter(search_query))
+
+        if sort_by == "random":
+            rows, nxt = self._random_page(
+                q, Media.random_key, Media.id, lambda r: r[0].id, seed, limit, offset=offset, cursor=cursor
             )
         else:
-            q = q.order_by(Media.created_at.desc())
-    
-        q = q.offset(offset).limit(limit)
-        items = q.all()
-    
+            # Sorting logic: (key DESC, id DESC) matches the 018 keyset indexes
+            sort_token = self._sort_token(sort_by, search_query)
+            if cursor:
+                after_key, after_id = self._decode_cursor(cursor, sort_token)
+                q = q.filter(tuple_(key, Media.id) < tuple_(after_key, after_id))
+            else:
+                q = q.offset(offset)
+            rows = q.order_by(key.desc(), Media.id.desc()).limit(limit).all()
+            nxt = next_cursor(sort_token, rows, limit, key_of=lambda r: r.sort_key, id_of=lambda r: r[0].id)
+
         feed = []
-        for media, user in items:
+        for media, user, _ in rows:
             social = media.metadata.get("social") if media.metadata else {}
-            percentile = social.get("percentile", {}).get("overall")
-    
-            if min_percentile is not None and (percentile is None or percentile < min_percentile):
-                continue
-    
             feed.append({
                 "user_id": str(user.id),
                 "alias": user.public_alias or "Anonymous",
@@ -90,77 +179,95 @@ class PublicFeedAgent:
                 "created_at": media.created_at,
                 "perception": social,
             })
-    
-        return feed
+
+        page = {"items": feed, "next_cursor": nxt}
+        if sort_by == "random":
+            page["seed"] = seed
+        return page
 
 
 
-    def get_leaderboard(
+    def get_leaderboard(self, limit=20, offset=0, days=None, search_query=None, sort_by="highest"):
+        return self.get_leaderboard_page(
+            limit=limit, offset=offset, days=days, search_query=search_query, sort_by=sort_by
+        )["items"]
+
+    def get_leaderboard_page(
         self,
         limit=20,
         offset=0,
         days=None,
         search_query=None,
-        sort_by="highest"
+        sort_by="highest",
+        cursor=None,
+        seed=None
     ):
+        """
+        Reads the leaderboard_entries materialization (one row per opted-in user with
+        their latest score, tags and upload), keyset-paginated like the feed.
+        """
+        if sort_by == "random" and seed is None:
+            seed = random.randint(0, self.RANDOM_SEED_MAX)
+
         if self.mock_mode:
-            return self._mock_leaderboard(limit, search_query=search_query, sort_by=sort_by)
-    
-        q = (
-            self.db.query(User, func.max(Media.created_at).label("last_upload"), Media.metadata)
-            .join(Media, Media.user_id == User.id)
-            .filter(User.opt_in_public_analysis == True)
-            .group_by(User.id, Media.metadata)
-        )
-    
+            items = self._mock_leaderboard(limit, search_query=search_query, sort_by=sort_by, seed=seed)
+            page = {"items": items, "next_cursor": None}
+            if sort_by == "random":
+                page["seed"] = seed
+            return page
+
+        E = LeaderboardEntry
+        keys = {"highest": E.score_key, "newest": E.last_upload, "trending": E.trending_key, "random": E.random_key}
+        if sort_by == "relevance":
+            key = relevance(E.search_text, search_query) if search_query else E.score_key
+        else:
+            key = keys.get(sort_by, E.score_key)
+
+        q = self.db.query(E, key.label("sort_key"))
+
         if days is not None:
             cutoff_date = datetime.utcnow() - timedelta(days=days)
-            q = q.filter(Media.created_at >= cutoff_date)
-    
+            q = q.filter(E.last_upload >= cutoff_date)
+
         if search_query:
-            like_query = f"%{search_query}%"
-            q = q.filter(
-                or_(
-                    User.public_alias.ilike(like_query),
-                    Media.metadata['social']['tags'].astext.ilike(like_query)
-                )
-            )
-    
-        # Sorting
-        if sort_by == "highest":
-            q = q.order_by(Media.metadata['social']['percentile']['overall'].desc().nullslast())
-        elif sort_by == "newest":
-            q = q.order_by(func.max(Media.created_at).desc())
-        elif sort_by == "random":
-            q = q.order_by(func.random())
-        elif sort_by == "trending":
-            q = q.order_by(
-                (Media.metadata['social']['percentile']['overall'].cast(Float) +
-                 (100 - func.extract('epoch', now() - func.max(Media.created_at)) / 3600) * 0.1)
-                .desc().nullslast()
+            q = q.filter(search_clause(E.search_text, search_query))
+
+        if sort_by == "random":
+            rows, nxt = self._random_page(
+                q, E.random_key, E.user_id, lambda r: r[0].user_id, seed, limit, offset=offset, cursor=cursor
             )
-    
-        q = q.offset(offset).limit(limit)
-        items = q.all()
-    
-        leaderboard = []
-        for user, last_upload, metadata in items:
-            social = metadata.get("social") if metadata else {}
-            leaderboard.append({
-                "user_id": str(user.id),
-                "alias": user.public_alias or "Anonymous",
-                "percentile": social.get("percentile", {}).get("overall"),
-                "tags": social.get("tags", []),
-                "last_upload": last_upload
-            })
-    
-        return leaderboard
+        else:
+            # Sorting: (key DESC, user_id DESC) matches the leaderboard_entries indexes
+            sort_token = self._sort_token(sort_by, search_query)
+            if cursor:
+                after_key, after_id = self._decode_cursor(cursor, sort_token)
+                q = q.filter(tuple_(key, E.user_id) < tuple_(after_key, after_id))
+            else:
+                q = q.offset(offset)
+            rows = q.order_by(key.desc(), E.user_id.desc()).limit(limit).all()
+            nxt = next_cursor(sort_token, rows, limit, key_of=lambda r: r.sort_key, id_of=lambda r: r[0].user_id)
+
+        leaderboard = [
+            {
+                "user_id": str(e.user_id),
+                "alias": e.alias or "Anonymous",
+                "percentile": e.percentile,
+                "tags": e.tags or [],
+                "last_upload": e.last_upload
+            }
+            for e, _ in rows
+        ]
+
+        page = {"items": leaderboard, "next_cursor": nxt}
+        if sort_by == "random":
+            page["seed"] = seed
+        return page
 
 
     # -----------------------
     # Mock Data Generators
     # -----------------------
-    def _mock_feed(self, limit, search_query=None, min_percentile=None, tags=None, sort_by="newest"):
+    def _mock_feed(self, limit, search_query=None, min_percentile=None, tags=None, sort_by="newest", seed=None):
         mock_aliases = ["Alex", "Sam", "Riya", "Jordan", "Maya", "Omar"]
         mock_tags = [["confident", "stylish"], ["approachable"], ["energetic", "funny"]]
         now = datetime.utcnow()
@@ -197,16 +304,18 @@ class PublicFeedAgent:
         if sort_by == "highest":
             feed.sort(key=lambda x: x["perception"]["percentile"]["overall"], reverse=True)
         elif sort_by == "random":
-            random.shuffle(feed)
+            random.Random(seed).shuffle(feed)
         elif sort_by == "trending":
             feed.sort(key=lambda x: x["perception"]["percentile"]["overall"] + (100 - (now - x["created_at"]).total_seconds() / 3600) * 0.1, reverse=True)
+        elif sort_by == "relevance" and search_query:
+            feed.sort(key=lambda x: word_similarity(search_query, " ".join([x["alias"], *x["perception"]["tags"]])), reverse=True)
         else:  # newest
             feed.sort(key=lambda x: x["created_at"], reverse=True)
     
         return feed[:limit]
 
 
-    def _mock_leaderboard(self, limit, search_query=None, sort_by="highest"):
+    def _mock_leaderboard(self, limit, search_query=None, sort_by="highest", seed=None):
         mock_aliases = ["Alex", "Sam", "Riya", "Jordan", "Maya", "Omar"]
         mock_tags = [["confident", "stylish"], ["approachable"], ["energetic", "funny"]]
         now = datetime.utcnow()
@@ -237,9 +346,14 @@ class PublicFeedAgent:
         elif sort_by == "newest":
             leaderboard.sort(key=lambda x: x["last_upload"], reverse=True)
         elif sort_by == "random":
-            random.shuffle(leaderboard)
+            random.Random(seed).shuffle(leaderboard)
         elif sort_by == "trending":
             leaderboard.sort(key=lambda x: x["percentile"] + (100 - (now - x["last_upload"]).total_seconds() / 3600) * 0.1, reverse=True)
+        elif sort_by == "relevance":
+            if search_query:
+                leaderboard.sort(key=lambda x: word_similarity(search_query, " ".join([x["alias"], *x["tags"]])), reverse=True)
+            else:
+                leaderboard.sort(key=lambda x: x["percentile"], reverse=True)
     
         return leaderboard[:limit]
     
@@ -3,8 +3,8 @@ from typing import List
 from pydantic import BaseModel, Field, ValidationError
 from sqlalchemy.orm import Session
 from src.agents.base_agent import BaseAgent, AgentInput, AgentOutput
-from src.db.session import get_db
-from src.db.models import Media
+from src.db.media_repository import recent_media
+from src.services.prompt_serializer import serialize_for_agent
 from src.agents.perception_history_agent import PerceptionHistoryAgent
 
 
@@ -18,23 +18,17 @@ class ReverseAnalysisOutput(BaseModel):
 class ReverseAnalysisAgent(BaseAgent):
     name = "reverse_analysis_agent"
     output_schema = ReverseAnalysisOutput
+    system_prompt = "You are a perception transformation coach."
 
     def _get_recent_perception(self, db: Session, user_id: int, recent_limit: int = 5):
-        recent_media = (
-            db.query(Media)
-            .filter(Media.user_id == user_id)
-            .order_by(Media.created_at.desc())
-            .limit(recent_limit)
-            .all()
-        )
+        rows = recent_media(db, user_id, recent_limit, with_key="social")
         return [
             {
-                "media_id": m.id,
-                "timestamp": m.created_at.isoformat(),
-                "social": m.metadata.get("social", {})
+                "media_id": r.id,
+                "timestamp": r.created_at.isoformat(),
+                "social": r.social or {}
             }
-            for m in recent_media
-            if m.metadata and "social" in m.metadata
+            for r in rows
         ]
 
     def run(self, input: AgentInput) -> AgentOutput:
@@ -61,14 +55,14 @@ class ReverseAnalysisAgent(BaseAgent):
             return result
 
         # --- PROD MODE ---
-        db = next(get_db())
-        recent_perception = self._get_recent_perception(db, user_id, recent_limit=recent_limit)
+        with self.session() as db:
+            recent_perception = self._get_recent_perception(db, user_id, recent_limit=recent_limit)
 
         if not recent_perception:
             return AgentOutput(success=False, data={}, error="No recent perception data found.")
 
         # Get history to avoid re-suggesting already improved areas
-        history_agent = PerceptionHistoryAgent()
+        history_agent = PerceptionHistoryAgent(self.db)
         history_res = history_agent.run(AgentInput(media_id=0, url=None, data={"user_id": user_id}))
         history_data = history_res.data if history_res.success else {}
         improved_areas = set(history_data.get("improvement_tags", []))
@@ -79,6 +73,7 @@ class ReverseAnalysisAgent(BaseAgent):
             "history_summary": history_data,
             "ignore_areas": list(improved_areas)
         }
+        payload = serialize_for_agent(self.name, filtered_data)
 
         prompt = f"""
         The user wants to achieve the following perception goal:
@@ -90,8 +85,8 @@ class ReverseAnalysisAgent(BaseAgent):
         - Provide a list of things to avoid.
         - Provide a short, clear action plan.
 
-        Data:
-        {filtered_data}
+        Data (JSON):
+        {payload.text}
         """
 
         try:
@@ -100,14 +95,14 @@ class ReverseAnalysisAgent(BaseAgent):
             resp = client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[
-                    {"role": "system", "content": "You are a perception transformation coach."},
+                    {"role": "system", "content": self.system_prompt},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.7,
                 response_format={"type": "json_object"}
             )
 
-            raw_json = resp.choices[0].message["content"]
+            raw_json = resp.choices[0].message.content
 
             try:
                 parsed = ReverseAnalysisOutput.model_validate_json(raw_json)
@@ -115,7 +110,7 @@ class ReverseAnalysisAgent(BaseAgent):
                 return AgentOutput(success=False, data={}, error=f"Validation failed: {ve}")
 
             result = AgentOutput(success=True, data=parsed.dict())
-            self._trace(input.dict(), result.dict())
+            self._trace({**input.dict(), "prompt_tokens": payload.tokens}, result.dict())
             return result
 
         except Exception as e:
@@ -1,7 +1,7 @@
 import os
 from src.agents.base_agent import BaseAgent, AgentInput, AgentOutput
 from src.services.perception import PerceptionAggregator
-from src.db.session import get_db
+from src.services.prompt_serializer import serialize_for_agent
 from pydantic import BaseModel, Field, ValidationError
 from typing import List
 
@@ -13,6 +13,7 @@ class SocialOutput(BaseModel):
 class SocialAgent(BaseAgent):
     name = "social_agent"
     output_schema = SocialOutput
+    system_prompt = "You are a socially intelligent perception analysis assistant."
 
     def run(self, input: AgentInput) -> AgentOutput:
         mode = os.getenv("LIFEMIRROR_MODE", "mock")
@@ -31,12 +32,13 @@ class SocialAgent(BaseAgent):
         if "perception_data" in input.data:
             perception_data = input.data["perception_data"]
         elif "media_id" in input.data:
-            db = next(get_db())
-            agg = PerceptionAggregator(db)
-            perception_data = agg.build_profile(input.data["media_id"])
+            with self.session() as db:
+                perception_data = PerceptionAggregator(db).build_profile(input.data["media_id"])
             if "error" in perception_data:
                 return AgentOutput(success=False, data={}, error=perception_data["error"])
 
+        payload = serialize_for_agent(self.name, perception_data or {})
+
         prompt = f"""
         You are a social perception AI. Given the structured perception data below,
         return a JSON object with:
@@ -44,8 +46,8 @@ class SocialAgent(BaseAgent):
         - tags: list of 3–8 personality/social style tags
         - social_score: float from 0 to 10
 
-        Perception data:
-        {perception_data}
+        Perception data (JSON):
+        {payload.text}
         """
 
         try:
@@ -54,14 +56,14 @@ class SocialAgent(BaseAgent):
             resp = client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[
-                    {"role": "system", "content": "You are a socially intelligent perception analysis assistant."},
+                    {"role": "system", "content": self.system_prompt},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.7,
                 response_format={"type": "json_object"}  # ✅ Force JSON
             )
 
-            raw_json = resp.choices[0].message["content"]
+            raw_json = resp.choices[0].message.content
 
             try:
                 parsed = SocialOutput.model_validate_json(raw_json)  # ✅ Guardrails
@@ -69,7 +71,7 @@ class SocialAgent(BaseAgent):
                 return AgentOutput(success=False, data={}, error=f"Validation failed: {ve}")
 
             result = AgentOutput(success=True, data=parsed.dict())
-            self._trace(input.dict(), result.dict())
+            self._trace({**input.dict(), "prompt_tokens": payload.tokens}, result.dict())
             return result
 
         except Exception as e:
@@ -1,12 +1,17 @@
 import os
 import math
-import random
+import uuid
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 from src.agents.base_agent import BaseAgent, AgentInput, AgentOutput
-from src.db.session import get_db
-from src.db.models import Media, User
+from src.db.models import User
+from src.services.perception_facts import latest_vibe, public_latest_vibes
+from src.services.score_distribution import ScoreDistribution, ScoreDistributionStore, normal_percentile
+from src.services.tag_index import TAG_INDEX_MAX_DELTA, SharedTagIndex, TagIndex
+from src.services.minhash import LSH_SHORTLIST, SOCIAL_GRAPH_LSH, MinHashLSH, signature
+from src.services.social_graph_batch import SOCIAL_GRAPH_PRECOMPUTED, SocialGraphResultStore
+from redis.exceptions import RedisError
 
 
 class SocialGraphOutput(BaseModel):
@@ -25,76 +30,111 @@ class SocialGraphAgent(BaseAgent):
     MIN_PUBLIC_USERS = int(os.getenv("SOCIAL_GRAPH_MIN_PUBLIC_USERS", "25"))
 
     def _latest_vibe_for_user(self, db: Session, user_id: str) -> Optional[Dict[str, Any]]:
-        m = (
-            db.query(Media)
-            .filter(Media.user_id == user_id)
-            .filter(Media.metadata.has_key("vibe_analysis"))  # type: ignore
-            .order_by(Media.created_at.desc())
-            .first()
-        )
-        if not m:
+        return latest_vibe(db, user_id)
+
+    @staticmethod
+    def _baseline_entry(latest: Dict[str, Any]) -> Dict[str, Any]:
+        uid = latest["user_id"]
+        return {
+            "user_id": str(uid),
+            "alias": latest["alias"] or f"User {str(uid)[:8]}",
+            "score": int(round(latest["score"])),
+            "tags": latest["tags"],
+            "media_id": latest["media_id"]
+        }
+
+    def _collect_public_baseline(self, db: Session, exclude_user_id: Optional[str]) -> List[Dict[str, Any]]:
+        return [self._baseline_entry(latest) for latest in public_latest_vibes(db, exclude_user_id=exclude_user_id)]
+
+    def _apply_score_changes(self, db: Session, index: TagIndex, since: int) -> Optional[int]:
+        """
+        Patch the shared index with the users whose score entry changed after `since`:
+        re-read their baseline rows, upsert the public ones and drop the rest. None asks
+        for a full rebuild (change log gap, too many changes, or Redis unavailable).
+        """
+        try:
+            changes = ScoreDistributionStore().changes_since(since)
+        except RedisError:
             return None
-        va = (m.metadata or {}).get("vibe_analysis") or {}
-        score = va.get("vibe_score")
-        tags = va.get("vibe_tags") or []
-        return {"media_id": m.id, "score": score, "tags": tags}
-
-    def _collect_public_baseline(self, db: Session, exclude_user_id: str) -> List[Dict[str, Any]]:
-        pub_users = (
-            db.query(User.id, User.public_alias)
-            .filter(User.opt_in_public_analysis.is_(True))
-            .all()
-        )
-        results = []
-        for uid, alias in pub_users:
-            if str(uid) == str(exclude_user_id):
-                continue
-            latest = self._latest_vibe_for_user(db, uid)
-            if latest and isinstance(latest.get("score"), (int, float)):
-                results.append({
-                    "user_id": str(uid),
-                    "alias": alias or f"User {str(uid)[:8]}",
-                    "score": int(round(latest["score"])),
-                    "tags": latest.get("tags", []),
-                    "media_id": latest["media_id"]
-                })
-        return results
+        if changes is None or len(changes[1]) > TAG_INDEX_MAX_DELTA:
+            return None
+        version, user_ids = changes
+        if user_ids:
+            rows = public_latest_vibes(db, user_ids=[uuid.UUID(u) for u in user_ids])
+            fresh = {e["user_id"]: e for e in map(self._baseline_entry, rows)}
+            for uid in user_ids:
+                entry = fresh.get(uid)
+                if entry is None:
+                    index.remove(uid)
+                    if index.lsh is not None:
+                        index.lsh.remove(uid)
+                else:
+                    index.upsert(entry)
+                    if index.lsh is not None:
+                        index.lsh.add(uid, signature(entry["tags"] or []))
+        return version
 
     @staticmethod
-    def _percentile_from_distribution(value: int, population_scores: List[int]) -> int:
-        if not population_scores:
-            return 50
-        below = sum(1 for s in population_scores if s <= value)
-        return max(1, min(99, int(round(100 * below / len(population_scores)))))
+    def _score_version() -> Optional[int]:
+        try:
+            return ScoreDistributionStore().version()
+        except RedisError:
+            return None
+
+    def _public_index(self, db: Session) -> TagIndex:
+        """Baseline of all public users, shared by requests and refreshed as scores change."""
+        return SharedTagIndex.get(
+            lambda: self._collect_public_baseline(db, exclude_user_id=None),
+            version=self._score_version(),
+            load_lsh=(lambda: MinHashLSH.from_db(db)) if SOCIAL_GRAPH_LSH else None,
+            apply_changes=lambda index, since: self._apply_score_changes(db, index, since),
+        )
 
     @staticmethod
-    def _synthetic_scores(n: int = 1000) -> List[int]:
-        out = []
-        for _ in range(n):
-            x = random.gauss(60, 15)
-            out.append(int(max(0, min(100, round(x)))))
-        return out
+    def _overall_percentile(user_id: str, my_score: int, index: TagIndex) -> int:
+        """
+        From the shared score distribution (without the user's own entry); the tag index's
+        scores are the fallback when Redis is unavailable or the histogram is not built yet.
+        """
+        try:
+            store = ScoreDistributionStore()
+            dist = store.get()
+            if dist.total:
+                return dist.percentile(my_score, exclude=store.user_score(user_id))
+        except RedisError:
+            pass
+        own = (index.get(user_id) or {}).get("score")
+        return ScoreDistribution.from_scores(index.scores()).percentile(my_score, exclude=own)
 
     @staticmethod
     def _jaccard(a: List[str], b: List[str]) -> float:
         sa, sb = set(a), set(b)
-        if not sa and not sb:
-            return 0.0
-        return len(sa & sb) / len(sa | sb)
-
-    def _rank_users(self, me_score: int, me_tags: List[str], candidates: List[Dict[str, Any]]):
-        def sim(u):
-            tag_sim = self._jaccard(me_tags, u["tags"])
-            score_gap = abs(me_score - u["score"])
-            score_component = max(0.0, 1.0 - (score_gap / 100.0))
-            return 0.7 * tag_sim + 0.3 * score_component
-
-        def comp(u):
-            tag_sim = self._jaccard(me_tags, u["tags"])
-            score_gap = abs(me_score - u["score"])
-            score_component = max(0.0, 1.0 - (score_gap / 20.0))
-            return (1.0 - tag_sim) * 0.7 + score_component * 0.3
-
+        union = sa | sb
+        return len(sa & sb) / len(union) if union else 0.0
+
+    @classmethod
+    def _rank_users(cls, me_score: int, me_tags: List[str], index: TagIndex, exclude_user_id: Optional[str] = None):
+        if index.lsh is None:
+            similar = index.similar(me_score, me_tags, k=5, exclude_user_id=exclude_user_id)
+            complementary = index.complementary(me_score, me_tags, k=5, exclude_user_id=exclude_user_id)
+            return similar, complementary
+
+        # Approximate: LSH tag neighbours plus the nearest scores form the shortlist,
+        # which is then ranked exactly with the same formulas as the TagIndex
+        near = index.nearest_by_score(me_score, LSH_SHORTLIST, exclude_user_id=exclude_user_id)
+        shortlist = {e["user_id"]: e for e in near}
+        for uid in index.lsh.query(me_tags, LSH_SHORTLIST, exclude_user_id=exclude_user_id):
+            entry = index.get(uid)
+            if entry is not None:
+                shortlist.setdefault(entry["user_id"], entry)
+
+        def sim(o):
+            return 0.7 * cls._jaccard(me_tags, o["tags"] or []) + 0.3 * max(0.0, 1.0 - abs(me_score - o["score"]) / 100.0)
+
+        def comp(o):
+            return 0.7 * (1 - cls._jaccard(me_tags, o["tags"] or [])) + 0.3 * max(0.0, 1.0 - abs(me_score - o["score"]) / 20.0)
+
+        candidates = list(shortlist.values())
         similar = sorted(candidates, key=sim, reverse=True)[:5]
         complementary = sorted(candidates, key=comp, reverse=True)[:5]
         return similar, complementary
@@ -121,34 +161,39 @@ class SocialGraphAgent(BaseAgent):
             return AgentOutput(success=True, data=mock.dict())
 
         # --- PROD MODE ---
-        db = next(get_db())
-
-        # Ensure user exists & is opt-in
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            return AgentOutput(success=False, data={}, error="User not found")
-        if not user.opt_in_public_analysis:
-            return AgentOutput(success=False, data={}, error="User has not opted in to public analysis")
-
-        # Get user's latest vibe
-        mine = self._latest_vibe_for_user(db, user_id)
-        if not mine or mine.get("score") is None:
-            # User exists but has no vibe data yet
-            return AgentOutput(success=False, data={}, error="No vibe_analysis found for this user")
-
-        my_score = int(round(mine["score"]))
-        my_tags = mine.get("tags", [])
-
-        # Get baseline from other public users
-        baseline = self._collect_public_baseline(db, exclude_user_id=user_id)
+        with self.session() as db:
+            # Ensure user exists & is opt-in
+            user = db.query(User).filter(User.id == user_id).first()
+            if not user:
+                return AgentOutput(success=False, data={}, error="User not found")
+            if not user.opt_in_public_analysis:
+                return AgentOutput(success=False, data={}, error="User has not opted in to public analysis")
+
+            # Get user's latest vibe
+            mine = self._latest_vibe_for_user(db, user_id)
+            if not mine or mine.get("score") is None:
+                # User exists but has no vibe data yet
+                return AgentOutput(success=False, data={}, error="No vibe_analysis found for this user")
+
+            my_score = int(round(mine["score"]))
+            my_tags = mine.get("tags", [])
+
+            # Result from the batch sweep, if it was computed for this media and score
+            if SOCIAL_GRAPH_PRECOMPUTED:
+                stored = SocialGraphResultStore(db).get(user_id)
+                if SocialGraphResultStore.matches(stored, mine.get("media_id"), my_score):
+                    return AgentOutput(success=True, data=stored["data"])
+
+            # An immutable snapshot: refreshes publish a new index instead of patching this one
+            index = self._public_index(db)
+            sample_size = len(index) - (user_id in index)
 
         # Cold start check
-        if len(baseline) < self.MIN_PUBLIC_USERS:
-            synth = self._synthetic_scores(1000)
-            pct = self._percentile_from_distribution(my_score, synth)
+        if sample_size < self.MIN_PUBLIC_USERS:
+            pct = normal_percentile(my_score)
             result = SocialGraphOutput(
                 cold_start=True,
-                sample_size=len(baseline),
+                sample_size=sample_size,
                 user_vibe_score=my_score,
                 percentile={"overall": pct},
                 similar_users=[],
@@ -157,13 +202,12 @@ class SocialGraphAgent(BaseAgent):
             return AgentOutput(success=True, data=result.dict())
 
         # Normal case
-        pop_scores = [b["score"] for b in baseline]
-        overall_pct = self._percentile_from_distribution(my_score, pop_scores)
-        similar, complementary = self._rank_users(my_score, my_tags, baseline)
+        overall_pct = self._overall_percentile(user_id, my_score, index)
+        similar, complementary = self._rank_users(my_score, my_tags, index, exclude_user_id=user_id)
 
         result = SocialGraphOutput(
             cold_start=False,
-            sample_size=len(baseline),
+            sample_size=sample_size,
             user_vibe_score=my_score,
             percentile={"overall": overall_pct},
             similar_users=similar,
@@ -3,8 +3,8 @@ from typing import List
 from pydantic import BaseModel, Field, ValidationError
 from sqlalchemy.orm import Session
 from src.agents.base_agent import BaseAgent, AgentInput, AgentOutput
-from src.db.session import get_db
-from src.db.models import Media
+from src.db.media_repository import recent_media
+from src.services.prompt_serializer import serialize_for_agent
 from src.agents.perception_history_agent import PerceptionHistoryAgent
 
 
@@ -19,25 +19,21 @@ class VibeAnalysisOutput(BaseModel):
 class VibeAnalysisAgent(BaseAgent):
     name = "vibe_analysis_agent"
     output_schema = VibeAnalysisOutput
+    system_prompt = "You are an expert in social perception and personal branding."
 
     def _get_recent_perception(self, db: Session, user_id: int, recent_limit: int = 5):
-        recent_media = (
-            db.query(Media)
-            .filter(Media.user_id == user_id)
-            .order_by(Media.created_at.desc())
-            .limit(recent_limit)
-            .all()
+        rows = recent_media(
+            db, user_id, recent_limit, with_key="social", keys=("fixit_suggestions", "reverse_analysis")
         )
         return [
             {
-                "media_id": m.id,
-                "timestamp": m.created_at.isoformat(),
-                "social": m.metadata.get("social", {}),
-                "fixit_suggestions": m.metadata.get("fixit_suggestions"),
-                "reverse_analysis": m.metadata.get("reverse_analysis")
+                "media_id": r.id,
+                "timestamp": r.created_at.isoformat(),
+                "social": r.social or {},
+                "fixit_suggestions": r.fixit_suggestions,
+                "reverse_analysis": r.reverse_analysis
             }
-            for m in recent_media
-            if m.metadata and "social" in m.metadata
+            for r in rows
         ]
 
     def run(self, input: AgentInput) -> AgentOutput:
@@ -57,14 +53,14 @@ class VibeAnalysisAgent(BaseAgent):
             return result
 
         # --- PROD MODE ---
-        db = next(get_db())
-        recent_perception = self._get_recent_perception(db, user_id, recent_limit=recent_limit)
+        with self.session() as db:
+            recent_perception = self._get_recent_perception(db, user_id, recent_limit=recent_limit)
 
         if not recent_perception:
             return AgentOutput(success=False, data={}, error="No recent perception data found.")
 
         # Get history trends
-        history_agent = PerceptionHistoryAgent()
+        history_agent = PerceptionHistoryAgent(self.db)
         history_res = history_agent.run(AgentInput(media_id=0, url=None, data={"user_id": user_id}))
         history_data = history_res.data if history_res.success else {}
 
@@ -72,6 +68,7 @@ class VibeAnalysisAgent(BaseAgent):
             "recent_perception": recent_perception,
             "history_summary": history_data
         }
+        payload = serialize_for_agent(self.name, combined_data)
 
         prompt = f"""
         You are a social vibe evaluator.
@@ -82,8 +79,8 @@ class VibeAnalysisAgent(BaseAgent):
         - strengths: list of current strengths
         - improvement_areas: list of key improvement points
 
-        Data:
-        {combined_data}
+        Data (JSON):
+        {payload.text}
         """
 
         try:
@@ -92,14 +89,14 @@ class VibeAnalysisAgent(BaseAgent):
             resp = client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[
-                    {"role": "system", "content": "You are an expert in social perception and personal branding."},
+                    {"role": "system", "content": self.system_prompt},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.7,
                 response_format={"type": "json_object"}
             )
 
-            raw_json = resp.choices[0].message["content"]
+            raw_json = resp.choices[0].message.content
 
             try:
                 parsed = VibeAnalysisOutput.model_validate_json(raw_json)
@@ -107,7 +104,7 @@ class VibeAnalysisAgent(BaseAgent):
                 return AgentOutput(success=False, data={}, error=f"Validation failed: {ve}")
 
             result = AgentOutput(success=True, data=parsed.dict())
-            self._trace(input.dict(), result.dict())
+            self._trace({**input.dict(), "prompt_tokens": payload.tokens}, result.dict())
             return result
 
         except Exception as e:
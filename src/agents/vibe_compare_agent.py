@@ -3,7 +3,7 @@ from typing import List
 from pydantic import BaseModel, Field, ValidationError
 from src.agents.base_agent import BaseAgent, AgentInput, AgentOutput
 from src.services.perception import PerceptionAggregator
-from src.db.session import get_db
+from src.services.prompt_serializer import serialize_for_agent
 
 class VibeComparisonOutput(BaseModel):
     summary: str = Field(..., description="Natural-language comparison summary of the two media items.")
@@ -14,6 +14,7 @@ class VibeComparisonOutput(BaseModel):
 class VibeComparisonAgent(BaseAgent):
     name = "vibe_comparison_agent"
     output_schema = VibeComparisonOutput
+    system_prompt = "You are a socially intelligent perception comparison assistant."
 
     def run(self, input: AgentInput) -> AgentOutput:
         mode = os.getenv("LIFEMIRROR_MODE", "mock")
@@ -33,11 +34,18 @@ class VibeComparisonAgent(BaseAgent):
             return result
 
         # --- PROD MODE ---
-        db = next(get_db())
-        agg = PerceptionAggregator(db)
+        # Callers that already loaded the profiles (e.g. the streaming route) can pass them in
+        profile_1 = input.data.get("profile_1")
+        profile_2 = input.data.get("profile_2")
+        if profile_1 is None or profile_2 is None:
+            with self.session() as db:
+                agg = PerceptionAggregator(db)
+                profile_1 = profile_1 or agg.build_profile(media_id_1)
+                profile_2 = profile_2 or agg.build_profile(media_id_2)
 
-        profile_1 = agg.build_profile(media_id_1)
-        profile_2 = agg.build_profile(media_id_2)
+        payload = serialize_for_agent(self.name, {
+            "profiles": {str(media_id_1): profile_1, str(media_id_2): profile_2}
+        })
 
         prompt = f"""
         Compare the following two social perception profiles and return a JSON object with:
@@ -46,11 +54,8 @@ class VibeComparisonAgent(BaseAgent):
         - comparison_tags: list of adjectives or descriptors contrasting them
         - score_difference: absolute difference in their social vibe scores (0–10 scale)
 
-        Media {media_id_1} profile:
-        {profile_1}
-
-        Media {media_id_2} profile:
-        {profile_2}
+        Profiles keyed by media ID (JSON):
+        {payload.text}
         """
 
         try:
@@ -59,14 +64,14 @@ class VibeComparisonAgent(BaseAgent):
             resp = client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[
-                    {"role": "system", "content": "You are a socially intelligent perception comparison assistant."},
+                    {"role": "system", "content": self.system_prompt},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.7,
                 response_format={"type": "json_object"}
             )
 
-            raw_json = resp.choices[0].message["content"]
+            raw_json = resp.choices[0].message.content
 
             try:
                 parsed = VibeComparisonOutput.model_validate_json(raw_json)
@@ -74,7 +79,7 @@ class VibeComparisonAgent(BaseAgent):
                 return AgentOutput(success=False, data={}, error=f"Validation failed: {ve}")
 
             result = AgentOutput(success=True, data=parsed.dict())
-            self._trace(input.dict(), result.dict())
+            self._trace({**input.dict(), "prompt_tokens": payload.tokens}, result.dict())
             return result
 
         except Exception as e:
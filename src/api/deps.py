@@ -1,15 +1,16 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from src.db.session import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.db.async_session import get_async_db
 from src.db.models import User
 from src.core.security import decode_token
 
 auth_scheme = HTTPBearer(auto_error=False)
 
-def get_current_user(
+async def get_current_user(
     creds: HTTPAuthorizationCredentials = Depends(auth_scheme),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> User:
     if not creds:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
@@ -21,7 +22,7 @@ def get_current_user(
     if payload.get("type") != "access":
         raise HTTPException(status_code=401, detail="Invalid token type")
 
-    user = db.query(User).filter(User.id == payload["sub"]).first()
+    user = (await db.execute(select(User).where(User.id == payload["sub"]))).scalar_one_or_none()
     if not user or not user.is_active:
         raise HTTPException(status_code=401, detail="Inactive or missing user")
     return user
@@ -10,10 +10,11 @@ from src.api.routes import reverse_analysis
 from src.api.routes import vibe_analysis
 from src.api.routes import full_chain
 from src.api.routes import social_graph
-from src.api.routes import notifications
+from src.api.routes import notification as notifications
 from src.api.routes import public
 from src.api.routes import auth
 from src.api.routes import storage
+from src.api.routes import similarity
 
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
@@ -28,7 +29,7 @@ app = FastAPI(title="LifeMirror API")
 
 # Automatically create missing tables from models on startup
 @app.on_event("startup")
-def create_tables():
+async def create_tables():
     Base.metadata.create_all(bind=engine)
     await init_rate_limiter()
 
@@ -61,6 +62,8 @@ app.include_router(auth.router, prefix="/auth", tags=["auth"])
 
 app.include_router(storage.router, prefix="/storage", tags=["storage"])
 
+app.include_router(similarity.router, prefix="/similar", tags=["similarity"])
+
 
 # --- Security & CORS ---
 app.add_middleware(
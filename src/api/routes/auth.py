@@ -8,6 +8,12 @@ from src.db.models import User
 from src.core.security import hash_password, verify_password, create_access_token, create_refresh_token, decode_token
 from src.api.deps import get_current_user
 from src.core.rate_limit import rl_auth
+from src.db.async_session import get_async_db
+from src.services.leaderboard import LeaderboardStore
+from src.services.response_cache import feed_cache, leaderboard_cache
+from src.services.search import refresh_user_media_search_text
+from src.services.score_distribution import sync_user_score
+from sqlalchemy.ext.asyncio import AsyncSession
 import os, asyncio
 import redis.asyncio as redis
 
@@ -42,6 +48,7 @@ def register(data: RegisterIn, db: Session = Depends(get_db)):
         password_hash=hash_password(data.password),
         is_active=True,
         created_at=datetime.utcnow(),
+        last_activity_at=datetime.utcnow(),
     )
     db.add(user)
     db.commit()
@@ -80,7 +87,7 @@ async def login(data: LoginIn, db: Session = Depends(get_db)):
     await r.delete(key)
     await r.delete(lock_key)
 
-    user.last_login = datetime.utcnow()
+    user.last_login = user.last_activity_at = datetime.utcnow()
     db.add(user); db.commit()
     return AuthOut(
         access_token=create_access_token(str(user.id)),
@@ -113,3 +120,35 @@ def me(user: User = Depends(get_current_user)):
         "created_at": user.created_at,
         "last_login": user.last_login,
     }
+
+
+class ProfileUpdateIn(BaseModel):
+    public_alias: str | None = None
+    opt_in_public_analysis: bool | None = None
+
+@router.patch("/me")
+async def update_me(
+    body: ProfileUpdateIn,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # get_current_user shares this request's session, so `user` is attached to `db`
+    changes = body.model_dump(exclude_unset=True)
+    for field, value in changes.items():
+        setattr(user, field, value)
+    if changes:
+        # Opting in/out or renaming changes the user's leaderboard row in the same transaction
+        await db.flush()
+        await db.run_sync(lambda s: LeaderboardStore(s).sync_user(user.id))
+        if "public_alias" in changes:
+            await db.run_sync(lambda s: refresh_user_media_search_text(s, user.id, user.public_alias))
+        await db.commit()
+        if "opt_in_public_analysis" in changes:
+            await db.run_sync(lambda s: sync_user_score(s, user.id))
+        await feed_cache.invalidate()
+        await leaderboard_cache.invalidate()
+    return {
+        "id": str(user.id),
+        "public_alias": user.public_alias,
+        "opt_in_public_analysis": user.opt_in_public_analysis,
+    }
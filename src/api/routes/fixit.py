@@ -2,22 +2,17 @@ from fastapi import APIRouter, HTTPException, Query
 from typing import Optional
 from src.agents.fixit_agent import FixitAgent, AgentInput
 from src.agents.reverse_analysis_agent import ReverseAnalysisAgent
-from src.db.session import get_db
-from src.db.models import Media
+from src.db.session import session_scope
+from src.db.media_repository import latest_media
 from src.workers.tasks import _update_media_metadata
+from src.api.sse import sse_response
 
 router = APIRouter()
 
-@router.get("/fixit-suggestions")
-def get_fixit_suggestions(
-    user_id: int = Query(..., description="ID of the user"),
-    media_id: Optional[int] = Query(None, description="Latest media ID to base suggestions on"),
-    recent_limit: int = Query(5, description="Number of recent uploads to consider"),
-    with_reverse_analysis: bool = Query(False, description="If true, also run Reverse Analysis")
-):
+def _fixit_steps(user_id: int, media_id: Optional[int], recent_limit: int, with_reverse_analysis: bool):
     """
-    Generate improvement suggestions based on recent perception data and history trends.
-    Optionally run Reverse Analysis right after Fix-it.
+    Yields ("fixit_suggestions", data) and, if requested, ("reverse_analysis", data | None)
+    as each agent finishes.
     """
     # --- Run Fix-it Agent ---
     fixit_agent = FixitAgent()
@@ -34,20 +29,15 @@ def get_fixit_suggestions(
     if not fixit_res.success:
         raise HTTPException(status_code=400, detail=fixit_res.error)
 
-    db = next(get_db())
-
     # Store Fix-it results
-    latest_media = (
-        db.query(Media)
-        .filter(Media.user_id == user_id)
-        .order_by(Media.created_at.desc())
-        .first()
-    )
-    if latest_media:
-        _update_media_metadata(db, latest_media.id, {"fixit_suggestions": fixit_res.data})
+    with session_scope() as db:
+        latest = latest_media(db, user_id)
+        latest_media_id = latest.id if latest else None
+        if latest_media_id is not None:
+            _update_media_metadata(db, latest_media_id, {"fixit_suggestions": fixit_res.data})
+    yield "fixit_suggestions", fixit_res.data
 
     # --- Optionally run Reverse Analysis ---
-    reverse_res = None
     if with_reverse_analysis:
         # You can choose to auto-fill a default goal from Fix-it's focus_areas
         default_goal = f"Improve in areas: {', '.join(fixit_res.data.get('focus_areas', []))}"
@@ -62,10 +52,36 @@ def get_fixit_suggestions(
             }
         ))
 
-        if reverse_res.success and latest_media:
-            _update_media_metadata(db, latest_media.id, {"reverse_analysis": reverse_res.data})
+        if reverse_res.success and latest_media_id is not None:
+            with session_scope() as db:
+                _update_media_metadata(db, latest_media_id, {"reverse_analysis": reverse_res.data})
+        yield "reverse_analysis", reverse_res.data if reverse_res.success else None
 
+
+@router.get("/fixit-suggestions")
+def get_fixit_suggestions(
+    user_id: int = Query(..., description="ID of the user"),
+    media_id: Optional[int] = Query(None, description="Latest media ID to base suggestions on"),
+    recent_limit: int = Query(5, description="Number of recent uploads to consider"),
+    with_reverse_analysis: bool = Query(False, description="If true, also run Reverse Analysis")
+):
+    """
+    Generate improvement suggestions based on recent perception data and history trends.
+    Optionally run Reverse Analysis right after Fix-it.
+    """
+    results = dict(_fixit_steps(user_id, media_id, recent_limit, with_reverse_analysis))
     return {
-        "fixit_suggestions": fixit_res.data,
-        "reverse_analysis": reverse_res.data if reverse_res and reverse_res.success else None
+        "fixit_suggestions": results["fixit_suggestions"],
+        "reverse_analysis": results.get("reverse_analysis")
     }
+
+
+@router.get("/fixit-suggestions/stream")
+def stream_fixit_suggestions(
+    user_id: int = Query(..., description="ID of the user"),
+    media_id: Optional[int] = Query(None, description="Latest media ID to base suggestions on"),
+    recent_limit: int = Query(5, description="Number of recent uploads to consider"),
+    with_reverse_analysis: bool = Query(False, description="If true, also run Reverse Analysis")
+):
+    """Server-sent events variant: Fix-it result first, then Reverse Analysis when requested."""
+    return sse_response(_fixit_steps(user_id, media_id, recent_limit, with_reverse_analysis))
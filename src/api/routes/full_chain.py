@@ -3,43 +3,37 @@ from typing import Optional
 from src.agents.fixit_agent import FixitAgent, AgentInput
 from src.agents.reverse_analysis_agent import ReverseAnalysisAgent
 from src.agents.vibe_analysis_agent import VibeAnalysisAgent
-from src.db.session import get_db
-from src.db.models import Media
+from src.db.session import session_scope
+from src.db.media_repository import latest_media
 from src.workers.tasks import _update_media_metadata
+from src.api.sse import sse_response
 
 router = APIRouter()
 
-@router.post("/full-analysis")
-def full_analysis(
-    user_id: int = Query(..., description="ID of the user"),
-    goal: Optional[str] = Query(None, description="Goal for Reverse Analysis. If not provided, auto-generated from Fix-it."),
-    recent_limit: int = Query(5, description="Number of recent uploads to consider")
-):
+def _full_chain_steps(user_id: int, goal: Optional[str], recent_limit: int):
     """
-    Runs Fix-it → Reverse Analysis → Vibe Analysis in sequence.
-    Stores all results in latest media metadata.
+    Runs Fix-it → Reverse Analysis → Vibe Analysis in sequence, yielding each
+    (step, result) as soon as it is stored in the latest media metadata.
     """
-
-    db = next(get_db())
-    latest_media = (
-        db.query(Media)
-        .filter(Media.user_id == user_id)
-        .order_by(Media.created_at.desc())
-        .first()
-    )
-    if not latest_media:
+    # Short sessions around each DB touch so no connection is held across LLM calls
+    with session_scope() as db:
+        latest = latest_media(db, user_id)
+        latest_media_id = latest.id if latest else None
+    if latest_media_id is None:
         raise HTTPException(status_code=404, detail="No media found for this user.")
 
     # --- Step 1: Fix-it ---
     fixit_agent = FixitAgent()
     fixit_res = fixit_agent.run(AgentInput(
-        media_id=latest_media.id,
+        media_id=latest_media_id,
         url=None,
-        data={"user_id": user_id, "media_id": latest_media.id, "recent_limit": recent_limit}
+        data={"user_id": user_id, "media_id": latest_media_id, "recent_limit": recent_limit}
     ))
     if not fixit_res.success:
         raise HTTPException(status_code=400, detail=f"Fix-it failed: {fixit_res.error}")
-    _update_media_metadata(db, latest_media.id, {"fixit_suggestions": fixit_res.data})
+    with session_scope() as db:
+        _update_media_metadata(db, latest_media_id, {"fixit_suggestions": fixit_res.data})
+    yield "fixit_suggestions", fixit_res.data
 
     # --- Step 2: Reverse Analysis ---
     final_goal = goal or f"Improve in areas: {', '.join(fixit_res.data.get('focus_areas', []))}"
@@ -51,7 +45,9 @@ def full_analysis(
     ))
     if not reverse_res.success:
         raise HTTPException(status_code=400, detail=f"Reverse Analysis failed: {reverse_res.error}")
-    _update_media_metadata(db, latest_media.id, {"reverse_analysis": reverse_res.data})
+    with session_scope() as db:
+        _update_media_metadata(db, latest_media_id, {"reverse_analysis": reverse_res.data})
+    yield "reverse_analysis", reverse_res.data
 
     # --- Step 3: Vibe Analysis ---
     vibe_agent = VibeAnalysisAgent()
@@ -62,10 +58,33 @@ def full_analysis(
     ))
     if not vibe_res.success:
         raise HTTPException(status_code=400, detail=f"Vibe Analysis failed: {vibe_res.error}")
-    _update_media_metadata(db, latest_media.id, {"vibe_analysis": vibe_res.data})
+    with session_scope() as db:
+        _update_media_metadata(db, latest_media_id, {"vibe_analysis": vibe_res.data})
+    yield "vibe_analysis", vibe_res.data
+
+
+@router.post("/full-analysis")
+def full_analysis(
+    user_id: int = Query(..., description="ID of the user"),
+    goal: Optional[str] = Query(None, description="Goal for Reverse Analysis. If not provided, auto-generated from Fix-it."),
+    recent_limit: int = Query(5, description="Number of recent uploads to consider")
+):
+    """
+    Runs Fix-it → Reverse Analysis → Vibe Analysis in sequence.
+    Stores all results in latest media metadata.
+    """
+    return dict(_full_chain_steps(user_id, goal, recent_limit))
 
-    return {
-        "fixit_suggestions": fixit_res.data,
-        "reverse_analysis": reverse_res.data,
-        "vibe_analysis": vibe_res.data
-    }
+
+@router.post("/full-analysis/stream")
+def full_analysis_stream(
+    user_id: int = Query(..., description="ID of the user"),
+    goal: Optional[str] = Query(None, description="Goal for Reverse Analysis. If not provided, auto-generated from Fix-it."),
+    recent_limit: int = Query(5, description="Number of recent uploads to consider")
+):
+    """
+    Same chain as /full-analysis, streamed as server-sent events: one event per step
+    (fixit_suggestions, reverse_analysis, vibe_analysis), then `done`. POST like the
+    non-streaming endpoint since it writes media metadata (read it with fetch, not EventSource).
+    """
+    return sse_response(_full_chain_steps(user_id, goal, recent_limit))
@@ -1,10 +1,12 @@
 import os
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
 from pydantic import BaseModel
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID, uuid4
 from src.storage.s3 import get_presigned_put_url
-from src.db.session import get_db
-from src.db.models import Media
+from src.db.async_session import get_async_db
+from src.db.models import Media, User
 from src.workers.tasks import process_media_async
 from src.core.rate_limit import rl_upload
 from starlette.status import HTTP_413_REQUEST_ENTITY_TOO_LARGE
@@ -33,14 +35,17 @@ async def presign(req: PresignRequest):
     return {"upload_url": presign, "key": key}
 
 @router.post('/')
-async def create_media(req: MediaCreateRequest):
+async def create_media(req: MediaCreateRequest, db: AsyncSession = Depends(get_async_db)):
     # Create DB record and enqueue background processing
     media_id = uuid4()
-    m = Media(id=media_id, user_id=req.user_id, storage_url=req.storage_url, mime=req.mime)
-    db = next(get_db())
+    m = Media(
+        id=media_id, user_id=req.user_id, storage_url=req.storage_url, mime=req.mime,
+        # Searchable by alias until the social tags land (src/services/search.py)
+        search_text=select(func.lower(User.public_alias)).where(User.id == req.user_id).scalar_subquery(),
+    )
     db.add(m)
-    db.commit()
-    db.refresh(m)
+    await db.execute(update(User).where(User.id == req.user_id).values(last_activity_at=func.now()))
+    await db.commit()
     # enqueue background job
     process_media_async.delay(str(media_id), req.storage_url)
     return {"media_id": media_id}
@@ -1,17 +1,16 @@
-from fastapi import APIRouter, Query, HTTPException
-from sqlalchemy.orm import Session
-from src.db.session import get_db
+from fastapi import APIRouter, Depends, Query, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.db.async_session import get_async_db
 from src.db.models import Notification
 from src.core.rate_limit import rl_general
 
 
 router = APIRouter()
 
-@router.get("/notifications", dependencies=[Depends(rl_general())])
-def get_notifications(user_id: str = Query(...)):
-    db = next(get_db())
-    notes = db.query(Notification).filter(Notification.user_id == user_id).order_by(Notification.created_at.desc()).all()
-    return [dict(
+
+def _note_dict(n: Notification) -> dict:
+    return dict(
         id=str(n.id),
         type=n.type,
         title=n.title,
@@ -19,37 +18,33 @@ def get_notifications(user_id: str = Query(...)):
         metadata=n.metadata,
         is_read=n.is_read,
         created_at=n.created_at
-    ) for n in notes]
+    )
+
+
+@router.get("/notifications", dependencies=[Depends(rl_general())])
+async def get_notifications(user_id: str = Query(...), db: AsyncSession = Depends(get_async_db)):
+    notes = await db.scalars(
+        select(Notification)
+        .where(Notification.user_id == user_id)
+        .order_by(Notification.created_at.desc())
+    )
+    return [_note_dict(n) for n in notes]
 
 
 @router.get("/notifications/unread", dependencies=[Depends(rl_general())])
-def get_unread_notifications(user_id: str = Query(...)):
-    db = next(get_db())
-    notes = (
-        db.query(Notification)
-        .filter(Notification.user_id == user_id, Notification.is_read == False)
+async def get_unread_notifications(user_id: str = Query(...), db: AsyncSession = Depends(get_async_db)):
+    notes = await db.scalars(
+        select(Notification)
+        .where(Notification.user_id == user_id, Notification.is_read == False)
         .order_by(Notification.created_at.desc())
-        .all()
     )
-    return [
-        dict(
-            id=str(n.id),
-            type=n.type,
-            title=n.title,
-            message=n.message,
-            metadata=n.metadata,
-            is_read=n.is_read,
-            created_at=n.created_at
-        )
-        for n in notes
-    ]
+    return [_note_dict(n) for n in notes]
 
 @router.patch("/notifications/{note_id}/mark-read", dependencies=[Depends(rl_general())])
-def mark_notification_read(note_id: str):
-    db = next(get_db())
-    note = db.query(Notification).filter(Notification.id == note_id).first()
+async def mark_notification_read(note_id: str, db: AsyncSession = Depends(get_async_db)):
+    note = (await db.execute(select(Notification).where(Notification.id == note_id))).scalar_one_or_none()
     if not note:
         raise HTTPException(status_code=404, detail="Notification not found")
     note.is_read = True
-    db.commit()
+    await db.commit()
     return {"status": "success", "message": "Notification marked as read"}
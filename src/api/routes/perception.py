@@ -1,15 +1,17 @@
 # src/api/routes/perception.py
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from src.db.session import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.db.async_session import get_async_db
+from src.db.models import Media
 from src.services.perception import PerceptionAggregator
 
 router = APIRouter()
 
 @router.get("/media/{media_id}/perception")
-def get_perception(media_id: int, db: Session = Depends(get_db)):
-    agg = PerceptionAggregator(db)
-    profile = agg.build_profile(media_id)
+async def get_perception(media_id: int, db: AsyncSession = Depends(get_async_db)):
+    media = (await db.execute(select(Media).where(Media.id == media_id))).scalar_one_or_none()
+    profile = PerceptionAggregator.profile_from_media(media)
     if "error" in profile:
         raise HTTPException(status_code=404, detail=profile["error"])
     return profile
@@ -1,60 +1,94 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from src.db.session import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.db.async_session import get_async_db
 from src.agents.public_feed_agent import PublicFeedAgent
 from src.core.rate_limit import rl_general
+from src.services.response_cache import feed_cache, leaderboard_cache
+from src.utils.cursor import InvalidCursor
 
 
 router = APIRouter()
 
 @router.get("/feed", dependencies=[Depends(rl_general())])
-def public_feed(
+async def public_feed(
     limit: int = Query(20, le=100),
     offset: int = Query(0, ge=0),
     days: int = Query(None, ge=1),
     min_percentile: int = Query(None, ge=0, le=100),
     tags: list[str] = Query(None),
     search: str = Query(None),
-    sort_by: str = Query("newest", regex="^(newest|highest|random|trending)$"),
-    db: Session = Depends(get_db)
+    sort_by: str = Query("newest", regex="^(newest|highest|random|trending|relevance)$"),
+    cursor: str = Query(None, description="next_cursor from the previous page; replaces offset"),
+    seed: int = Query(None, ge=0, le=PublicFeedAgent.RANDOM_SEED_MAX, description="sort_by=random: the seed from the first page"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    agent = PublicFeedAgent(db)
-    return {
-        "items": agent.get_feed(
+    # The agent's query-building is sync ORM; run_sync drives it over the asyncpg connection
+    async def compute():
+        return await db.run_sync(lambda s: PublicFeedAgent(s).get_feed_page(
             limit=limit,
             offset=offset,
             days=days,
             min_percentile=min_percentile,
             tags=tags,
             search_query=search,
-            sort_by=sort_by
-        )
-    }
+            sort_by=sort_by,
+            cursor=cursor,
+            seed=seed
+        ))
 
+    try:
+        # An unseeded random page is meant to differ per request, so it is never cached
+        if sort_by == "random" and seed is None:
+            return await compute()
+        params = {
+            "limit": limit, "offset": offset, "days": days, "min_percentile": min_percentile,
+            "tags": tags, "search": search, "sort_by": sort_by, "cursor": cursor, "seed": seed,
+        }
+        return await feed_cache.get_or_compute(params, compute)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/leaderboard")
-def public_leaderboard(limit: int = Query(10, le=50), db: Session = Depends(get_db)):
-    agent = PublicFeedAgent(db)
-    return {"items": agent.get_leaderboard(limit=limit)}
 
 @router.get("/leaderboard", dependencies=[Depends(rl_general())])
-def leaderboard(
+async def leaderboard(
     limit: int = Query(20, le=100),
     offset: int = Query(0, ge=0),
     days: int = Query(None, ge=1),
     search: str = Query(None),
-    sort_by: str = Query("highest", regex="^(highest|newest|random|trending)$"),
-    db: Session = Depends(get_db)
+    sort_by: str = Query("highest", regex="^(highest|newest|random|trending|relevance)$"),
+    cursor: str = Query(None, description="next_cursor from the previous page; replaces offset"),
+    seed: int = Query(None, ge=0, le=PublicFeedAgent.RANDOM_SEED_MAX, description="sort_by=random: the seed from the first page"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    agent = PublicFeedAgent(db)
-    return {
-        "items": agent.get_leaderboard(
+    async def compute():
+        return await db.run_sync(lambda s: PublicFeedAgent(s).get_leaderboard_page(
             limit=limit,
             offset=offset,
             days=days,
             search_query=search,
-            sort_by=sort_by
-        )
+            sort_by=sort_by,
+            cursor=cursor,
+            seed=seed
+        ))
+
+    try:
+        if sort_by == "random" and seed is None:
+            return await compute()
+        params = {
+            "limit": limit, "offset": offset, "days": days,
+            "search": search, "sort_by": sort_by, "cursor": cursor, "seed": seed,
+        }
+        return await leaderboard_cache.get_or_compute(params, compute)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Response cache hit ratio, lock waits and mean age of served entries, per endpoint."""
+    return {
+        "feed": await feed_cache.stats(),
+        "leaderboard": await leaderboard_cache.stats(),
     }
 
 
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
 from typing import Optional
 from src.agents.reverse_analysis_agent import ReverseAnalysisAgent, AgentInput
 from src.db.session import get_db
-from src.db.models import Media
+from src.db.media_repository import latest_media
 from src.workers.tasks import _update_media_metadata
 
 router = APIRouter()
@@ -11,7 +12,8 @@ router = APIRouter()
 def reverse_analysis(
     user_id: int = Query(..., description="ID of the user"),
     goal: str = Query(..., description="Desired perception/vibe"),
-    recent_limit: int = Query(5, description="Number of recent uploads to consider")
+    recent_limit: int = Query(5, description="Number of recent uploads to consider"),
+    db: Session = Depends(get_db)
 ):
     agent = ReverseAnalysisAgent()
     res = agent.run(AgentInput(
@@ -28,14 +30,8 @@ def reverse_analysis(
         raise HTTPException(status_code=400, detail=res.error)
 
     # Store result in metadata of latest media
-    db = next(get_db())
-    latest_media = (
-        db.query(Media)
-        .filter(Media.user_id == user_id)
-        .order_by(Media.created_at.desc())
-        .first()
-    )
-    if latest_media:
-        _update_media_metadata(db, latest_media.id, {"reverse_analysis": res.data})
+    latest = latest_media(db, user_id)
+    if latest:
+        _update_media_metadata(db, latest.id, {"reverse_analysis": res.data})
 
     return res.data
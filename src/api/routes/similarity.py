@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from src.db.session import get_db
+from src.services.similarity import get_similarity_index
+
+router = APIRouter()
+
+
+@router.get("/media/{media_id}")
+def similar_media(
+    media_id: str,
+    k: int = Query(10, ge=1, le=100),
+    public_only: bool = Query(False, description="Only media from users who opted in to public analysis"),
+    days: int = Query(None, ge=1, description="Only media uploaded in the last N days"),
+    db: Session = Depends(get_db)
+):
+    items = get_similarity_index(db).similar_media(media_id, k=k, public_only=public_only, days=days)
+    if items is None:
+        raise HTTPException(status_code=404, detail="No embedding for this media yet")
+    return {"items": items}
+
+
+@router.get("/users/{user_id}")
+def similar_users(
+    user_id: str,
+    k: int = Query(10, ge=1, le=50),
+    public_only: bool = Query(True, description="Only users who opted in to public analysis"),
+    days: int = Query(None, ge=1, description="Only match against media from the last N days"),
+    db: Session = Depends(get_db)
+):
+    items = get_similarity_index(db).similar_users(user_id, k=k, public_only=public_only, days=days)
+    if items is None:
+        raise HTTPException(status_code=404, detail="No embeddings for this user yet")
+    return {"items": items}
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
 from src.agents.vibe_analysis_agent import VibeAnalysisAgent, AgentInput
 from src.db.session import get_db
-from src.db.models import Media
+from src.db.media_repository import latest_media
 from src.workers.tasks import _update_media_metadata
 
 router = APIRouter()
@@ -9,7 +10,8 @@ router = APIRouter()
 @router.get("/vibe-analysis")
 def vibe_analysis(
     user_id: int = Query(..., description="ID of the user"),
-    recent_limit: int = Query(5, description="Number of recent uploads to consider")
+    recent_limit: int = Query(5, description="Number of recent uploads to consider"),
+    db: Session = Depends(get_db)
 ):
     agent = VibeAnalysisAgent()
     res = agent.run(AgentInput(
@@ -25,14 +27,8 @@ def vibe_analysis(
         raise HTTPException(status_code=400, detail=res.error)
 
     # Store in latest media metadata
-    db = next(get_db())
-    latest_media = (
-        db.query(Media)
-        .filter(Media.user_id == user_id)
-        .order_by(Media.created_at.desc())
-        .first()
-    )
-    if latest_media:
-        _update_media_metadata(db, latest_media.id, {"vibe_analysis": res.data})
+    latest = latest_media(db, user_id)
+    if latest:
+        _update_media_metadata(db, latest.id, {"vibe_analysis": res.data})
 
     return res.data
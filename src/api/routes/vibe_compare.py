@@ -1,5 +1,8 @@
 from fastapi import APIRouter, HTTPException
 from src.agents.vibe_compare_agent import VibeComparisonAgent, AgentInput
+from src.api.sse import sse_response
+from src.db.session import session_scope
+from src.services.perception import PerceptionAggregator
 from fastapi import APIRouter, BackgroundTasks
 from src.workers.tasks import compare_media_vibes_async
 
@@ -19,6 +22,35 @@ def compare_vibes(media_id_1: int, media_id_2: int):
     return res.data
 
 
+@router.get("/vibe-comparison/stream")
+def compare_vibes_stream(media_id_1: int, media_id_2: int):
+    """
+    Server-sent events variant: each media's perception profile is sent as soon as it
+    is loaded (`profile` events), followed by the LLM comparison (`comparison`).
+    """
+    def steps():
+        profiles = {}
+        for mid in (media_id_1, media_id_2):
+            with session_scope() as db:
+                profiles[mid] = PerceptionAggregator(db).build_profile(mid)
+            if "error" in profiles[mid]:
+                raise HTTPException(status_code=404, detail=f"Media {mid}: {profiles[mid]['error']}")
+            yield "profile", {"media_id": mid, "summaries": profiles[mid]["summaries"]}
+
+        agent = VibeComparisonAgent()
+        res = agent.run(AgentInput(media_id=0, url=None, data={
+            "media_id_1": media_id_1,
+            "media_id_2": media_id_2,
+            "profile_1": profiles[media_id_1],
+            "profile_2": profiles[media_id_2]
+        }))
+        if not res.success:
+            raise HTTPException(status_code=500, detail=res.error)
+        yield "comparison", res.data
+
+    return sse_response(steps())
+
+
 @router.post("/vibe-comparison/async")
 def compare_vibes_async(media_id_1: int, media_id_2: int):
     compare_media_vibes_async.delay(media_id_1, media_id_2)
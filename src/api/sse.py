@@ -0,0 +1,31 @@
+import json
+from typing import Any, Iterable, Iterator, Tuple
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one server-sent event frame."""
+    payload = json.dumps(jsonable_encoder(data), separators=(",", ":"))
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+def sse_response(steps: Iterable[Tuple[str, Any]]) -> StreamingResponse:
+    """
+    Stream (event, data) pairs as SSE. Each step is flushed as soon as it is produced;
+    an exception ends the stream with an `error` event, and `done` always closes it.
+    """
+    def frames() -> Iterator[str]:
+        try:
+            for event, data in steps:
+                yield sse_event(event, data)
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e)
+            yield sse_event("error", {"detail": detail})
+        yield sse_event("done", {})
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
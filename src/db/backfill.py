@@ -0,0 +1,102 @@
+"""
+Backfill derived tables from existing Media.metadata, in chunks.
+
+    python -m src.db.backfill perception_facts [--chunk-size 1000]
+    python -m src.db.backfill media_objects [--chunk-size 1000]
+    python -m src.db.backfill tag_signatures [--chunk-size 1000]
+"""
+import argparse
+import logging
+from sqlalchemy.orm import Session
+from src.db.models import Media
+
+logger = logging.getLogger(__name__)
+
+
+def iter_media_chunks(db: Session, chunk_size: int = 1000, after_id=None):
+    """Keyset-paginate media by id so each chunk is an index range scan."""
+    last_id = after_id
+    while True:
+        q = db.query(Media).filter(Media.metadata.isnot(None)).order_by(Media.id)
+        if last_id is not None:
+            q = q.filter(Media.id > last_id)
+        chunk = q.limit(chunk_size).all()
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1].id
+
+
+def backfill_perception_facts(db: Session, chunk_size: int = 1000, after_id=None) -> int:
+    from src.services.perception_facts import PerceptionFactsWriter
+
+    writer = PerceptionFactsWriter(db)
+    total = 0
+    for chunk in iter_media_chunks(db, chunk_size, after_id):
+        writer.record_many(chunk)
+        db.commit()
+        db.expunge_all()
+        total += len(chunk)
+        logger.info(f"[backfill_perception_facts] {total} media processed (last id {chunk[-1].id})")
+    return total
+
+
+def backfill_media_objects(db: Session, chunk_size: int = 1000, after_id=None) -> int:
+    from src.services.media_objects import MediaObjectsWriter
+
+    writer = MediaObjectsWriter(db)
+    total = 0
+    for chunk in iter_media_chunks(db, chunk_size, after_id):
+        writer.record_many(chunk)
+        db.commit()
+        db.expunge_all()
+        total += len(chunk)
+        logger.info(f"[backfill_media_objects] {total} media processed (last id {chunk[-1].id})")
+    return total
+
+
+def backfill_tag_signatures(db: Session, chunk_size: int = 1000, after_id=None) -> int:
+    """
+    MinHash signatures for every public user's latest vibe tags. Rows are streamed, so
+    the upserts commit once at the end; reruns are safe. `after_id` is not used.
+    """
+    from src.services.minhash import store_signature
+    from src.services.perception_facts import public_latest_vibes
+
+    total = 0
+    for row in public_latest_vibes(db, batch_size=chunk_size):
+        store_signature(db, row["user_id"], row["tags"] or [])
+        total += 1
+        if total % chunk_size == 0:
+            logger.info(f"[backfill_tag_signatures] {total} users processed")
+    db.commit()
+    return total
+
+
+JOBS = {
+    "perception_facts": backfill_perception_facts,
+    "media_objects": backfill_media_objects,
+    "tag_signatures": backfill_tag_signatures,
+}
+
+
+def main():
+    from src.db.session import SessionLocal
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("job", choices=sorted(JOBS))
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--after-id", default=None, help="resume after this media id")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        total = JOBS[args.job](db, chunk_size=args.chunk_size, after_id=args.after_id)
+        logger.info(f"[{args.job}] done, {total} rows processed")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
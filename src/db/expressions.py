@@ -0,0 +1,23 @@
+"""
+SQL expressions over Media.metadata that match the expression indexes in
+migrations/manual/013_media_jsonb_indexes.sql and 018_feed_keyset_indexes.sql. The SQL text is fixed (no bound
+path parameters) so the planner can match it against the index definitions.
+"""
+from sqlalchemy import Numeric, literal_column
+
+SOCIAL_PERCENTILE_SQL = "((media.metadata -> 'social' -> 'percentile' ->> 'overall')::numeric)"
+VIBE_SCORE_SQL = "((media.metadata -> 'vibe_analysis' ->> 'vibe_score')::numeric)"
+
+# Keyset sort key. NULL percentiles sort last as -1 so (key, id) row comparisons stay total.
+# (Trending uses the stored Media.trending_score instead.)
+FEED_HIGHEST_KEY_SQL = f"COALESCE({SOCIAL_PERCENTILE_SQL}, -1)"
+
+social_percentile = literal_column(SOCIAL_PERCENTILE_SQL, type_=Numeric)
+vibe_score = literal_column(VIBE_SCORE_SQL, type_=Numeric)
+feed_highest_key = literal_column(FEED_HIGHEST_KEY_SQL, type_=Numeric)
+
+
+def social_tags_contain(tags):
+    """metadata @> {"social": {"tags": [...]}} — every tag must be present (GIN jsonb_path_ops)."""
+    from src.db.models import Media
+    return Media.metadata.contains({"social": {"tags": list(tags)}})
@@ -0,0 +1,76 @@
+import logging
+import os
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Tuple
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Capturing the checkout stack costs a traceback per checkout, so it is opt-in
+DB_LEAK_TRACE = os.getenv("DB_LEAK_TRACE", "false").lower() in ("1", "true", "yes")
+DB_LEAK_CHECK_INTERVAL = float(os.getenv("DB_LEAK_CHECK_INTERVAL", "30"))
+
+
+class ConnectionLeakDetector:
+    """
+    Tracks pool checkouts and logs connections that stay checked out longer than
+    `threshold_seconds`. Checks run at most every DB_LEAK_CHECK_INTERVAL seconds,
+    piggybacking on checkouts, or on demand via report().
+
+    Checkouts are keyed by the pool's connection record: it stays the same from checkout
+    to checkin even when the DBAPI connection is invalidated (checkin then passes None),
+    and unlike id() of a closed connection it cannot be reused by an unrelated object
+    while still tracked. Detached connections leave the pool and are no longer tracked.
+    """
+
+    def __init__(self, threshold_seconds: float = 60.0):
+        self.threshold_seconds = threshold_seconds
+        self._checked_out: Dict[Any, Tuple[float, str]] = {}
+        self._reported: set = set()
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+
+    def attach(self, engine):
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "close", self._on_checkin)
+        event.listen(engine, "detach", self._on_checkin)
+
+    def _on_checkout(self, dbapi_conn, conn_record, conn_proxy):
+        origin = "".join(traceback.format_stack(limit=12)[:-2]) if DB_LEAK_TRACE else ""
+        with self._lock:
+            self._checked_out[conn_record] = (time.monotonic(), origin)
+        if time.monotonic() - self._last_check >= DB_LEAK_CHECK_INTERVAL:
+            self.report()
+
+    def _on_checkin(self, dbapi_conn, conn_record):
+        if conn_record is None:  # a detached connection, dropped from tracking on detach
+            return
+        with self._lock:
+            self._checked_out.pop(conn_record, None)
+            self._reported.discard(conn_record)
+
+    def checked_out(self) -> int:
+        with self._lock:
+            return len(self._checked_out)
+
+    def report(self) -> List[float]:
+        """Log (once each) connections held past the threshold; returns their ages in seconds."""
+        now = time.monotonic()
+        self._last_check = now
+        leaks = []
+        with self._lock:
+            items = list(self._checked_out.items())
+        for key, (since, origin) in items:
+            age = now - since
+            if age < self.threshold_seconds:
+                continue
+            leaks.append(age)
+            if key in self._reported:
+                continue
+            self._reported.add(key)
+            msg = f"DB connection checked out for {age:.0f}s (threshold {self.threshold_seconds:.0f}s)"
+            logger.warning(msg + (f", checked out at:\n{origin}" if origin else ""))
+        return leaks
@@ -0,0 +1,51 @@
+"""
+Per-user media lookups backed by idx_media_user_created (user_id, created_at DESC).
+
+Both helpers project columns instead of loading Media rows, so callers only pay for
+the metadata sub-keys they actually read rather than the whole JSONB blob.
+"""
+from typing import Iterable, List, Optional, Union
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+from src.db.models import Media
+
+
+def _key_columns(keys: Iterable[str]):
+    # `->` rather than jsonb subscripting, which needs Postgres 14+
+    return [Media.metadata.op("->", return_type=JSONB)(k).label(k) for k in keys]
+
+
+def latest_media(db: Session, user_id, keys: Iterable[str] = ()) -> Optional[Row]:
+    """Newest media for a user as a row of (id, created_at, *keys), or None."""
+    stmt = (
+        select(Media.id, Media.created_at, *_key_columns(keys))
+        .where(Media.user_id == user_id)
+        .order_by(Media.created_at.desc())
+        .limit(1)
+    )
+    return db.execute(stmt).first()
+
+
+def recent_media(
+    db: Session,
+    user_id,
+    n: int = 5,
+    with_key: Optional[Union[str, Iterable[str]]] = None,
+    keys: Iterable[str] = (),
+) -> List[Row]:
+    """
+    The user's `n` newest media as rows of (id, created_at, *with_key, *keys).
+    With `with_key`, only media whose metadata has those keys are returned.
+    """
+    required = [with_key] if isinstance(with_key, str) else list(with_key or [])
+    stmt = (
+        select(Media.id, Media.created_at, *_key_columns(required + [k for k in keys if k not in required]))
+        .where(Media.user_id == user_id)
+        .order_by(Media.created_at.desc())
+        .limit(n)
+    )
+    for k in required:
+        stmt = stmt.where(Media.metadata.has_key(k))
+    return list(db.execute(stmt))
@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS perception_history_state (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    media_count INTEGER NOT NULL DEFAULT 0,
+    score_series JSONB NOT NULL DEFAULT '[]'::jsonb,
+    tag_counts JSONB NOT NULL DEFAULT '{}'::jsonb,
+    pending JSONB NOT NULL DEFAULT '[]'::jsonb,
+    last_summary JSONB,
+    last_summary_at TIMESTAMP,
+    last_media_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT now()
+);
@@ -0,0 +1,14 @@
+-- Media.metadata: JSON -> JSONB, plus indexes for the public feed / social graph filters.
+-- Expressions must stay in sync with src/db/expressions.py.
+ALTER TABLE media
+    ALTER COLUMN metadata TYPE JSONB USING metadata::jsonb;
+
+-- Containment (@>) lookups, e.g. social.tags
+CREATE INDEX IF NOT EXISTS idx_media_metadata_gin
+    ON media USING GIN (metadata jsonb_path_ops);
+
+CREATE INDEX IF NOT EXISTS idx_media_social_percentile
+    ON media (((metadata -> 'social' -> 'percentile' ->> 'overall')::numeric) DESC NULLS LAST);
+
+CREATE INDEX IF NOT EXISTS idx_media_vibe_score
+    ON media (((metadata -> 'vibe_analysis' ->> 'vibe_score')::numeric));
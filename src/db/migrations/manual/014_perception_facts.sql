@@ -0,0 +1,32 @@
+-- Normalized perception facts, written by the pipeline and backfilled with
+-- `python -m src.db.backfill perception_facts`.
+CREATE TABLE IF NOT EXISTS perception_scores (
+    media_id UUID PRIMARY KEY REFERENCES media(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    social_score DOUBLE PRECISION,
+    vibe_score DOUBLE PRECISION,
+    percentile DOUBLE PRECISION,
+    created_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_perception_scores_user_created
+    ON perception_scores (user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_perception_scores_percentile
+    ON perception_scores (percentile DESC NULLS LAST);
+CREATE INDEX IF NOT EXISTS idx_perception_scores_vibe
+    ON perception_scores (vibe_score);
+
+CREATE TABLE IF NOT EXISTS tags (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(80) UNIQUE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS perception_tags (
+    media_id UUID NOT NULL REFERENCES media(id) ON DELETE CASCADE,
+    tag_id INTEGER NOT NULL REFERENCES tags(id) ON DELETE CASCADE,
+    source VARCHAR(16) NOT NULL,
+    PRIMARY KEY (media_id, tag_id, source)
+);
+
+CREATE INDEX IF NOT EXISTS idx_perception_tags_tag
+    ON perception_tags (tag_id, media_id);
@@ -0,0 +1,4 @@
+-- Latest / recent media per user (src/db/media_repository.py).
+-- Run outside a transaction block because of CONCURRENTLY.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_media_user_created
+    ON media (user_id, created_at DESC);
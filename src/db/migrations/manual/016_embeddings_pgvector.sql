@@ -0,0 +1,23 @@
+-- Embeddings as pgvector with an HNSW (cosine) index; see src/services/similarity.py.
+-- The dimension must match EMBED_DIM (default 1536).
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- Nothing wrote to this table before, so the type change is safe
+ALTER TABLE embeddings
+    ALTER COLUMN vector TYPE vector(1536) USING vector::vector(1536);
+
+ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS user_id UUID REFERENCES users(id) ON DELETE CASCADE;
+
+CREATE UNIQUE INDEX IF NOT EXISTS embeddings_media_id_key ON embeddings (media_id);
+CREATE INDEX IF NOT EXISTS ix_embeddings_user_id ON embeddings (user_id);
+
+-- Carry over vectors the pipeline used to keep in media.metadata, where the dimension fits
+INSERT INTO embeddings (id, media_id, user_id, vector, model, created_at)
+SELECT gen_random_uuid(), id, user_id, (metadata ->> 'embedding')::vector(1536), 'metadata-backfill', created_at
+FROM media
+WHERE jsonb_typeof(metadata -> 'embedding') = 'array'
+  AND jsonb_array_length(metadata -> 'embedding') = 1536
+ON CONFLICT (media_id) DO NOTHING;
+
+CREATE INDEX IF NOT EXISTS idx_embeddings_vector_hnsw
+    ON embeddings USING hnsw (vector vector_cosine_ops) WITH (m = 16, ef_construction = 64);
@@ -0,0 +1,12 @@
+-- Faces / detections become real rows (src/services/media_objects.py).
+-- Backfill with `python -m src.db.backfill media_objects`.
+ALTER TABLE faces ADD COLUMN IF NOT EXISTS gender VARCHAR(16);
+ALTER TABLE faces ADD COLUMN IF NOT EXISTS age INTEGER;
+ALTER TABLE faces ADD COLUMN IF NOT EXISTS expression VARCHAR(32);
+
+ALTER TABLE detections ADD COLUMN IF NOT EXISTS source VARCHAR(16) NOT NULL DEFAULT 'detect';
+
+CREATE INDEX IF NOT EXISTS idx_faces_media ON faces (media_id);
+CREATE INDEX IF NOT EXISTS idx_detections_media ON detections (media_id);
+-- "media with a jacket": equality on label, index-only for the media ids
+CREATE INDEX IF NOT EXISTS idx_detections_label_media ON detections (label, media_id);
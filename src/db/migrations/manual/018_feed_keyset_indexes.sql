@@ -0,0 +1,11 @@
+-- Keyset pagination for the public feed: (sort key DESC, id DESC) per sort order.
+-- Expressions must stay in sync with src/db/expressions.py.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_media_feed_newest
+    ON media (created_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_media_feed_highest
+    ON media ((COALESCE(((metadata -> 'social' -> 'percentile' ->> 'overall')::numeric), -1)) DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_media_feed_trending
+    ON media ((COALESCE(((metadata -> 'social' -> 'percentile' ->> 'overall')::numeric), -1)
+               + EXTRACT(EPOCH FROM created_at) / 36000) DESC, id DESC);
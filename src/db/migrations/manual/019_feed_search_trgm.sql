@@ -0,0 +1,8 @@
+-- Substring search for the public feed / leaderboard (PublicFeedAgent._search_filter).
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_public_alias_trgm
+    ON users USING GIN (public_alias gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tags_name_trgm
+    ON tags USING GIN (name gin_trgm_ops);
@@ -0,0 +1,17 @@
+-- Materialized public leaderboard (src/services/leaderboard.py). Populate with
+-- the refresh_leaderboard_async task after creating the table.
+CREATE TABLE IF NOT EXISTS leaderboard_entries (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    alias VARCHAR(80),
+    media_id UUID REFERENCES media(id) ON DELETE SET NULL,
+    percentile DOUBLE PRECISION,
+    tags JSONB,
+    last_upload TIMESTAMP NOT NULL,
+    score_key DOUBLE PRECISION NOT NULL,
+    trending_key DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMP DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_leaderboard_highest ON leaderboard_entries (score_key DESC, user_id DESC);
+CREATE INDEX IF NOT EXISTS idx_leaderboard_newest ON leaderboard_entries (last_upload DESC, user_id DESC);
+CREATE INDEX IF NOT EXISTS idx_leaderboard_trending ON leaderboard_entries (trending_key DESC, user_id DESC);
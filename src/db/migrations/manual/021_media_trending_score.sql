@@ -0,0 +1,9 @@
+-- Stored trending score (src/services/trending.py), refreshed by refresh_trending_scores_async.
+ALTER TABLE media ADD COLUMN IF NOT EXISTS trending_score DOUBLE PRECISION;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_media_trending
+    ON media (trending_score DESC, id DESC)
+    WHERE trending_score IS NOT NULL;
+
+-- Replaced by the stored score
+DROP INDEX CONCURRENTLY IF EXISTS idx_media_feed_trending;
@@ -0,0 +1,32 @@
+-- Denormalized alias + social tag text for public search (src/services/search.py).
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE media ADD COLUMN IF NOT EXISTS search_text TEXT;
+ALTER TABLE leaderboard_entries ADD COLUMN IF NOT EXISTS search_text TEXT;
+
+-- Backfill (same expression as search.MEDIA_SEARCH_TEXT_SQL). On large tables run it
+-- in id ranges; new rows are written by the pipeline.
+UPDATE media SET search_text = NULLIF(lower(concat_ws(' ', u.public_alias, (
+    SELECT string_agg(tag, ' ')
+    FROM jsonb_array_elements_text(
+        CASE WHEN jsonb_typeof(media.metadata -> 'social' -> 'tags') = 'array'
+             THEN media.metadata -> 'social' -> 'tags' ELSE '[]'::jsonb END
+    ) AS tag
+))), '')
+FROM users u
+WHERE u.id = media.user_id AND media.search_text IS NULL;
+
+UPDATE leaderboard_entries SET search_text = NULLIF(lower(concat_ws(' ', alias, (
+    SELECT string_agg(tag, ' ') FROM jsonb_array_elements_text(tags) AS tag
+))), '')
+WHERE search_text IS NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_media_search_trgm
+    ON media USING GIN (search_text gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_leaderboard_search_trgm
+    ON leaderboard_entries USING GIN (search_text gin_trgm_ops);
+
+-- 019's indexes served the alias/tag-table search this replaces
+DROP INDEX CONCURRENTLY IF EXISTS idx_users_public_alias_trgm;
+DROP INDEX CONCURRENTLY IF EXISTS idx_tags_name_trgm;
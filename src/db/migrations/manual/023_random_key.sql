@@ -0,0 +1,15 @@
+-- Precomputed random sort key for sort_by=random (PublicFeedAgent._random_page).
+-- Added without a default first so the ALTER does not rewrite the table; existing rows
+-- are backfilled below (run in id ranges on large tables), new rows get random().
+ALTER TABLE media ADD COLUMN IF NOT EXISTS random_key DOUBLE PRECISION;
+ALTER TABLE media ALTER COLUMN random_key SET DEFAULT random();
+UPDATE media SET random_key = random() WHERE random_key IS NULL;
+ALTER TABLE media ALTER COLUMN random_key SET NOT NULL;
+
+ALTER TABLE leaderboard_entries ADD COLUMN IF NOT EXISTS random_key DOUBLE PRECISION;
+ALTER TABLE leaderboard_entries ALTER COLUMN random_key SET DEFAULT random();
+UPDATE leaderboard_entries SET random_key = random() WHERE random_key IS NULL;
+ALTER TABLE leaderboard_entries ALTER COLUMN random_key SET NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_media_random ON media (random_key, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_leaderboard_random ON leaderboard_entries (random_key, user_id);
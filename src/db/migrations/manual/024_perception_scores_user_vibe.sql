@@ -0,0 +1,6 @@
+-- Latest vibe score per user for the social-graph baseline (perception_facts.public_latest_vibes):
+-- DISTINCT ON (user_id) ... ORDER BY user_id, created_at DESC as an index-only scan.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_perception_scores_user_vibe
+    ON perception_scores (user_id, created_at DESC)
+    INCLUDE (media_id, vibe_score)
+    WHERE vibe_score IS NOT NULL;
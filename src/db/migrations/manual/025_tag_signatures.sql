@@ -0,0 +1,7 @@
+-- MinHash signatures of each user's latest vibe tags (src/services/minhash.py), used
+-- when SOCIAL_GRAPH_LSH is on. Backfill with: python -m src.db.backfill tag_signatures
+CREATE TABLE IF NOT EXISTS tag_signatures (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    signature BYTEA NOT NULL,
+    updated_at TIMESTAMP DEFAULT now()
+);
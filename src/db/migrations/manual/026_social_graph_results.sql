@@ -0,0 +1,8 @@
+-- Precomputed social-graph results per public user (src/services/social_graph_batch.py),
+-- rewritten by the sharded social_graph_batch_async sweep and read by SocialGraphAgent.
+CREATE TABLE IF NOT EXISTS social_graph_results (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    vibe_score INTEGER NOT NULL,
+    data JSONB NOT NULL,
+    computed_at TIMESTAMP DEFAULT now()
+);
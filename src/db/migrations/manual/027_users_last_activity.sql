@@ -0,0 +1,13 @@
+-- Last login/upload per user, so the notification sweep streams only recently active ids.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS last_activity_at TIMESTAMP DEFAULT now();
+
+UPDATE users u SET last_activity_at = GREATEST(
+    u.last_login,
+    (SELECT max(m.created_at) FROM media m WHERE m.user_id = u.id),
+    u.created_at
+);
+
+-- The sweep pages by id (keyset pagination): walk active users' ids and filter recency
+-- from the included column.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_active_id ON users (id)
+    INCLUDE (last_activity_at) WHERE is_active IS TRUE;
@@ -0,0 +1,15 @@
+-- Media already folded into each history state, so apply_media dedupes by id rather than
+-- by timestamp (a late-finishing older upload is still counted once). One key lookup per
+-- upload instead of a per-user list that grows with the history.
+CREATE TABLE IF NOT EXISTS perception_history_media (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    media_id UUID NOT NULL REFERENCES media(id) ON DELETE CASCADE,
+    PRIMARY KEY (user_id, media_id)
+);
+
+INSERT INTO perception_history_media (user_id, media_id)
+SELECT ps.user_id, ps.media_id
+FROM perception_scores ps
+JOIN perception_history_state s ON s.user_id = ps.user_id
+WHERE ps.social_score IS NOT NULL AND ps.created_at <= s.last_media_at
+ON CONFLICT DO NOTHING;
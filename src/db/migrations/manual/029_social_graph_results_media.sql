@@ -0,0 +1,4 @@
+-- The latest vibe media each precomputed social-graph result was computed for. The agent
+-- only serves a stored result for that same media, so new tags with an unchanged score
+-- are not answered from an old result. Existing rows (NULL) are recomputed live.
+ALTER TABLE social_graph_results ADD COLUMN IF NOT EXISTS media_id UUID;
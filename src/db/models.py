@@ -1,12 +1,21 @@
 from sqlalchemy import Boolean, DateTime
-from sqlalchemy import Column, String, Integer, Text, JSON, BigInteger, TIMESTAMP, Boolean, ForeignKey, Float
-from sqlalchemy.dialects.postgresql import UUID, ARRAY
+from sqlalchemy import Column, String, Integer, Text, JSON, BigInteger, TIMESTAMP, Boolean, ForeignKey, Float, Index, LargeBinary, text
+from sqlalchemy.dialects.postgresql import UUID, ARRAY, JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
+import os
 import uuid
 
+try:
+    from pgvector.sqlalchemy import Vector
+except ImportError:  # only needed against Postgres; tests and sqlite fall back to ARRAY
+    Vector = None
+
 Base = declarative_base()
 
+# Must match the vector(d) column in migration 016 and the embedding model's `dimensions`
+EMBED_DIM = int(os.getenv("EMBED_DIM", "1536"))
+
 
 class User(Base):
     __tablename__ = "users"
@@ -18,10 +27,23 @@ class User(Base):
     is_active = Column(Boolean, nullable=False, default=True)
     created_at = Column(TIMESTAMP, server_default='now()')
     last_login = Column(DateTime)
+    # Latest login or upload; the notification sweep skips users idle past NOTIFICATION_ACTIVE_DAYS
+    last_activity_at = Column(TIMESTAMP, server_default='now()')
 
     # Relationship to media
     media = relationship("Media", back_populates="user")
-    
+
+    __table_args__ = (
+        # The sweep walks active users in id order (keyset on id); last_activity_at is
+        # included so the recency filter is answered from the index
+        Index(
+            "idx_users_active_id",
+            id,
+            postgresql_include=["last_activity_at"],
+            postgresql_where=is_active.is_(True),
+        ),
+    )
+
 
 class Media(Base):
     __tablename__ = 'media'
@@ -34,19 +56,57 @@ class Media(Base):
     keyframes = Column(JSON)
     size_bytes = Column(BigInteger)
     mime = Column(String(255))
-    metadata = Column(JSON)
+    metadata = Column(JSONB)
     created_at = Column(TIMESTAMP, server_default='now()')
+    trending_score = Column(Float)  # src/services/trending.py; NULL outside the trending window
+    search_text = Column(Text)  # "alias tag tag ..." lowercased, src/services/search.py
+    random_key = Column(Float, nullable=False, server_default=text("random()"))  # sort_by=random
 
     user = relationship("User", back_populates="media")
 
+    __table_args__ = (
+        Index("idx_media_user_created", "user_id", created_at.desc()),
+        Index(
+            "idx_media_trending", trending_score.desc(), id.desc(),
+            postgresql_where=trending_score.isnot(None),
+        ),
+        Index(
+            "idx_media_search_trgm", search_text,
+            postgresql_using="gin", postgresql_ops={"search_text": "gin_trgm_ops"},
+        ),
+        Index("idx_media_random", random_key, id),
+    )
+
+
+class Notification(Base):
+    __tablename__ = "notifications"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    type = Column(String(50), nullable=False)
+    title = Column(String(255), nullable=False)
+    message = Column(Text, nullable=False)
+    metadata = Column(JSONB)
+    is_read = Column(Boolean, nullable=False, default=False)
+    created_at = Column(TIMESTAMP, server_default='now()')
+
 
 class Embedding(Base):
     __tablename__ = "embeddings"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    media_id = Column(UUID(as_uuid=True), ForeignKey("media.id", ondelete="CASCADE"), nullable=False)
-    vector = Column(ARRAY(Float), nullable=False)
+    media_id = Column(UUID(as_uuid=True), ForeignKey("media.id", ondelete="CASCADE"), nullable=False, unique=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    vector = Column(Vector(EMBED_DIM) if Vector else ARRAY(Float), nullable=False)
     model = Column(String(255))
-    created_at = Column(TIMESTAMP, server_default='now()')
+    created_at = Column(TIMESTAMP, server_default='now()')  # media.created_at, for time-window filters
+
+    __table_args__ = (
+        Index(
+            "idx_embeddings_vector_hnsw", "vector",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"vector": "vector_cosine_ops"},
+        ),
+    )
 
 
 class Face(Base):
@@ -56,14 +116,142 @@ class Face(Base):
     bbox = Column(ARRAY(Float), nullable=False)  # [x,y,w,h]
     landmarks = Column(JSON)
     crop_url = Column(Text)
+    gender = Column(String(16))
+    age = Column(Integer)
+    expression = Column(String(32))
     created_at = Column(TIMESTAMP, server_default='now()')
 
+    __table_args__ = (
+        Index("idx_faces_media", "media_id"),
+    )
+
 
 class Detection(Base):
     __tablename__ = "detections"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     media_id = Column(UUID(as_uuid=True), ForeignKey("media.id", ondelete="CASCADE"), nullable=False)
-    label = Column(String(255), nullable=False)
+    label = Column(String(255), nullable=False)  # lowercased
     score = Column(Float)
     bbox = Column(ARRAY(Float))  # [x,y,w,h]
+    source = Column(String(16), nullable=False, default="detect")  # "detect" | "fashion"
     created_at = Column(TIMESTAMP, server_default='now()')
+
+    __table_args__ = (
+        Index("idx_detections_label_media", "label", "media_id"),
+        Index("idx_detections_media", "media_id"),
+    )
+
+
+class PerceptionHistoryState(Base):
+    """Rolling per-user perception history, updated incrementally as media is processed."""
+    __tablename__ = "perception_history_state"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    media_count = Column(Integer, nullable=False, default=0)
+    score_series = Column(JSON, nullable=False, default=list)  # [{"timestamp", "score"}], capped
+    tag_counts = Column(JSON, nullable=False, default=dict)    # {"tag": count} over full history
+    pending = Column(JSON, nullable=False, default=list)       # entries added since last_summary
+    last_summary = Column(JSON)
+    last_summary_at = Column(TIMESTAMP)
+    last_media_at = Column(TIMESTAMP)
+    updated_at = Column(TIMESTAMP, server_default='now()')
+
+
+class PerceptionHistoryMedia(Base):
+    """Media already folded into a user's history state; the key dedupes retries and re-processing."""
+    __tablename__ = "perception_history_media"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    media_id = Column(UUID(as_uuid=True), ForeignKey("media.id", ondelete="CASCADE"), primary_key=True)
+
+
+class PerceptionScore(Base):
+    """Per-media scores copied out of Media.metadata so aggregates can use indexes."""
+    __tablename__ = "perception_scores"
+    media_id = Column(UUID(as_uuid=True), ForeignKey("media.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    social_score = Column(Float)   # social.social_score (0-10)
+    vibe_score = Column(Float)     # vibe_analysis.vibe_score (0-100)
+    percentile = Column(Float)     # social.percentile.overall
+    created_at = Column(TIMESTAMP, nullable=False)  # media.created_at
+
+    __table_args__ = (
+        Index("idx_perception_scores_user_created", "user_id", created_at.desc()),
+        Index("idx_perception_scores_percentile", percentile.desc().nullslast()),
+        Index("idx_perception_scores_vibe", "vibe_score"),
+        Index(
+            "idx_perception_scores_user_vibe", "user_id", created_at.desc(),
+            postgresql_include=["media_id", "vibe_score"],
+            postgresql_where=vibe_score.isnot(None),
+        ),
+    )
+
+
+class Tag(Base):
+    __tablename__ = "tags"
+    id = Column(Integer, primary_key=True)
+    name = Column(String(80), unique=True, nullable=False)
+
+
+class PerceptionTag(Base):
+    __tablename__ = "perception_tags"
+    media_id = Column(UUID(as_uuid=True), ForeignKey("media.id", ondelete="CASCADE"), primary_key=True)
+    tag_id = Column(Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True)
+    source = Column(String(16), primary_key=True)  # "social" | "vibe"
+
+    __table_args__ = (
+        Index("idx_perception_tags_tag", "tag_id", "media_id"),
+    )
+
+
+class LeaderboardEntry(Base):
+    """
+    One row per opted-in user with their latest scored upload, maintained by
+    src/services/leaderboard.py. The *_key columns are the keyset sort keys.
+    """
+    __tablename__ = "leaderboard_entries"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    alias = Column(String(80))
+    media_id = Column(UUID(as_uuid=True), ForeignKey("media.id", ondelete="SET NULL"))
+    percentile = Column(Float)     # latest social.percentile.overall
+    tags = Column(JSONB)           # latest social tags
+    last_upload = Column(TIMESTAMP, nullable=False)
+    score_key = Column(Float, nullable=False)     # COALESCE(percentile, -1)
+    trending_key = Column(Float, nullable=False)  # score_key + epoch(last_upload) / 36000
+    search_text = Column(Text)                    # "alias tag tag ..." lowercased
+    random_key = Column(Float, nullable=False, server_default=text("random()"))
+    updated_at = Column(TIMESTAMP, server_default='now()')
+
+    __table_args__ = (
+        Index("idx_leaderboard_highest", score_key.desc(), user_id.desc()),
+        Index("idx_leaderboard_newest", last_upload.desc(), user_id.desc()),
+        Index("idx_leaderboard_trending", trending_key.desc(), user_id.desc()),
+        Index(
+            "idx_leaderboard_search_trgm", search_text,
+            postgresql_using="gin", postgresql_ops={"search_text": "gin_trgm_ops"},
+        ),
+        Index("idx_leaderboard_random", random_key, user_id),
+    )
+
+
+class TagSignature(Base):
+    """
+    MinHash signature of a user's latest vibe tags (little-endian uint32s), for the
+    optional LSH shortlist in src/services/minhash.py.
+    """
+    __tablename__ = "tag_signatures"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    signature = Column(LargeBinary, nullable=False)
+    updated_at = Column(TIMESTAMP, server_default='now()')
+
+
+class SocialGraphResult(Base):
+    """
+    Precomputed SocialGraphAgent output per public user, written by the sharded batch
+    in src/services/social_graph_batch.py. `vibe_score` and `media_id` are the score and
+    latest vibe media it was computed for.
+    """
+    __tablename__ = "social_graph_results"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    vibe_score = Column(Integer, nullable=False)
+    media_id = Column(UUID(as_uuid=True))
+    data = Column(JSONB, nullable=False)  # SocialGraphOutput
+    computed_at = Column(TIMESTAMP, server_default='now()')
@@ -1,11 +1,37 @@
+from contextlib import contextmanager
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from src.db.leak_detector import ConnectionLeakDetector
 import os
 
 DATABASE_URL = os.getenv('DATABASE_URL')
-engine = create_engine(DATABASE_URL, future=True)
+
+# Pool tuning (per process: API workers and Celery workers each get their own pool)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_LEAK_THRESHOLD_SECONDS = float(os.getenv("DB_LEAK_THRESHOLD_SECONDS", "60"))
+
+
+def _pool_kwargs(url: str) -> dict:
+    if url and url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+engine = create_engine(DATABASE_URL, future=True, **_pool_kwargs(DATABASE_URL))
 SessionLocal = sessionmaker(bind=engine)
 
+leak_detector = ConnectionLeakDetector(threshold_seconds=DB_LEAK_THRESHOLD_SECONDS)
+leak_detector.attach(engine)
+
 
 def get_db():
     db = SessionLocal()
@@ -13,3 +39,21 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+@contextmanager
+def session_scope():
+    """
+    Unit of work: commits on success, rolls back on error and always returns the
+    connection to the pool. Use this instead of next(get_db()) outside of FastAPI
+    dependencies.
+    """
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,190 @@
+import os
+import uuid
+from bisect import insort
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from src.db.models import Media, PerceptionHistoryMedia, PerceptionHistoryState, PerceptionScore, PerceptionTag, Tag
+from src.services.perception_facts import normalize_tags
+
+SERIES_MAX = int(os.getenv("HISTORY_SERIES_MAX", "100"))
+PENDING_MAX = int(os.getenv("HISTORY_PENDING_MAX", "50"))
+TOP_TAGS = int(os.getenv("HISTORY_TOP_TAGS", "15"))
+
+
+def _entry_from_media(media: Media) -> Optional[Dict[str, Any]]:
+    # Same rule as bootstrap's replay (social_score IS NOT NULL), so both count the same media
+    social = (media.metadata or {}).get("social") or {}
+    if not social or "error" in social or social.get("social_score") is None:
+        return None
+    return {
+        "media_id": str(media.id),
+        "timestamp": media.created_at.isoformat() if media.created_at else None,
+        "score": social.get("social_score"),
+        # Normalized like the facts tables, so replayed and applied entries count the same tags
+        "tags": normalize_tags(social.get("tags")),
+    }
+
+
+def _parse_ts(value: Optional[str]) -> datetime:
+    return datetime.fromisoformat(value) if value else datetime.min
+
+
+def _pending_key(entry: Dict[str, Any]) -> Optional[str]:
+    # Entries stored before pending kept media ids are identified by timestamp
+    return entry.get("media_id") or entry.get("timestamp")
+
+
+class HistoryStateStore:
+    """
+    Keeps a bounded, incrementally updated history per user so that history
+    requests only have to send what changed since the last LLM summary.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get(self, user_id) -> Optional[PerceptionHistoryState]:
+        return self.db.query(PerceptionHistoryState).filter(PerceptionHistoryState.user_id == user_id).first()
+
+    def _applied(self, user_id, media_id) -> bool:
+        return self.db.get(PerceptionHistoryMedia, (user_id, media_id)) is not None
+
+    def _apply_entry(self, state: PerceptionHistoryState, entry: Dict[str, Any]):
+        self.db.add(PerceptionHistoryMedia(user_id=state.user_id, media_id=uuid.UUID(entry["media_id"])))
+
+        # JSON columns are reassigned (not mutated in place) so SQLAlchemy flags them dirty
+        # Late-finishing older uploads land in timestamp order
+        series = list(state.score_series or [])
+        insort(series, {"timestamp": entry["timestamp"], "score": entry["score"]},
+               key=lambda p: _parse_ts(p["timestamp"]))
+        state.score_series = series[-SERIES_MAX:]
+
+        counts = dict(state.tag_counts or {})
+        for tag in entry["tags"]:
+            counts[tag] = counts.get(tag, 0) + 1
+        state.tag_counts = counts
+
+        # Kept in timestamp order with their media ids; summaries clear exactly the ids they covered
+        pending = list(state.pending or [])
+        insort(pending, entry, key=lambda e: _parse_ts(e.get("timestamp")))
+        state.pending = pending[-PENDING_MAX:]
+
+        state.media_count = (state.media_count or 0) + 1
+
+    def apply_media(self, media: Media) -> Optional[PerceptionHistoryState]:
+        """Fold a freshly processed media item into its owner's history state."""
+        entry = _entry_from_media(media)
+        if entry is None:
+            return None
+
+        state = self.get(media.user_id)
+        if state is None:
+            # First time we see this user: build the state from everything they already have
+            return self.bootstrap(media.user_id)
+
+        # Already folded in (task retries, re-processing)
+        if self._applied(media.user_id, media.id):
+            return state
+
+        self._apply_entry(state, entry)
+        if media.created_at and (state.last_media_at is None or media.created_at > state.last_media_at):
+            state.last_media_at = media.created_at
+        state.updated_at = datetime.utcnow()
+        try:
+            self.db.commit()
+        except IntegrityError:
+            # A concurrent run folded the same media in first
+            self.db.rollback()
+            return self.get(media.user_id)
+        return state
+
+    def _replay_rows(self, user_id) -> Iterable[Tuple[Any, datetime, float, Optional[list]]]:
+        """(media_id, created_at, social_score, social tags) per scored media, oldest first."""
+        # Replay from the facts tables rather than parsing every metadata blob
+        return (
+            self.db.query(
+                PerceptionScore.media_id,
+                PerceptionScore.created_at,
+                PerceptionScore.social_score,
+                func.array_remove(func.array_agg(Tag.name), None),
+            )
+            .outerjoin(PerceptionTag, and_(
+                PerceptionTag.media_id == PerceptionScore.media_id, PerceptionTag.source == "social"
+            ))
+            .outerjoin(Tag, Tag.id == PerceptionTag.tag_id)
+            .filter(PerceptionScore.user_id == user_id, PerceptionScore.social_score.isnot(None))
+            .group_by(PerceptionScore.media_id, PerceptionScore.created_at, PerceptionScore.social_score)
+            .order_by(PerceptionScore.created_at.asc())
+            .yield_per(500)
+        )
+
+    def bootstrap(self, user_id) -> Optional[PerceptionHistoryState]:
+        """One-off replay of a user's full history; afterwards only apply_media is needed."""
+        state = self.get(user_id)
+        if state is None:
+            state = PerceptionHistoryState(
+                user_id=user_id, media_count=0, score_series=[], tag_counts={}, pending=[]
+            )
+            self.db.add(state)
+            seen = set()
+        else:
+            seen = {media_id for (media_id,) in self.db.query(PerceptionHistoryMedia.media_id)
+                    .filter(PerceptionHistoryMedia.user_id == user_id)}
+
+        for media_id, created_at, score, tags in self._replay_rows(user_id):
+            if media_id in seen:
+                continue
+            self._apply_entry(state, {
+                "media_id": str(media_id), "timestamp": created_at.isoformat(), "score": score, "tags": tags or [],
+            })
+            if state.last_media_at is None or created_at > state.last_media_at:
+                state.last_media_at = created_at
+
+        if not state.media_count:
+            self.db.rollback()
+            return None
+
+        state.updated_at = datetime.utcnow()
+        self.db.commit()
+        return state
+
+    @staticmethod
+    def pending_ids(state: PerceptionHistoryState) -> List[str]:
+        """Ids of the pending entries a summary built now covers; pass them to record_summary."""
+        return [_pending_key(e) for e in state.pending or []]
+
+    @staticmethod
+    def pending_entries(state: PerceptionHistoryState) -> List[Dict[str, Any]]:
+        """Pending entries as sent to the LLM (without media ids)."""
+        return [{k: v for k, v in e.items() if k != "media_id"} for e in state.pending or []]
+
+    def record_summary(self, state: PerceptionHistoryState, summary: Dict[str, Any],
+                       covered: Optional[Iterable[str]] = None):
+        """
+        Store a new LLM summary. `covered` are the pending_ids() the summary was built
+        from; entries that arrived since (e.g. while a batch was in flight, including
+        late older uploads) stay pending. None clears everything.
+        """
+        state.last_summary = summary
+        state.last_summary_at = datetime.utcnow()
+        if covered is None:
+            state.pending = []
+        else:
+            covered = set(covered)
+            state.pending = [e for e in (state.pending or []) if _pending_key(e) not in covered]
+        self.db.commit()
+
+    @staticmethod
+    def stats(state: PerceptionHistoryState) -> Dict[str, Any]:
+        scores = [p["score"] for p in (state.score_series or []) if p.get("score") is not None]
+        top_tags = sorted((state.tag_counts or {}).items(), key=lambda kv: kv[1], reverse=True)[:TOP_TAGS]
+        return {
+            "media_count": state.media_count,
+            "recent_mean_score": sum(scores) / len(scores) if scores else None,
+            "min_score": min(scores) if scores else None,
+            "max_score": max(scores) if scores else None,
+            "top_tags": dict(top_tags),
+        }
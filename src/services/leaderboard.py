@@ -0,0 +1,140 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import delete, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from src.db.models import LeaderboardEntry, PerceptionScore, PerceptionTag, Tag, User
+from src.db.media_repository import latest_media
+from src.services.search import search_text
+
+EPOCH = datetime(1970, 1, 1)
+
+# Set-based rebuild used by the periodic consistency refresh; only rows whose
+# content changed are rewritten.
+REFRESH_SQL = text("""
+WITH latest_upload AS (
+    SELECT m.user_id, max(m.created_at) AS last_upload
+    FROM media m
+    JOIN users u ON u.id = m.user_id AND u.opt_in_public_analysis
+    GROUP BY m.user_id
+), latest_score AS (
+    SELECT DISTINCT ON (ps.user_id) ps.user_id, ps.media_id, ps.percentile
+    FROM perception_scores ps
+    WHERE ps.percentile IS NOT NULL
+    ORDER BY ps.user_id, ps.created_at DESC
+), entries AS (
+    SELECT
+        lu.user_id,
+        u.public_alias AS alias,
+        ls.media_id,
+        ls.percentile,
+        COALESCE((
+            SELECT jsonb_agg(t.name ORDER BY t.name)
+            FROM perception_tags pt JOIN tags t ON t.id = pt.tag_id
+            WHERE pt.media_id = ls.media_id AND pt.source = 'social'
+        ), '[]'::jsonb) AS tags,
+        lu.last_upload
+    FROM latest_upload lu
+    JOIN users u ON u.id = lu.user_id
+    LEFT JOIN latest_score ls ON ls.user_id = lu.user_id
+)
+INSERT INTO leaderboard_entries
+    (user_id, alias, media_id, percentile, tags, last_upload, score_key, trending_key, search_text, updated_at)
+SELECT
+    user_id, alias, media_id, percentile, tags, last_upload,
+    COALESCE(percentile, -1),
+    COALESCE(percentile, -1) + EXTRACT(EPOCH FROM last_upload) / 36000,
+    NULLIF(lower(concat_ws(' ', alias, (SELECT string_agg(tag, ' ') FROM jsonb_array_elements_text(tags) AS tag))), ''),
+    now()
+FROM entries
+ON CONFLICT (user_id) DO UPDATE SET
+    alias = EXCLUDED.alias,
+    media_id = EXCLUDED.media_id,
+    percentile = EXCLUDED.percentile,
+    tags = EXCLUDED.tags,
+    last_upload = EXCLUDED.last_upload,
+    score_key = EXCLUDED.score_key,
+    trending_key = EXCLUDED.trending_key,
+    search_text = EXCLUDED.search_text,
+    updated_at = EXCLUDED.updated_at
+WHERE (leaderboard_entries.alias, leaderboard_entries.media_id, leaderboard_entries.percentile,
+       leaderboard_entries.tags, leaderboard_entries.last_upload)
+      IS DISTINCT FROM (EXCLUDED.alias, EXCLUDED.media_id, EXCLUDED.percentile, EXCLUDED.tags, EXCLUDED.last_upload)
+""")
+
+PRUNE_SQL = text("""
+DELETE FROM leaderboard_entries le
+WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.id = le.user_id AND u.opt_in_public_analysis)
+   OR NOT EXISTS (SELECT 1 FROM media m WHERE m.user_id = le.user_id)
+""")
+
+
+def sort_keys(percentile: Optional[float], last_upload: datetime):
+    score_key = percentile if percentile is not None else -1.0
+    # Same as EXTRACT(EPOCH FROM timestamp) in Postgres: naive timestamps are treated as UTC
+    return score_key, score_key + (last_upload - EPOCH).total_seconds() / 36000
+
+
+class LeaderboardStore:
+    """
+    Keeps leaderboard_entries in step with the pipeline and opt-in changes. Does not
+    commit; callers flush it with the change that triggered it.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def remove_user(self, user_id):
+        self.db.execute(delete(LeaderboardEntry).where(LeaderboardEntry.user_id == user_id))
+
+    def sync_user(self, user_id):
+        """Recompute one user's row (or drop it if they are no longer eligible)."""
+        user = self.db.execute(
+            select(User.public_alias, User.opt_in_public_analysis).where(User.id == user_id)
+        ).first()
+        latest = latest_media(self.db, user_id)
+        if not user or not user.opt_in_public_analysis or latest is None:
+            self.remove_user(user_id)
+            return None
+
+        scored = self.db.execute(
+            select(PerceptionScore.media_id, PerceptionScore.percentile)
+            .where(PerceptionScore.user_id == user_id, PerceptionScore.percentile.isnot(None))
+            .order_by(PerceptionScore.created_at.desc())
+            .limit(1)
+        ).first()
+        tags = []
+        if scored:
+            tags = list(self.db.execute(
+                select(Tag.name)
+                .join(PerceptionTag, PerceptionTag.tag_id == Tag.id)
+                .where(PerceptionTag.media_id == scored.media_id, PerceptionTag.source == "social")
+                .order_by(Tag.name)
+            ).scalars())
+
+        percentile = scored.percentile if scored else None
+        score_key, trending_key = sort_keys(percentile, latest.created_at)
+        row = {
+            "user_id": user_id,
+            "alias": user.public_alias,
+            "media_id": scored.media_id if scored else None,
+            "percentile": percentile,
+            "tags": tags,
+            "last_upload": latest.created_at,
+            "score_key": score_key,
+            "trending_key": trending_key,
+            "search_text": search_text(user.public_alias, tags),
+            "updated_at": datetime.utcnow(),
+        }
+        stmt = insert(LeaderboardEntry).values(**row)
+        self.db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={k: stmt.excluded[k] for k in row if k != "user_id"},
+        ))
+        return row
+
+    def refresh_all(self) -> dict:
+        """Periodic consistency pass: rebuild changed rows and prune ineligible users."""
+        upserted = self.db.execute(REFRESH_SQL).rowcount
+        pruned = self.db.execute(PRUNE_SQL).rowcount
+        return {"upserted": upserted, "pruned": pruned}
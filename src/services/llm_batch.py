@@ -0,0 +1,307 @@
+import json
+import logging
+import os
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+LLM_BATCH_MODE = os.getenv("LLM_BATCH_MODE", "false").lower() in ("1", "true", "yes")
+LLM_BATCH_BACKEND = os.getenv("LLM_BATCH_BACKEND", "openai")
+LLM_BATCH_DIR = os.getenv("LLM_BATCH_DIR", "/tmp/lifemirror-batches")
+LLM_BATCH_MAX_REQUESTS = int(os.getenv("LLM_BATCH_MAX_REQUESTS", "5000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+
+PENDING_KEY = "llm_batch:pending"
+PENDING_KEYED_KEY = "llm_batch:pending_keyed"  # dedupe_key -> latest request
+KEYED_MARKER = "key:"
+SUBMITTED_KEY = "llm_batch:submitted"
+
+
+class BatchRequest(BaseModel):
+    custom_id: str
+    agent: str              # agent `name`, used to route the result back to its parser
+    media_id: str           # where the parsed result is stored in Media.metadata
+    metadata_key: str
+    body: Dict[str, Any]    # chat.completions request body
+    context: Dict[str, Any] = {}
+    # Requests sharing a key replace each other while queued (e.g. "<agent>:<user_id>")
+    dedupe_key: Optional[str] = None
+
+    def to_jsonl_line(self) -> str:
+        return json.dumps({
+            "custom_id": self.custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": self.body,
+        }, separators=(",", ":"))
+
+
+def new_custom_id(agent: str) -> str:
+    return f"{agent}:{uuid.uuid4().hex}"
+
+
+def write_jsonl(requests: Iterable[BatchRequest], path: str) -> int:
+    n = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for r in requests:
+            f.write(r.to_jsonl_line() + "\n")
+            n += 1
+    return n
+
+
+def parse_output_jsonl(lines: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Parse batch output lines into {custom_id: {"content": str | None, "error": str | None}}.
+    """
+    results = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        row = json.loads(line)
+        response = row.get("response") or {}
+        err = row.get("error")
+        content = None
+        if not err and response.get("status_code", 200) == 200:
+            choices = (response.get("body") or {}).get("choices") or []
+            if choices:
+                content = choices[0]["message"]["content"]
+        if content is None and not err:
+            err = f"status_code={response.get('status_code')}"
+        results[row["custom_id"]] = {"content": content, "error": err and str(err)}
+    return results
+
+
+# --------------------------------------------------------------------------------------
+# Backends
+# --------------------------------------------------------------------------------------
+class BatchBackend:
+    name = "base"
+
+    def submit(self, jsonl_path: str) -> str:
+        raise NotImplementedError
+
+    def status(self, batch_id: str) -> str:
+        """One of: "in_progress", "completed", "failed"."""
+        raise NotImplementedError
+
+    def results(self, batch_id: str) -> Dict[str, Dict[str, Any]]:
+        raise NotImplementedError
+
+
+class OpenAIBatchBackend(BatchBackend):
+    name = "openai"
+
+    def __init__(self, client=None):
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = client
+
+    def submit(self, jsonl_path: str) -> str:
+        with open(jsonl_path, "rb") as f:
+            upload = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=upload.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status == "completed":
+            return "completed"
+        if batch.status in ("failed", "expired", "cancelled"):
+            return "failed"
+        return "in_progress"
+
+    def results(self, batch_id: str) -> Dict[str, Dict[str, Any]]:
+        batch = self.client.batches.retrieve(batch_id)
+        out = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                text = self.client.files.content(file_id).text
+                out.update(parse_output_jsonl(text.splitlines()))
+        return out
+
+
+class LocalFileBatchBackend(BatchBackend):
+    """
+    File-based stand-in for tests and offline runs. A batch is a directory holding
+    input.jsonl; it completes once output.jsonl exists. If a `responder` is given
+    (request body -> response content), output is produced on the first status poll.
+    """
+    name = "local"
+
+    def __init__(self, root_dir: str = LLM_BATCH_DIR, responder: Optional[Callable[[Dict[str, Any]], str]] = None):
+        self.root_dir = root_dir
+        self.responder = responder
+        os.makedirs(root_dir, exist_ok=True)
+
+    def _dir(self, batch_id: str) -> str:
+        return os.path.join(self.root_dir, batch_id)
+
+    def submit(self, jsonl_path: str) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        os.makedirs(self._dir(batch_id))
+        with open(jsonl_path, encoding="utf-8") as src, \
+                open(os.path.join(self._dir(batch_id), "input.jsonl"), "w", encoding="utf-8") as dst:
+            dst.write(src.read())
+        return batch_id
+
+    def _respond(self, batch_id: str):
+        with open(os.path.join(self._dir(batch_id), "input.jsonl"), encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        with open(os.path.join(self._dir(batch_id), "output.jsonl"), "w", encoding="utf-8") as out:
+            for row in rows:
+                try:
+                    content = self.responder(row["body"])
+                    line = {"custom_id": row["custom_id"], "response": {"status_code": 200, "body": {
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]
+                    }}, "error": None}
+                except Exception as e:
+                    line = {"custom_id": row["custom_id"], "response": None, "error": str(e)}
+                out.write(json.dumps(line) + "\n")
+
+    def status(self, batch_id: str) -> str:
+        if not os.path.isdir(self._dir(batch_id)):
+            return "failed"
+        output = os.path.join(self._dir(batch_id), "output.jsonl")
+        if not os.path.exists(output) and self.responder is not None:
+            self._respond(batch_id)
+        return "completed" if os.path.exists(output) else "in_progress"
+
+    def results(self, batch_id: str) -> Dict[str, Dict[str, Any]]:
+        with open(os.path.join(self._dir(batch_id), "output.jsonl"), encoding="utf-8") as f:
+            return parse_output_jsonl(f)
+
+
+def get_backend() -> BatchBackend:
+    if LLM_BATCH_BACKEND == "local":
+        return LocalFileBatchBackend()
+    return OpenAIBatchBackend()
+
+
+# --------------------------------------------------------------------------------------
+# Queue (shared across workers via Redis)
+# --------------------------------------------------------------------------------------
+class LLMBatchQueue:
+    """
+    Accumulates BatchRequests until the submit task drains them into one JSONL batch.
+    Submitted batches keep their requests so results can be routed back.
+
+    A request with a dedupe_key is stored under that key and queued once: enqueueing
+    another one with the same key before the drain replaces it in place, so repeated
+    refreshes for a user become one request built from the latest state.
+    """
+
+    def __init__(self, redis_client=None):
+        if redis_client is None:
+            import redis
+            redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+        self.r = redis_client
+
+    def enqueue(self, req: BatchRequest):
+        if req.dedupe_key is None:
+            self.r.rpush(PENDING_KEY, req.json())
+        elif self.r.hset(PENDING_KEYED_KEY, req.dedupe_key, req.json()):
+            # New key: queue a marker; an already queued key just had its request replaced
+            self.r.rpush(PENDING_KEY, KEYED_MARKER + req.dedupe_key)
+
+    def drain(self, max_n: int = LLM_BATCH_MAX_REQUESTS) -> List[BatchRequest]:
+        pipe = self.r.pipeline()
+        pipe.lrange(PENDING_KEY, 0, max_n - 1)
+        pipe.ltrim(PENDING_KEY, max_n, -1)
+        raw, _ = pipe.execute()
+
+        keys = [x[len(KEYED_MARKER):] for x in raw if x.startswith(KEYED_MARKER)]
+        keyed = {}
+        if keys:
+            # Read and delete together: an enqueue in between either replaces what is read
+            # here or, once the key is gone, queues a fresh marker
+            pipe = self.r.pipeline()
+            pipe.hmget(PENDING_KEYED_KEY, keys)
+            pipe.hdel(PENDING_KEYED_KEY, *keys)
+            values, _ = pipe.execute()
+            keyed = dict(zip(keys, values))
+
+        requests = []
+        for x in raw:
+            if x.startswith(KEYED_MARKER):
+                x = keyed.get(x[len(KEYED_MARKER):])
+                if x is None:
+                    continue
+            requests.append(BatchRequest.parse_raw(x))
+        return requests
+
+    def requeue(self, requests: List[BatchRequest]):
+        """Put drained requests back at the head of the queue, in their original order."""
+        markers = []
+        for r in requests:
+            if r.dedupe_key is None:
+                markers.append(r.json())
+            elif self.r.hsetnx(PENDING_KEYED_KEY, r.dedupe_key, r.json()):
+                markers.append(KEYED_MARKER + r.dedupe_key)
+            # else a newer request for the key was queued meanwhile and wins
+        if markers:
+            self.r.lpush(PENDING_KEY, *reversed(markers))
+
+    def mark_submitted(self, batch_id: str, requests: List[BatchRequest]):
+        self.r.hset(SUBMITTED_KEY, batch_id, json.dumps([r.dict() for r in requests]))
+
+    def submitted(self) -> Dict[str, List[BatchRequest]]:
+        return {
+            batch_id: [BatchRequest(**r) for r in json.loads(raw)]
+            for batch_id, raw in self.r.hgetall(SUBMITTED_KEY).items()
+        }
+
+    def mark_done(self, batch_id: str):
+        self.r.hdel(SUBMITTED_KEY, batch_id)
+
+
+def submit_batch(backend: BatchBackend, requests: List[BatchRequest], work_dir: str = LLM_BATCH_DIR) -> str:
+    os.makedirs(work_dir, exist_ok=True)
+    path = os.path.join(work_dir, f"submit_{uuid.uuid4().hex}.jsonl")
+    write_jsonl(requests, path)
+    try:
+        return backend.submit(path)
+    finally:
+        os.remove(path)
+
+
+def fan_out(
+    requests: List[BatchRequest],
+    results: Dict[str, Dict[str, Any]],
+    parsers: Dict[str, Callable[[BatchRequest, str], Any]],
+    store: Callable[[str, str, Dict[str, Any]], Any],
+) -> Dict[str, int]:
+    """
+    Route each result to its agent parser and store successful outputs under
+    Media.metadata[metadata_key]. Returns counts of stored / failed requests.
+    A request that cannot be parsed or stored is counted as failed and the rest
+    still go through, so the batch can always be marked done.
+    """
+    counts = {"stored": 0, "failed": 0}
+    for req in requests:
+        res = results.get(req.custom_id)
+        parser = parsers.get(req.agent)
+        if not res or res["content"] is None or parser is None:
+            if parser is None:
+                logger.error(f"[llm_batch] no parser for agent {req.agent!r} ({req.custom_id})")
+            counts["failed"] += 1
+            continue
+        try:
+            output = parser(req, res["content"])
+            if not output.success:
+                counts["failed"] += 1
+                continue
+            store(req.media_id, req.metadata_key, output.data)
+        except Exception as e:
+            logger.exception(f"[llm_batch] {req.custom_id} failed: {e}")
+            counts["failed"] += 1
+            continue
+        counts["stored"] += 1
+    return counts
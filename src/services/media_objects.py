@@ -0,0 +1,114 @@
+from typing import Any, Dict, Iterable, List, Optional
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+from src.db.models import Detection, Face, Media
+
+# Detection.source values: object detector vs. fashion item classifier
+DETECTION_SOURCES = {"objects": "detect", "fashion_crops": "fashion"}
+
+
+def _bbox(value) -> Optional[List[float]]:
+    if isinstance(value, (list, tuple)) and value and all(isinstance(v, (int, float)) for v in value):
+        return [float(v) for v in value]
+    return None
+
+
+def _label(value, width: int) -> Optional[str]:
+    """A string column value; DeepFace score dicts ({"Woman": 97.1, "Man": 2.9}) become their top label."""
+    if isinstance(value, dict):
+        scores = {k: v for k, v in value.items() if isinstance(v, (int, float))}
+        value = max(scores, key=scores.get) if scores else None
+    return str(value)[:width] if value else None
+
+
+def face_rows(media_id, faces: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Face rows from FaceTool output ({"bbox", "landmarks", "crop_url", "attributes": {...}});
+    FaceAgent's flattened faces (gender/age/expression at the top level) are read as well.
+    """
+    rows = []
+    for f in faces or []:
+        bbox = _bbox(f.get("bbox"))
+        if bbox is None:  # Face.bbox is NOT NULL; older metadata only kept crops
+            continue
+        attrs = f.get("attributes") or {}
+        age = attrs.get("age", f.get("age"))
+        rows.append({
+            "media_id": media_id,
+            "bbox": bbox,
+            "landmarks": f.get("landmarks"),
+            "crop_url": f.get("crop_url"),
+            "gender": _label(attrs.get("gender", f.get("gender")), Face.gender.type.length),
+            "age": int(age) if isinstance(age, (int, float)) and not isinstance(age, bool) else None,
+            "expression": _label(attrs.get("expression", f.get("expression")), Face.expression.type.length),
+        })
+    return rows
+
+
+def detection_rows(media_id, items: Iterable[Dict[str, Any]], source: str = "detect") -> List[Dict[str, Any]]:
+    rows = []
+    for d in items or []:
+        label = d.get("label") or d.get("type")
+        if not label:
+            continue
+        rows.append({
+            "media_id": media_id,
+            "label": str(label).strip().lower(),
+            "score": d.get("score"),
+            "bbox": _bbox(d.get("bbox")),
+            "source": source,
+        })
+    return rows
+
+
+class MediaObjectsWriter:
+    """
+    Replaces a media item's Face / Detection rows with one batched INSERT per table
+    (executemany, sent as multi-row VALUES). Does not commit, so rows land in the
+    same transaction as the metadata they were parsed from.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def replace_faces(self, media_ids: List, rows: List[Dict[str, Any]]):
+        if not media_ids:
+            return
+        self.db.execute(delete(Face).where(Face.media_id.in_(media_ids)))
+        if rows:
+            self.db.execute(insert(Face), rows)
+
+    def replace_detections(self, media_ids: List, rows: List[Dict[str, Any]], source: str):
+        if not media_ids:
+            return
+        self.db.execute(delete(Detection).where(Detection.media_id.in_(media_ids), Detection.source == source))
+        if rows:
+            self.db.execute(insert(Detection), rows)
+
+    def record_faces(self, media_id, faces: Iterable[Dict[str, Any]]):
+        self.replace_faces([media_id], face_rows(media_id, faces))
+
+    def record_detections(self, media_id, items: Iterable[Dict[str, Any]], source: str = "detect"):
+        self.replace_detections([media_id], detection_rows(media_id, items, source), source)
+
+    def record_many(self, media_items: List[Media]):
+        """Backfill path: rebuild rows for a chunk of media from their metadata."""
+        ids = [m.id for m in media_items]
+        md = {m.id: m.metadata or {} for m in media_items}
+        self.replace_faces(ids, [r for mid in ids for r in face_rows(mid, md[mid].get("faces"))])
+        for key, source in DETECTION_SOURCES.items():
+            rows = [r for mid in ids for r in detection_rows(mid, md[mid].get(key), source)]
+            self.replace_detections(ids, rows, source)
+
+
+def media_ids_with_label(db: Session, label: str, min_score: float = 0.0, limit: int = 50) -> List:
+    """e.g. media_ids_with_label(db, "jacket"); served by idx_detections_label_media."""
+    q = (
+        select(Detection.media_id)
+        .where(Detection.label == label.strip().lower())
+        .distinct()
+        .limit(limit)
+    )
+    if min_score:
+        q = q.where(Detection.score >= min_score)
+    return list(db.execute(q).scalars())
@@ -0,0 +1,178 @@
+"""
+Optional MinHash/LSH candidate generation for the social graph (SOCIAL_GRAPH_LSH=true).
+
+With very common tags, the exact TagIndex has to score every user sharing one. Here
+each public user's vibe tag set gets a MinHash signature (MINHASH_PERMUTATIONS uint32s,
+stored as bytes in tag_signatures and updated by the pipeline). LSH banding turns
+signatures into a shortlist of likely-similar users. SocialGraphAgent._rank_users
+re-ranks that shortlist exactly.
+"""
+import logging
+import os
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from src.db.models import TagSignature, User
+from src.services.perception_facts import latest_vibe
+
+logger = logging.getLogger(__name__)
+
+SOCIAL_GRAPH_LSH = os.getenv("SOCIAL_GRAPH_LSH", "false").lower() in ("1", "true", "yes")
+MINHASH_PERMUTATIONS = int(os.getenv("MINHASH_PERMUTATIONS", "64"))
+LSH_BANDS = int(os.getenv("LSH_BANDS", "16"))  # rows per band = permutations / bands
+LSH_SHORTLIST = int(os.getenv("LSH_SHORTLIST", "200"))
+# Cap on ids read from one band bucket, so a huge bucket (everyone tagged just
+# "confident") cannot turn a query back into a scan
+LSH_MAX_BUCKET_SCAN = int(os.getenv("LSH_MAX_BUCKET_SCAN", "500"))
+MINHASH_SEED = 1
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+
+def _coefficients(num_perm: int, seed: int = MINHASH_SEED):
+    rng = np.random.default_rng(seed)
+    # a < 2^31 and tag hashes < 2^32 keep a * x + b inside uint64
+    a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+_A, _B = _coefficients(MINHASH_PERMUTATIONS)
+
+
+def signature(tags: Iterable[str], num_perm: int = MINHASH_PERMUTATIONS) -> np.ndarray:
+    """MinHash signature of a tag set; an empty set gets all-max values and matches nothing."""
+    a, b = (_A, _B) if num_perm == MINHASH_PERMUTATIONS else _coefficients(num_perm)
+    hashes = np.array(sorted({zlib.crc32(str(t).encode()) for t in tags}), dtype=np.uint64)
+    if hashes.size == 0:
+        return np.full(num_perm, _MAX_HASH, dtype=np.uint32)
+    permuted = (hashes[:, None] * a + b) % np.uint64(_PRIME) & _MAX_HASH
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def to_bytes(sig: np.ndarray) -> bytes:
+    return sig.astype("<u4").tobytes()
+
+
+def from_bytes(raw: bytes) -> np.ndarray:
+    return np.frombuffer(raw, dtype="<u4").astype(np.uint32)
+
+
+def estimated_jaccard(sig: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """Share of matching positions between `sig` and each row of `others`."""
+    return (others == sig).mean(axis=1)
+
+
+def store_signature(db: Session, user_id, tags: Iterable[str]):
+    """Upsert a user's signature. Does not commit."""
+    stmt = insert(TagSignature).values(user_id=user_id, signature=to_bytes(signature(tags)))
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={"signature": stmt.excluded.signature, "updated_at": stmt.excluded.updated_at},
+    ))
+
+
+def sync_user_signature(db: Session, user_id):
+    """Refresh a user's signature from their latest vibe tags and commit. Failures are logged."""
+    try:
+        latest = latest_vibe(db, user_id)
+        store_signature(db, user_id, (latest or {}).get("tags") or [])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"[minhash] signature sync failed for {user_id}: {e}")
+
+
+class MinHashLSH:
+    def __init__(self, num_perm: int = MINHASH_PERMUTATIONS, bands: int = LSH_BANDS):
+        if num_perm % bands:
+            raise ValueError(f"{num_perm} permutations do not split into {bands} bands")
+        self.num_perm, self.bands, self.rows = num_perm, bands, num_perm // bands
+        self._tables: List[Dict[bytes, Set[str]]] = [defaultdict(set) for _ in range(bands)]
+        self._row_of: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._sigs = np.zeros((0, num_perm), dtype=np.uint32)
+
+    @classmethod
+    def from_db(cls, db: Session, batch_size: int = 5000) -> "MinHashLSH":
+        index = cls()
+        rows = db.execute(
+            select(TagSignature.user_id, TagSignature.signature)
+            .join(User, User.id == TagSignature.user_id)
+            .where(User.opt_in_public_analysis.is_(True))
+            .execution_options(yield_per=batch_size)
+        )
+        for user_id, raw in rows:
+            sig = from_bytes(raw)
+            if sig.shape[0] == index.num_perm:  # skip signatures from another MINHASH_PERMUTATIONS
+                index.add(user_id, sig)
+        return index
+
+    def copy(self) -> "MinHashLSH":
+        """Independent copy, for patching without touching an index readers may be using."""
+        other = MinHashLSH(self.num_perm, self.bands)
+        other._tables = [defaultdict(set, {key: set(ids) for key, ids in table.items()}) for table in self._tables]
+        other._row_of = dict(self._row_of)
+        other._ids = list(self._ids)
+        other._sigs = self._sigs.copy()
+        return other
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def _band_keys(self, sig: np.ndarray) -> List[bytes]:
+        return [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, user_id, sig: np.ndarray):
+        """Insert or replace a user's signature."""
+        uid = str(user_id)
+        self.remove(uid)
+        if (sig == _MAX_HASH).all():
+            return  # no tags: nothing to collide on
+        row = len(self._ids)
+        if row >= self._sigs.shape[0]:
+            grown = np.zeros((max(16, row * 2), self.num_perm), dtype=np.uint32)
+            grown[:row] = self._sigs[:row]
+            self._sigs = grown
+        self._sigs[row] = sig
+        self._ids.append(uid)
+        self._row_of[uid] = row
+        for table, key in zip(self._tables, self._band_keys(sig)):
+            table[key].add(uid)
+
+    def remove(self, user_id):
+        uid = str(user_id)
+        row = self._row_of.pop(uid, None)
+        if row is None:
+            return
+        for table, key in zip(self._tables, self._band_keys(self._sigs[row])):
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(uid)
+                if not bucket:
+                    del table[key]
+        self._ids[row] = None
+
+    def query(self, tags: Iterable[str], n: int = LSH_SHORTLIST, exclude_user_id=None) -> List[str]:
+        """Up to n user ids sharing a band with the tag set, best estimated Jaccard first."""
+        sig = signature(tags, self.num_perm)
+        if (sig == _MAX_HASH).all():
+            return []
+        found: Set[str] = set()
+        for table, key in zip(self._tables, self._band_keys(sig)):
+            for i, uid in enumerate(table.get(key, ())):
+                if i >= LSH_MAX_BUCKET_SCAN:
+                    break
+                found.add(uid)
+        found.discard(str(exclude_user_id))
+        if not found:
+            return []
+        ids = sorted(found, key=self._row_of.__getitem__)
+        scores = estimated_jaccard(sig, self._sigs[[self._row_of[u] for u in ids]])
+        order = np.argsort(-scores, kind="stable")[:n]
+        return [ids[i] for i in order]
@@ -0,0 +1,133 @@
+"""
+Fan-out for the periodic notification check.
+
+check_notifications_async streams recently active user ids (server-side cursor over
+users.last_activity_at >= now - NOTIFICATION_ACTIVE_DAYS, ordered by id), cuts them into
+chunks of NOTIFICATION_CHUNK_SIZE and dispatches them as Celery groups of
+notify_users_chunk_async, so the sweep spreads over however many workers are running.
+SweepCheckpoint keeps the last dispatched id and progress counters in Redis; a sweep
+that was cut off resumes after that id on the next run instead of starting over. A Redis
+lock keeps a second coordinator (beat firing while a resumed run is still going) from
+dispatching the same users again.
+"""
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from src.db.models import User
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+NOTIFICATION_CHUNK_SIZE = int(os.getenv("NOTIFICATION_CHUNK_SIZE", "200"))
+NOTIFICATION_DISPATCH_CHUNKS = int(os.getenv("NOTIFICATION_DISPATCH_CHUNKS", "20"))  # chunks per group
+NOTIFICATION_ACTIVE_DAYS = int(os.getenv("NOTIFICATION_ACTIVE_DAYS", "90"))
+# An unfinished checkpoint older than this is abandoned and a new sweep starts. Well past
+# the 6-hour beat period, so a sweep that needs several runs is resumed, not restarted.
+NOTIFICATION_SWEEP_MAX_AGE_SECONDS = int(os.getenv("NOTIFICATION_SWEEP_MAX_AGE_SECONDS", str(24 * 3600)))
+# Outlives the coordinator's 900 s hard time limit, so a killed run's lock still expires
+NOTIFICATION_SWEEP_LOCK_SECONDS = int(os.getenv("NOTIFICATION_SWEEP_LOCK_SECONDS", "960"))
+KEY = "notifications:sweep"
+
+# KEYS: lock. ARGV: token. Deletes the lock only if this holder still owns it.
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def active_user_ids(db: Session, after_id=None, active_days: int = NOTIFICATION_ACTIVE_DAYS,
+                    batch_size: int = NOTIFICATION_CHUNK_SIZE) -> Iterator[Any]:
+    """Ids of active users seen in the last `active_days`, ascending, streamed."""
+    since = datetime.utcnow() - timedelta(days=active_days)
+    q = (
+        select(User.id)
+        .where(User.is_active.is_(True), User.last_activity_at >= since)
+        .order_by(User.id)
+        .execution_options(yield_per=batch_size)
+    )
+    if after_id is not None:
+        q = q.where(User.id > after_id)
+    yield from db.execute(q).scalars()
+
+
+def iter_chunks(ids: Iterable[Any], size: int = NOTIFICATION_CHUNK_SIZE) -> Iterator[List[str]]:
+    chunk = []
+    for uid in ids:
+        chunk.append(str(uid))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class SweepCheckpoint:
+    def __init__(self, redis_client=None, key: str = KEY):
+        self._r = redis_client
+        self.key = key
+        self.lock_key = f"{key}:lock"
+
+    @property
+    def r(self):
+        if self._r is None:
+            import redis
+            self._r = redis.from_url(REDIS_URL, decode_responses=True)
+        return self._r
+
+    def acquire(self, ttl: int = NOTIFICATION_SWEEP_LOCK_SECONDS) -> Optional[str]:
+        """Take the coordinator lock; returns the token to release it with, or None if held."""
+        token = uuid.uuid4().hex
+        return token if self.r.set(self.lock_key, token, nx=True, ex=ttl) else None
+
+    def release(self, token: str):
+        self.r.eval(_RELEASE_LUA, 1, self.lock_key, token)
+
+    def resume(self) -> Dict[str, Any]:
+        """The unfinished sweep to continue, or a fresh one."""
+        state = self.r.hgetall(self.key)
+        fresh = state and time.time() - float(state.get("started_at", 0)) < NOTIFICATION_SWEEP_MAX_AGE_SECONDS
+        if fresh and not int(state.get("dispatched_all", 0)):
+            return {"sweep_id": state["sweep_id"], "after_id": state.get("after_id") or None}
+        sweep_id = uuid.uuid4().hex
+        pipe = self.r.pipeline(transaction=True)
+        pipe.delete(self.key)
+        pipe.hset(self.key, mapping={"sweep_id": sweep_id, "after_id": "", "started_at": time.time(),
+                                     "dispatched": 0, "done": 0, "failed": 0, "dispatched_all": 0})
+        pipe.execute()
+        return {"sweep_id": sweep_id, "after_id": None}
+
+    def advance(self, after_id, users: int):
+        """Record that everything up to `after_id` has been dispatched."""
+        pipe = self.r.pipeline(transaction=True)
+        pipe.hset(self.key, "after_id", str(after_id))
+        pipe.hincrby(self.key, "dispatched", users)
+        pipe.execute()
+
+    def finish(self):
+        self.r.hset(self.key, mapping={"dispatched_all": 1, "dispatched_at": time.time()})
+
+    def record(self, sweep_id: str, done: int, failed: int):
+        """Count a finished chunk, unless a newer sweep has replaced this one."""
+        if self.r.hget(self.key, "sweep_id") != sweep_id:
+            return
+        pipe = self.r.pipeline(transaction=False)
+        pipe.hincrby(self.key, "done", done)
+        pipe.hincrby(self.key, "failed", failed)
+        pipe.execute()
+
+    def progress(self) -> Optional[Dict[str, Any]]:
+        state = self.r.hgetall(self.key)
+        if not state:
+            return None
+        return {
+            "sweep_id": state["sweep_id"],
+            "after_id": state.get("after_id") or None,
+            "dispatched": int(state.get("dispatched", 0)),
+            "done": int(state.get("done", 0)),
+            "failed": int(state.get("failed", 0)),
+            "dispatched_all": bool(int(state.get("dispatched_all", 0))),
+        }
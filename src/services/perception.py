@@ -7,6 +7,11 @@ class PerceptionAggregator:
 
     def build_profile(self, media_id: int) -> dict:
         media = self.db.query(Media).filter(Media.id == media_id).first()
+        return self.profile_from_media(media)
+
+    @staticmethod
+    def profile_from_media(media) -> dict:
+        """Pure part of build_profile, shared with the async route."""
         if not media or not media.metadata:
             return {"error": "Media not found or not processed yet"}
 
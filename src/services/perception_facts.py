@@ -0,0 +1,166 @@
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from sqlalchemy import func, select, delete
+from sqlalchemy.dialects.postgresql import aggregate_order_by, distinct_on, insert
+from sqlalchemy.orm import Session
+from src.db.models import Media, PerceptionScore, PerceptionTag, Tag, User
+
+# Metadata keys whose contents feed the facts tables
+FACT_KEYS = {"social", "vibe_analysis"}
+BASELINE_YIELD_PER = int(os.getenv("BASELINE_YIELD_PER", "2000"))
+
+TAG_SOURCES = {
+    "social": ("social", "tags"),
+    "vibe": ("vibe_analysis", "vibe_tags"),
+}
+TAG_NAME_MAX = Tag.__table__.c.name.type.length
+
+
+def _num(value) -> Optional[float]:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def normalize_tags(values: Optional[Iterable[Any]]) -> List[str]:
+    """
+    Tags as stored in the tags table: trimmed, lowercased, cut to the column width,
+    de-duplicated and sorted. A longer LLM tag would otherwise abort the whole insert.
+    """
+    names = {str(t).strip().lower()[:TAG_NAME_MAX].rstrip() for t in values or []}
+    names.discard("")
+    return sorted(names)
+
+
+def extract_facts(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Pull scores and tags out of a Media.metadata blob."""
+    md = metadata or {}
+    social = md.get("social") or {}
+    vibe = md.get("vibe_analysis") or {}
+    if "error" in social:
+        social = {}
+
+    tags = {}
+    for source, (key, field) in TAG_SOURCES.items():
+        tags[source] = normalize_tags((md.get(key) or {}).get(field))
+
+    return {
+        "social_score": _num(social.get("social_score")),
+        "vibe_score": _num(vibe.get("vibe_score")),
+        "percentile": _num((social.get("percentile") or {}).get("overall")),
+        "tags": tags,
+    }
+
+
+class PerceptionFactsWriter:
+    """
+    Upserts perception_scores / perception_tags rows for media items. Does not
+    commit, so facts land in the same transaction as the metadata they mirror.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def tag_ids(self, names: Iterable[str]) -> Dict[str, int]:
+        names = sorted(set(names))
+        if not names:
+            return {}
+        self.db.execute(
+            insert(Tag).values([{"name": n} for n in names]).on_conflict_do_nothing(index_elements=["name"])
+        )
+        rows = self.db.execute(select(Tag.id, Tag.name).where(Tag.name.in_(names)))
+        return {name: tag_id for tag_id, name in rows}
+
+    def record_many(self, media_items: List[Media]):
+        media_items = [m for m in media_items if m.user_id is not None and m.created_at is not None]
+        if not media_items:
+            return
+
+        facts = {m.id: extract_facts(m.metadata) for m in media_items}
+        score_rows = [
+            {
+                "media_id": m.id,
+                "user_id": m.user_id,
+                "created_at": m.created_at,
+                "social_score": facts[m.id]["social_score"],
+                "vibe_score": facts[m.id]["vibe_score"],
+                "percentile": facts[m.id]["percentile"],
+            }
+            for m in media_items
+        ]
+        stmt = insert(PerceptionScore).values(score_rows)
+        self.db.execute(stmt.on_conflict_do_update(
+            index_elements=["media_id"],
+            set_={c: stmt.excluded[c] for c in ("user_id", "created_at", "social_score", "vibe_score", "percentile")},
+        ))
+
+        all_names = [t for f in facts.values() for names in f["tags"].values() for t in names]
+        ids = self.tag_ids(all_names)
+        self.db.execute(delete(PerceptionTag).where(PerceptionTag.media_id.in_(list(facts))))
+        tag_rows = [
+            {"media_id": media_id, "tag_id": ids[name], "source": source}
+            for media_id, f in facts.items()
+            for source, names in f["tags"].items()
+            for name in names
+        ]
+        if tag_rows:
+            self.db.execute(insert(PerceptionTag).values(tag_rows).on_conflict_do_nothing())
+
+    def record_media(self, media: Media):
+        self.record_many([media])
+
+
+def latest_vibe(db: Session, user_id) -> Optional[Dict[str, Any]]:
+    """Most recent media with a vibe score for a user, with its vibe tags."""
+    row = db.execute(
+        select(PerceptionScore.media_id, PerceptionScore.vibe_score)
+        .where(PerceptionScore.user_id == user_id, PerceptionScore.vibe_score.isnot(None))
+        .order_by(PerceptionScore.created_at.desc())
+        .limit(1)
+    ).first()
+    if not row:
+        return None
+    tags = db.execute(
+        select(Tag.name)
+        .join(PerceptionTag, PerceptionTag.tag_id == Tag.id)
+        .where(PerceptionTag.media_id == row.media_id, PerceptionTag.source == "vibe")
+    ).scalars().all()
+    return {"media_id": row.media_id, "score": row.vibe_score, "tags": list(tags)}
+
+
+def public_latest_vibes(db: Session, exclude_user_id=None, batch_size: int = BASELINE_YIELD_PER,
+                        user_ids: Optional[List] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Every opted-in user's latest vibe score and vibe tags in one query (DISTINCT ON over
+    idx_perception_scores_user_vibe), streamed `batch_size` rows at a time. `user_ids`
+    limits it to those users.
+    """
+    latest = (
+        select(PerceptionScore.user_id, PerceptionScore.media_id, PerceptionScore.vibe_score)
+        .where(PerceptionScore.vibe_score.isnot(None))
+        .ext(distinct_on(PerceptionScore.user_id))
+        .order_by(PerceptionScore.user_id, PerceptionScore.created_at.desc())
+    )
+    if user_ids is not None:
+        latest = latest.where(PerceptionScore.user_id.in_(user_ids))
+    latest = latest.subquery()
+    tags = (
+        select(func.array_agg(aggregate_order_by(Tag.name, Tag.name)))
+        .join(PerceptionTag, PerceptionTag.tag_id == Tag.id)
+        .where(PerceptionTag.media_id == latest.c.media_id, PerceptionTag.source == "vibe")
+        .scalar_subquery()
+    )
+    stmt = (
+        select(latest.c.user_id, User.public_alias, latest.c.media_id, latest.c.vibe_score, tags.label("tags"))
+        .join(User, User.id == latest.c.user_id)
+        .where(User.opt_in_public_analysis.is_(True))
+    )
+    if exclude_user_id is not None:
+        stmt = stmt.where(latest.c.user_id != exclude_user_id)
+
+    for row in db.execute(stmt.execution_options(yield_per=batch_size)):
+        yield {
+            "user_id": row.user_id,
+            "alias": row.public_alias,
+            "media_id": row.media_id,
+            "score": row.vibe_score,
+            "tags": list(row.tags or []),
+        }
@@ -0,0 +1,224 @@
+import json
+import math
+import os
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+
+# Keys that never help the LLM and dominate prompt size (vectors, URLs, raw geometry).
+DROP_KEYS = {"embedding", "crop_url", "media_url", "keypoints", "landmarks", "bbox"}
+
+FLOAT_DIGITS = int(os.getenv("PROMPT_FLOAT_DIGITS", "2"))
+
+_PROFILE_FIELDS = [
+    "faces.gender",
+    "faces.age",
+    "faces.expression",
+    "posture.alignment_score",
+    "posture.tips",
+    "fashion.type",
+    "fashion.score",
+    "fashion.dominant_color",
+    "environment.objects.label",
+    "environment.objects.score",
+    "summaries",
+]
+
+_RECENT_FIELDS = [
+    "recent_perception.media_id",
+    "recent_perception.timestamp",
+    "recent_perception.social.summary_text",
+    "recent_perception.social.tags",
+    "recent_perception.social.social_score",
+]
+
+_HISTORY_SUMMARY_FIELDS = [
+    "history_summary.trend_summary",
+    "history_summary.score_trend",
+    "history_summary.improvement_tags",
+    "history_summary.decline_tags",
+]
+
+
+class PromptSpec(BaseModel):
+    fields: List[str]
+    max_tokens: int
+    trim_from: str = "tail"  # which end of lists to drop when over budget: "head" or "tail"
+
+
+# Per-agent projections and token budgets. Budgets can be overridden with
+# PROMPT_TOKEN_BUDGET_<AGENT_NAME> (e.g. PROMPT_TOKEN_BUDGET_SOCIAL_AGENT=800).
+AGENT_SPECS: Dict[str, PromptSpec] = {
+    "social_agent": PromptSpec(fields=_PROFILE_FIELDS, max_tokens=800),
+    "vibe_comparison_agent": PromptSpec(
+        fields=[f"profiles.*.{f}" for f in _PROFILE_FIELDS], max_tokens=1400
+    ),
+    "perception_history_agent": PromptSpec(
+        fields=[
+            "previous_summary.trend_summary",
+            "previous_summary.improvement_tags",
+            "previous_summary.decline_tags",
+            "stats",
+            "new_entries.timestamp",
+            "new_entries.score",
+            "new_entries.tags",
+        ],
+        max_tokens=1500,
+        trim_from="head",  # entries are chronological, keep the most recent ones
+    ),
+    "fixit_agent": PromptSpec(
+        fields=_RECENT_FIELDS + _HISTORY_SUMMARY_FIELDS + ["ignore_areas"], max_tokens=1200
+    ),
+    "reverse_analysis_agent": PromptSpec(
+        fields=["goal"] + _RECENT_FIELDS + _HISTORY_SUMMARY_FIELDS + ["ignore_areas"],
+        max_tokens=1200,
+    ),
+    "vibe_analysis_agent": PromptSpec(
+        fields=_RECENT_FIELDS + [
+            "recent_perception.fixit_suggestions.focus_areas",
+            "recent_perception.reverse_analysis.goal",
+        ] + _HISTORY_SUMMARY_FIELDS,
+        max_tokens=1200,
+    ),
+}
+
+
+class SerializedPayload(BaseModel):
+    text: str
+    tokens: int
+    budget: int
+    truncated: bool = False
+
+
+_encoder = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token count for gpt-4o family models. Uses tiktoken when installed,
+    otherwise a ~4 chars/token estimate.
+    """
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def _field_tree(fields: List[str]) -> Dict[str, Any]:
+    tree: Dict[str, Any] = {}
+    for path in fields:
+        node = tree
+        parts = path.split(".")
+        for i, part in enumerate(parts):
+            if i == len(parts) - 1:
+                node[part] = True
+            else:
+                child = node.get(part)
+                if child is True:
+                    break  # a parent is already kept whole
+                node = node.setdefault(part, {})
+    return tree
+
+
+def _clean(value: Any) -> Any:
+    """Round floats, drop noisy keys and empty values, recursively."""
+    if isinstance(value, float):
+        return round(value, FLOAT_DIGITS)
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if k in DROP_KEYS:
+                continue
+            v = _clean(v)
+            if v is None or v == [] or v == {}:
+                continue
+            out[str(k)] = v
+        return out
+    if isinstance(value, (list, tuple)):
+        return [_clean(v) for v in value]
+    if isinstance(value, (str, int, bool)) or value is None:
+        return value
+    # UUIDs, datetimes, Decimals...
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _project(value: Any, tree: Any) -> Any:
+    if tree is True:
+        return _clean(value)
+    if isinstance(value, list):
+        return [p for p in (_project(v, tree) for v in value) if p is not None]
+    if not isinstance(value, dict):
+        return None
+    if "*" in tree:  # keep every key, projecting each value with the same sub-tree
+        tree = {key: tree["*"] for key in value}
+    out = {}
+    for key, sub in tree.items():
+        if key in value:
+            projected = _project(value[key], sub)
+            if projected is None or projected == [] or projected == {}:
+                continue
+            out[key] = projected
+    return out
+
+
+def _dumps(payload: Any) -> str:
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _longest_list(value: Any, best: Optional[list] = None, skip: Optional[list] = None) -> Optional[list]:
+    if isinstance(value, list):
+        if value is not skip and len(value) > 1 and (best is None or len(value) > len(best)):
+            best = value
+        for v in value:
+            best = _longest_list(v, best, skip)
+    elif isinstance(value, dict):
+        for v in value.values():
+            best = _longest_list(v, best, skip)
+    return best
+
+
+def _budget_for(agent_name: str, spec: PromptSpec) -> int:
+    env_key = f"PROMPT_TOKEN_BUDGET_{agent_name.upper()}"
+    return int(os.getenv(env_key, spec.max_tokens))
+
+
+def serialize_for_agent(agent_name: str, data: Dict[str, Any]) -> SerializedPayload:
+    """
+    Project `data` down to the fields `agent_name` needs and render it as
+    compact JSON within the agent's token budget. When over budget, the longest
+    list in the payload is shortened (from `spec.trim_from`), never below the next
+    longest list. How many items to drop is estimated from the list's tokens per
+    item, and the result is re-serialized to confirm.
+    """
+    spec = AGENT_SPECS[agent_name]
+    budget = _budget_for(agent_name, spec)
+
+    payload = _project(data, _field_tree(spec.fields)) or {}
+    text = _dumps(payload)
+    tokens = count_tokens(text)
+    truncated = False
+
+    while tokens > budget:
+        lst = _longest_list(payload)
+        if lst is None:
+            break
+        runner_up = _longest_list(payload, skip=lst)
+        floor = max(1, len(runner_up) if runner_up is not None else 1)
+        per_item = max(1.0, count_tokens(_dumps(lst)) / len(lst))
+        drop = max(1, min(len(lst) - floor, math.ceil((tokens - budget) / per_item)))
+        if spec.trim_from == "head":
+            del lst[:drop]
+        else:
+            del lst[len(lst) - drop:]
+        truncated = True
+        text = _dumps(payload)
+        tokens = count_tokens(text)
+
+    return SerializedPayload(text=text, tokens=tokens, budget=budget, truncated=truncated)
@@ -0,0 +1,193 @@
+"""
+Redis response cache for the anonymous public endpoints (/public/feed, /public/leaderboard).
+
+- Keys are a hash of the normalized query params under a per-namespace version number;
+  invalidate() bumps the version, so every cached page goes stale at once and old
+  entries simply expire.
+- Misses are single-flighted: one request takes a short Redis lock and computes, the
+  others wait for its result instead of all hitting Postgres (and, within one process,
+  share the same in-flight computation).
+- Hits, misses, lock waits and entry age on hit are counted in Redis for stats().
+- Any Redis error falls back to computing the response uncached.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from fastapi.encoders import jsonable_encoder
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+FEED_CACHE_TTL = int(os.getenv("FEED_CACHE_TTL", "15"))
+LEADERBOARD_CACHE_TTL = int(os.getenv("LEADERBOARD_CACHE_TTL", "30"))
+CACHE_LOCK_MS = int(os.getenv("RESPONSE_CACHE_LOCK_MS", "3000"))
+CACHE_WAIT_MS = int(os.getenv("RESPONSE_CACHE_WAIT_MS", "2000"))
+CACHE_POLL_MS = 25
+
+PUBLIC_NAMESPACES = ("feed", "leaderboard")
+
+
+def normalize_params(params: Dict[str, Any]) -> str:
+    """
+    Canonical form of the query: drops unset params, orders tag lists, folds search case.
+    Tags are only reordered: the JSONB containment filter matches them exactly, so
+    "Funny" and "funny" are different queries.
+    """
+    out = {}
+    for k, v in params.items():
+        if v is None or v == [] or v == "":
+            continue
+        if isinstance(v, (list, tuple)):
+            v = sorted(str(x) for x in v)
+        elif k == "search" and isinstance(v, str):
+            v = v.strip().lower()
+        out[k] = v
+    return json.dumps(out, sort_keys=True, separators=(",", ":"))
+
+
+def _version_key(ns: str) -> str:
+    return f"rc:{ns}:version"
+
+
+def _stats_key(ns: str) -> str:
+    return f"rc:{ns}:stats"
+
+
+class ResponseCache:
+    _inflight: Dict[str, asyncio.Future] = {}
+
+    def __init__(self, namespace: str, ttl: int, redis_client=None):
+        self.ns = namespace
+        self.ttl = ttl
+        self._r = redis_client
+
+    @property
+    def r(self):
+        if self._r is None:
+            import redis.asyncio as redis
+            self._r = redis.from_url(REDIS_URL, decode_responses=True)
+        return self._r
+
+    async def _key(self, params: Dict[str, Any]) -> str:
+        version = await self.r.get(_version_key(self.ns)) or "0"
+        digest = hashlib.sha1(normalize_params(params).encode()).hexdigest()
+        return f"rc:{self.ns}:v{version}:{digest}"
+
+    async def _read(self, key: str) -> Optional[Any]:
+        raw = await self.r.get(key)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        age = time.time() - entry["stored_at"]
+        await self.r.hincrby(_stats_key(self.ns), "hits", 1)
+        await self.r.hincrbyfloat(_stats_key(self.ns), "hit_age_sum", age)
+        return entry["body"]
+
+    async def _compute_and_store(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        body = jsonable_encoder(await compute())
+        await self.r.set(key, json.dumps({"stored_at": time.time(), "body": body}), ex=self.ttl)
+        return body
+
+    async def _fill(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        lock = f"{key}:lock"
+        if await self.r.set(lock, "1", nx=True, px=CACHE_LOCK_MS):
+            await self.r.hincrby(_stats_key(self.ns), "misses", 1)
+            try:
+                return await self._compute_and_store(key, compute)
+            finally:
+                await self.r.delete(lock)
+
+        # Someone else is computing this page: wait for it rather than stampede the DB
+        await self.r.hincrby(_stats_key(self.ns), "lock_waits", 1)
+        deadline = time.monotonic() + CACHE_WAIT_MS / 1000
+        while time.monotonic() < deadline:
+            await asyncio.sleep(CACHE_POLL_MS / 1000)
+            hit = await self._read(key)
+            if hit is not None:
+                return hit
+        await self.r.hincrby(_stats_key(self.ns), "lock_timeouts", 1)
+        return await self._compute_and_store(key, compute)
+
+    async def get_or_compute(self, params: Dict[str, Any], compute: Callable[[], Awaitable[Any]]) -> Any:
+        if not RESPONSE_CACHE_ENABLED:
+            return await compute()
+        try:
+            key = await self._key(params)
+            hit = await self._read(key)
+            if hit is not None:
+                return hit
+        except RedisError as e:
+            logger.warning(f"[response_cache] {self.ns} read failed, serving uncached: {e}")
+            return await compute()
+
+        # In-process single flight: concurrent misses in this worker share one fill
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            try:
+                body = await self._fill(key, compute)
+            except RedisError as e:
+                logger.warning(f"[response_cache] {self.ns} fill failed, serving uncached: {e}")
+                body = jsonable_encoder(await compute())
+            fut.set_result(body)
+            return body
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved when nobody else is waiting
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def invalidate(self):
+        try:
+            await self.r.incr(_version_key(self.ns))
+            await self.r.hincrby(_stats_key(self.ns), "invalidations", 1)
+        except Exception as e:
+            logger.warning(f"[response_cache] {self.ns} invalidation failed: {e}")
+
+    async def stats(self) -> Dict[str, Any]:
+        try:
+            raw = await self.r.hgetall(_stats_key(self.ns))
+        except RedisError as e:
+            logger.warning(f"[response_cache] {self.ns} stats unavailable: {e}")
+            return {"error": "cache unavailable", "ttl_seconds": self.ttl}
+        hits, misses = int(raw.get("hits", 0)), int(raw.get("misses", 0))
+        return {
+            "hits": hits,
+            "misses": misses,
+            "lock_waits": int(raw.get("lock_waits", 0)),
+            "lock_timeouts": int(raw.get("lock_timeouts", 0)),
+            "invalidations": int(raw.get("invalidations", 0)),
+            "hit_ratio": hits / (hits + misses) if hits + misses else None,
+            "mean_hit_age_seconds": float(raw.get("hit_age_sum", 0)) / hits if hits else None,
+            "ttl_seconds": self.ttl,
+        }
+
+
+feed_cache = ResponseCache("feed", FEED_CACHE_TTL)
+leaderboard_cache = ResponseCache("leaderboard", LEADERBOARD_CACHE_TTL)
+
+
+def invalidate_public_caches(redis_client=None):
+    """
+    Sync variant for Celery tasks: called when a pipeline run finishes for an opted-in
+    user (or their opt-in/alias changes), so public pages stop serving the old view.
+    """
+    try:
+        if redis_client is None:
+            import redis
+            redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+        for ns in PUBLIC_NAMESPACES:
+            redis_client.incr(_version_key(ns))
+            redis_client.hincrby(_stats_key(ns), "invalidations", 1)
+    except Exception as e:
+        logger.warning(f"[response_cache] invalidation failed: {e}")
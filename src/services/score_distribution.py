@@ -0,0 +1,236 @@
+"""
+Shared distribution of public users' latest vibe scores (integers 0-100), so a
+percentile is a prefix-sum lookup instead of a pass over every public user.
+
+- ScoreDistribution: a 101-bucket histogram with prefix sums.
+- ScoreDistributionStore: the histogram in Redis plus each public user's current score,
+  updated atomically per user (set_user/remove_user) and rebuilt from perception_scores
+  by the rebuild_score_distribution_async task. A version counter lets each process keep
+  its own copy and refetch only after a change; a bounded log of which user each
+  version changed lets per-process user indexes apply just those users (changes_since).
+- normal_percentile: the analytic cold-start curve used while there are few public users.
+"""
+import logging
+import math
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from src.db.models import User
+from src.services.perception_facts import latest_vibe, public_latest_vibes
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+# Cold-start prior: N(mean, sd), rounded and clipped to 0-100 like real scores
+COLD_START_MEAN = float(os.getenv("SOCIAL_GRAPH_COLD_START_MEAN", "60"))
+COLD_START_SD = float(os.getenv("SOCIAL_GRAPH_COLD_START_SD", "15"))
+
+MAX_SCORE = 100
+KEY_PREFIX = "score_dist:vibe"
+# Versions kept in the change log; a reader further behind reloads everything
+CHANGE_LOG_MAX = int(os.getenv("SCORE_CHANGE_LOG_MAX", "10000"))
+
+
+def _clamp_percentile(fraction: float) -> int:
+    return max(1, min(99, int(round(100 * fraction))))
+
+
+def _score(value) -> int:
+    return max(0, min(MAX_SCORE, int(round(value))))
+
+
+def normal_percentile(value: int, mean: float = COLD_START_MEAN, sd: float = COLD_START_SD) -> int:
+    """Share of the rounded, clipped N(mean, sd) prior at or below `value`."""
+    value = _score(value)
+    if value >= MAX_SCORE:
+        return _clamp_percentile(1.0)
+    cdf = 0.5 * (1 + math.erf((value + 0.5 - mean) / (sd * math.sqrt(2))))
+    return _clamp_percentile(cdf)
+
+
+class ScoreDistribution:
+    def __init__(self, counts: Optional[List[int]] = None, version: int = 0):
+        self.counts = list(counts) if counts is not None else [0] * (MAX_SCORE + 1)
+        self.version = version
+        self._prefix: Optional[List[int]] = None
+
+    @classmethod
+    def from_scores(cls, scores: Iterable[float]) -> "ScoreDistribution":
+        dist = cls()
+        for s in scores:
+            dist.counts[_score(s)] += 1
+        return dist
+
+    @property
+    def total(self) -> int:
+        return self.at_or_below(MAX_SCORE)
+
+    def add(self, score, n: int = 1):
+        self.counts[_score(score)] += n
+        self._prefix = None
+
+    def at_or_below(self, value) -> int:
+        if self._prefix is None:
+            running, self._prefix = 0, []
+            for c in self.counts:
+                running += c
+                self._prefix.append(running)
+        return self._prefix[_score(value)]
+
+    def percentile(self, value, exclude=None) -> int:
+        """
+        Percent of the population scoring <= value, clamped to 1-99 (50 when empty).
+        `exclude` drops one entry with that score, e.g. the asking user's own.
+        """
+        below, total = self.at_or_below(value), self.total
+        if exclude is not None:
+            total -= 1
+            if _score(exclude) <= _score(value):
+                below -= 1
+        if total <= 0:
+            return 50
+        return _clamp_percentile(below / total)
+
+
+# KEYS: counts hash, users hash, version, change log. ARGV: user_id, new score ("" removes
+# the user), log size. An unchanged score still bumps the version: the user's tags may have
+# changed, and indexes keyed on the version should pick that up.
+_SET_USER_LUA = """
+local old = redis.call('HGET', KEYS[2], ARGV[1])
+if not old and ARGV[2] == '' then
+    return 0
+end
+if old ~= ARGV[2] then
+    if old then
+        redis.call('HINCRBY', KEYS[1], old, -1)
+    end
+    if ARGV[2] == '' then
+        redis.call('HDEL', KEYS[2], ARGV[1])
+    else
+        redis.call('HINCRBY', KEYS[1], ARGV[2], 1)
+        redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+    end
+end
+local version = redis.call('INCR', KEYS[3])
+redis.call('ZADD', KEYS[4], version, version .. ':' .. ARGV[1])
+redis.call('ZREMRANGEBYRANK', KEYS[4], 0, -tonumber(ARGV[3]) - 1)
+return version
+"""
+
+
+class ScoreDistributionStore:
+    _local: Dict[str, ScoreDistribution] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, redis_client=None, prefix: str = KEY_PREFIX):
+        self._r = redis_client
+        self.counts_key = f"{prefix}:counts"
+        self.users_key = f"{prefix}:users"
+        self.version_key = f"{prefix}:version"
+        self.changes_key = f"{prefix}:changes"
+
+    @property
+    def r(self):
+        if self._r is None:
+            import redis
+            self._r = redis.from_url(REDIS_URL, decode_responses=True)
+        return self._r
+
+    def _set(self, user_id, value: str):
+        self.r.eval(_SET_USER_LUA, 4, self.counts_key, self.users_key, self.version_key, self.changes_key,
+                    str(user_id), value, CHANGE_LOG_MAX)
+
+    def set_user(self, user_id, score):
+        """Record a public user's latest score (moving them out of their old bucket)."""
+        self._set(user_id, str(_score(score)))
+
+    def remove_user(self, user_id):
+        self._set(user_id, "")
+
+    def version(self) -> int:
+        return int(self.r.get(self.version_key) or 0)
+
+    def changes_since(self, version: int) -> Optional[Tuple[int, List[str]]]:
+        """
+        (current version, users changed after `version`, oldest first), or None when the
+        log no longer reaches back that far (trimmed, or replaced by a rebuild).
+        """
+        pipe = self.r.pipeline(transaction=True)
+        pipe.get(self.version_key)
+        pipe.zrangebyscore(self.changes_key, f"({version}", "+inf")
+        current, entries = pipe.execute()
+        current = int(current or 0)
+        if current - version != len(entries):
+            return None
+        users = dict.fromkeys(entry.split(":", 1)[1] for entry in entries)
+        return current, list(users)
+
+    def user_score(self, user_id) -> Optional[int]:
+        score = self.r.hget(self.users_key, str(user_id))
+        return int(score) if score is not None else None
+
+    def rebuild(self, db: Session) -> int:
+        """
+        Replace the distribution with every public user's latest score from the DB.
+        Per-user updates landing while the rebuild scans are overwritten by it and
+        picked up again by the next one.
+        """
+        tmp_users = f"{self.users_key}:rebuild"
+        self.r.delete(tmp_users)
+        dist, batch, n = ScoreDistribution(), {}, 0
+        for row in public_latest_vibes(db):
+            score = _score(row["score"])
+            dist.add(score)
+            batch[str(row["user_id"])] = score
+            n += 1
+            if len(batch) >= 5000:
+                self.r.hset(tmp_users, mapping=batch)
+                batch = {}
+        if batch:
+            self.r.hset(tmp_users, mapping=batch)
+
+        pipe = self.r.pipeline(transaction=True)
+        # Dropping the change log makes every cached index reload in full
+        pipe.delete(self.counts_key, self.users_key, self.changes_key)
+        pipe.hset(self.counts_key, mapping={str(i): c for i, c in enumerate(dist.counts)})
+        if n:
+            pipe.rename(tmp_users, self.users_key)
+        pipe.incr(self.version_key)
+        pipe.execute()
+        return n
+
+    def get(self) -> ScoreDistribution:
+        """
+        The current distribution, reusing this process's copy while the version in Redis
+        is unchanged.
+        """
+        version = self.version()
+        local = self._local.get(self.version_key)
+        if local is not None and local.version == version:
+            return local
+        raw = self.r.hgetall(self.counts_key)
+        counts = [0] * (MAX_SCORE + 1)
+        for k, v in raw.items():
+            counts[int(k)] = max(0, int(v))
+        fresh = ScoreDistribution(counts, version)
+        with self._lock:
+            self._local[self.version_key] = fresh
+        return fresh
+
+
+def sync_user_score(db: Session, user_id, store: Optional[ScoreDistributionStore] = None):
+    """
+    Bring one user's entry in line with the DB: their latest vibe score if they are
+    public, nothing otherwise. Failures are logged; the periodic rebuild repairs drift.
+    """
+    store = store or ScoreDistributionStore()
+    try:
+        public = db.query(User.opt_in_public_analysis).filter(User.id == user_id).scalar()
+        latest = latest_vibe(db, user_id) if public else None
+        if latest and latest.get("score") is not None:
+            store.set_user(user_id, latest["score"])
+        else:
+            store.remove_user(user_id)
+    except Exception as e:
+        logger.warning(f"[score_distribution] sync failed for {user_id}: {e}")
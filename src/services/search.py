@@ -0,0 +1,146 @@
+"""
+Alias/tag search for the public feed and leaderboard.
+
+Both tables carry a denormalized, lowercased `search_text` ("alias tag tag ...") with a
+pg_trgm GIN index, so `search` is one indexed ILIKE instead of a join plus a text cast
+of every row's metadata. Results can be ranked by word_similarity (sort_by=relevance).
+
+InMemorySearchIndex applies the same matching and ranking without Postgres (tests,
+mock mode).
+"""
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import Float, func, text
+
+# SQL twin of search_text() for media rows, given the owner's alias as :alias or a column.
+# Used by migration 022's backfill and when a user renames themselves.
+MEDIA_SEARCH_TEXT_SQL = """
+NULLIF(lower(concat_ws(' ', {alias}, (
+    SELECT string_agg(tag, ' ')
+    FROM jsonb_array_elements_text(
+        CASE WHEN jsonb_typeof(media.metadata -> 'social' -> 'tags') = 'array'
+             THEN media.metadata -> 'social' -> 'tags' ELSE '[]'::jsonb END
+    ) AS tag
+))), '')
+"""
+
+
+def refresh_user_media_search_text(db, user_id, alias: Optional[str]):
+    """Rewrite search_text on all of a user's media after an alias change. Does not commit."""
+    db.execute(
+        text(f"UPDATE media SET search_text = {MEDIA_SEARCH_TEXT_SQL.format(alias='CAST(:alias AS text)')} WHERE user_id = :uid"),
+        {"alias": alias, "uid": user_id},
+    )
+
+
+_WORD = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def search_text(alias: Optional[str], tags: Optional[Iterable[str]]) -> Optional[str]:
+    """The indexed text for a media row or leaderboard entry; None when there is nothing to match."""
+    parts = [alias] if alias else []
+    if isinstance(tags, (list, tuple)):
+        parts.extend(str(t) for t in tags if t)
+    return " ".join(parts).lower() or None
+
+
+def media_search_text(alias: Optional[str], metadata: Optional[dict]) -> Optional[str]:
+    return search_text(alias, ((metadata or {}).get("social") or {}).get("tags"))
+
+
+def _like_pattern(query: str) -> str:
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def search_clause(column, query: str):
+    """Substring match served by the column's gin_trgm_ops index (for queries of 3+ characters)."""
+    return column.ilike(_like_pattern(query.strip()), escape="\\")
+
+
+def relevance(column, query: str):
+    """Rank key: how well the query matches some word run in the text (pg_trgm word_similarity)."""
+    return func.word_similarity(query.strip().lower(), column, type_=Float)
+
+
+# -----------------------
+# In-memory implementation
+# -----------------------
+def _trigrams(value: str) -> Set[str]:
+    """pg_trgm's trigram set: each word padded with two spaces in front and one behind."""
+    out = set()
+    for word in _WORD.findall(value.lower()):
+        padded = f"  {word} "
+        out.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return out
+
+
+def _substring_trigrams(query: str) -> Set[str]:
+    """Trigrams every text containing `query` must have (what pg_trgm extracts from '%q%')."""
+    q = query.lower()
+    return {q[i:i + 3] for i in range(len(q) - 2) if all(c.isalnum() for c in q[i:i + 3])}
+
+
+def similarity(a: str, b: str) -> float:
+    ta, tb = _trigrams(a), _trigrams(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+def word_similarity(query: str, value: str) -> float:
+    """
+    Approximates pg_trgm's word_similarity: the best similarity between the query and
+    any run of consecutive words in the text.
+    """
+    words = _WORD.findall(value.lower())
+    n_query = max(1, len(_WORD.findall(query)))
+    best = 0.0
+    for i in range(len(words)):
+        for j in range(i + 1, min(len(words), i + n_query + 1) + 1):
+            best = max(best, similarity(query, " ".join(words[i:j])))
+    return best
+
+
+class InMemorySearchIndex:
+    """Trigram postings over search_text, with the same substring semantics as search_clause()."""
+
+    def __init__(self):
+        self.texts: Dict[str, str] = {}
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+
+    def add(self, doc_id, value: Optional[str]):
+        doc_id = str(doc_id)
+        self.remove(doc_id)
+        if not value:
+            return
+        value = value.lower()
+        self.texts[doc_id] = value
+        for t in {value[i:i + 3] for i in range(len(value) - 2)}:
+            self._postings[t].add(doc_id)
+
+    def remove(self, doc_id):
+        old = self.texts.pop(str(doc_id), None)
+        if old:
+            for t in {old[i:i + 3] for i in range(len(old) - 2)}:
+                self._postings[t].discard(str(doc_id))
+
+    def matches(self, query: str) -> Set[str]:
+        q = query.strip().lower()
+        grams = _substring_trigrams(q)
+        if grams:
+            candidates = set.intersection(*(self._postings.get(g, set()) for g in grams))
+        else:
+            candidates = set(self.texts)  # too short for trigrams: the index can't narrow it
+        return {d for d in candidates if q in self.texts[d]}
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Matching ids ranked by word_similarity, best first (ties by id descending, like the SQL order)."""
+        q = query.strip().lower()
+        ranked = sorted(
+            ((d, word_similarity(q, self.texts[d])) for d in self.matches(q)),
+            key=lambda hit: (hit[1], hit[0]),
+            reverse=True,
+        )
+        return ranked[:limit] if limit is not None else ranked
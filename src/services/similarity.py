@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import numpy as np
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from src.db.models import Embedding, User
+
+SIMILARITY_BACKEND = os.getenv("SIMILARITY_BACKEND", "pgvector")  # pgvector | numpy
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+HNSW_EF_SEARCH_MAX = 1000  # pgvector's upper bound for hnsw.ef_search
+# Filters (public_only, days, exclusions) apply after the HNSW scan, so filtered searches
+# scan k * this many candidates, and keep scanning (pgvector >= 0.8) while too few pass
+HNSW_FILTER_OVERSAMPLE = int(os.getenv("HNSW_FILTER_OVERSAMPLE", "10"))
+HNSW_ITERATIVE_SCAN = os.getenv("HNSW_ITERATIVE_SCAN", "strict_order")  # strict_order | relaxed_order | off
+# How long each process reuses its in-memory numpy index before reloading it
+NUMPY_INDEX_MAX_AGE_SECONDS = int(os.getenv("NUMPY_INDEX_MAX_AGE_SECONDS", "300"))
+# similar_users fetches this many media per requested user, then keeps each user's best match
+USER_OVERFETCH = int(os.getenv("SIMILARITY_USER_OVERFETCH", "5"))
+
+
+def store_embedding(db: Session, media_id, user_id, vector: Sequence[float], model: Optional[str], created_at=None):
+    """Upsert the embedding for a media item (one per media). Does not commit."""
+    stmt = insert(Embedding).values(
+        media_id=media_id, user_id=user_id, vector=list(vector), model=model,
+        created_at=created_at or datetime.utcnow(),
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["media_id"],
+        set_={"vector": stmt.excluded.vector, "model": stmt.excluded.model},
+    ))
+
+
+def _since(days: Optional[int]) -> Optional[datetime]:
+    return datetime.utcnow() - timedelta(days=days) if days else None
+
+
+def _best_per_user(hits: List[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
+    seen, out = set(), []
+    for h in hits:  # already sorted by distance
+        if h["user_id"] in seen:
+            continue
+        seen.add(h["user_id"])
+        out.append(h)
+        if len(out) == k:
+            break
+    return out
+
+
+class PgVectorIndex:
+    """Nearest neighbours over embeddings.vector using the HNSW cosine index."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _search(self, target, k: int, exclude_user=None, exclude_media=None,
+                public_only: bool = False, days: Optional[int] = None) -> List[Dict[str, Any]]:
+        distance = Embedding.vector.cosine_distance(target).label("distance")
+        q = (
+            select(Embedding.media_id, Embedding.user_id, Embedding.created_at, distance)
+            .order_by(distance)
+            .limit(k)
+        )
+        if exclude_media is not None:
+            q = q.where(Embedding.media_id != exclude_media)
+        if exclude_user is not None:
+            q = q.where(Embedding.user_id != exclude_user)
+        if public_only:
+            q = q.join(User, User.id == Embedding.user_id).where(User.opt_in_public_analysis.is_(True))
+        since = _since(days)
+        if since:
+            q = q.where(Embedding.created_at >= since)
+
+        # ef_search caps how many candidates the HNSW scan returns before filters apply
+        # (excluding the query media itself drops at most one row and needs no oversampling)
+        filtered = public_only or since is not None or exclude_user is not None
+        ef_search = max(HNSW_EF_SEARCH, k * HNSW_FILTER_OVERSAMPLE if filtered else k + 1)
+        self.db.execute(text(f"SET LOCAL hnsw.ef_search = {min(ef_search, HNSW_EF_SEARCH_MAX)}"))
+        if filtered and HNSW_ITERATIVE_SCAN in ("strict_order", "relaxed_order"):
+            self.db.execute(text(f"SET LOCAL hnsw.iterative_scan = {HNSW_ITERATIVE_SCAN}"))
+        hits = [
+            {"media_id": str(r.media_id), "user_id": str(r.user_id), "created_at": r.created_at, "distance": float(r.distance)}
+            for r in self.db.execute(q)
+        ]
+        if HNSW_ITERATIVE_SCAN == "relaxed_order":
+            hits.sort(key=lambda h: h["distance"])  # relaxed scans can return slightly out of order
+        return hits
+
+    def similar_media(self, media_id, k: int = 10, public_only: bool = False, days: Optional[int] = None):
+        target = self.db.execute(select(Embedding.vector).where(Embedding.media_id == media_id)).scalar()
+        if target is None:
+            return None
+        return self._search(target, k, exclude_media=media_id, public_only=public_only, days=days)
+
+    def similar_users(self, user_id, k: int = 10, public_only: bool = True, days: Optional[int] = None):
+        # A user is represented by the centroid of their media embeddings
+        from pgvector.sqlalchemy import avg
+        centroid = self.db.execute(select(avg(Embedding.vector)).where(Embedding.user_id == user_id)).scalar()
+        if centroid is None:
+            return None
+        hits = self._search(centroid, k * USER_OVERFETCH, exclude_user=user_id, public_only=public_only, days=days)
+        return _best_per_user(hits, k)
+
+
+class NumpyIndex:
+    """
+    Exact in-memory cosine index with the same interface as PgVectorIndex. Used in
+    tests and against databases without pgvector.
+    """
+
+    def __init__(self, dim: Optional[int] = None):
+        self.dim = dim
+        self.media_ids: List[str] = []
+        self.user_ids: List[str] = []
+        self.created_at: List[Optional[datetime]] = []
+        self.public: List[bool] = []
+        self._rows: List[np.ndarray] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def add(self, media_id, user_id, vector: Sequence[float], created_at: Optional[datetime] = None, public: bool = False):
+        v = np.asarray(vector, dtype=np.float32)
+        if self.dim is None:
+            self.dim = v.shape[0]
+        if v.shape != (self.dim,):
+            raise ValueError(f"Expected a {self.dim}-dim vector, got {v.shape}")
+        norm = np.linalg.norm(v)
+        self._rows.append(v / norm if norm else v)
+        self.media_ids.append(str(media_id))
+        self.user_ids.append(str(user_id))
+        self.created_at.append(created_at)
+        self.public.append(bool(public))
+        self._matrix = None
+
+    @classmethod
+    def from_db(cls, db: Session) -> "NumpyIndex":
+        index = cls()
+        rows = db.execute(
+            select(Embedding.media_id, Embedding.user_id, Embedding.vector, Embedding.created_at, User.opt_in_public_analysis)
+            .join(User, User.id == Embedding.user_id)
+        )
+        for media_id, user_id, vector, created_at, public in rows:
+            index.add(media_id, user_id, vector, created_at, public)
+        return index
+
+    def _search(self, target: np.ndarray, k: int, exclude_user=None, exclude_media=None,
+                public_only: bool = False, days: Optional[int] = None) -> List[Dict[str, Any]]:
+        if not self._rows:
+            return []
+        if self._matrix is None:
+            self._matrix = np.vstack(self._rows)
+        norm = np.linalg.norm(target)
+        distances = 1.0 - self._matrix @ (target / norm if norm else target)
+
+        mask = np.ones(len(self.media_ids), dtype=bool)
+        since = _since(days)
+        for i in range(len(mask)):
+            if (exclude_media is not None and self.media_ids[i] == str(exclude_media)) \
+                    or (exclude_user is not None and self.user_ids[i] == str(exclude_user)) \
+                    or (public_only and not self.public[i]) \
+                    or (since and (self.created_at[i] is None or self.created_at[i] < since)):
+                mask[i] = False
+
+        candidates = np.flatnonzero(mask)
+        order = candidates[np.argsort(distances[candidates], kind="stable")][:k]
+        return [
+            {"media_id": self.media_ids[i], "user_id": self.user_ids[i], "created_at": self.created_at[i], "distance": float(distances[i])}
+            for i in order
+        ]
+
+    def similar_media(self, media_id, k: int = 10, public_only: bool = False, days: Optional[int] = None):
+        try:
+            i = self.media_ids.index(str(media_id))
+        except ValueError:
+            return None
+        if self._matrix is None:
+            self._matrix = np.vstack(self._rows)
+        return self._search(self._matrix[i], k, exclude_media=media_id, public_only=public_only, days=days)
+
+    def similar_users(self, user_id, k: int = 10, public_only: bool = True, days: Optional[int] = None):
+        own = [r for r, u in zip(self._rows, self.user_ids) if u == str(user_id)]
+        if not own:
+            return None
+        hits = self._search(np.mean(own, axis=0), k * USER_OVERFETCH, exclude_user=user_id, public_only=public_only, days=days)
+        return _best_per_user(hits, k)
+
+
+class SharedNumpyIndex:
+    """
+    One NumpyIndex per process, reloaded through `load` once it is older than
+    NUMPY_INDEX_MAX_AGE_SECONDS instead of on every request.
+    """
+    _index: Optional[NumpyIndex] = None
+    _built_at = 0.0
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, load: Callable[[], NumpyIndex]) -> NumpyIndex:
+        if cls._stale():
+            with cls._lock:
+                if cls._stale():  # another thread may have reloaded it meanwhile
+                    cls._index = load()
+                    cls._built_at = time.monotonic()
+        return cls._index
+
+    @classmethod
+    def _stale(cls) -> bool:
+        return cls._index is None or time.monotonic() - cls._built_at > NUMPY_INDEX_MAX_AGE_SECONDS
+
+    @classmethod
+    def reset(cls):
+        cls._index, cls._built_at = None, 0.0
+
+
+def get_similarity_index(db: Session):
+    if SIMILARITY_BACKEND == "numpy":
+        return SharedNumpyIndex.get(lambda: NumpyIndex.from_db(db))
+    return PgVectorIndex(db)
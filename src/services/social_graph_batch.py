@@ -0,0 +1,168 @@
+"""
+Batch social graph: every public user's percentile, similar and complementary users,
+computed against one in-memory load of the public population instead of one baseline
+load per SocialGraphAgent call.
+
+- The sweep is split into SOCIAL_GRAPH_SHARDS ranges of the user id (UUID) space;
+  each shard task computes its users and writes them to social_graph_results and Redis.
+- Percentiles for the whole population come from one histogram pass (batch_percentiles);
+  rankings use the shared TagIndex (and the LSH shortlist if enabled).
+- SocialGraphAgent serves a stored result while it is fresh and was computed for the
+  user's current latest vibe media and score, and computes live otherwise.
+"""
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from src.db.models import SocialGraphResult
+from src.services.score_distribution import MAX_SCORE
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+SOCIAL_GRAPH_PRECOMPUTED = os.getenv("SOCIAL_GRAPH_PRECOMPUTED", "true").lower() in ("1", "true", "yes")
+SOCIAL_GRAPH_SHARDS = int(os.getenv("SOCIAL_GRAPH_SHARDS", "8"))
+# Results older than this are ignored; the sweep runs every 6 hours
+SOCIAL_GRAPH_RESULT_MAX_AGE_SECONDS = int(os.getenv("SOCIAL_GRAPH_RESULT_MAX_AGE_SECONDS", str(12 * 3600)))
+SOCIAL_GRAPH_WRITE_BATCH = int(os.getenv("SOCIAL_GRAPH_WRITE_BATCH", "1000"))
+KEY_PREFIX = "social_graph:result"
+
+_UUID_SPACE = 1 << 128
+
+
+def shard_bounds(shard: int, shards: int) -> Tuple[int, int]:
+    """[lo, hi) of UUID integers covered by `shard` of `shards` equal ranges."""
+    if not 0 <= shard < shards:
+        raise ValueError(f"shard {shard} out of range for {shards} shards")
+    return shard * _UUID_SPACE // shards, (shard + 1) * _UUID_SPACE // shards
+
+
+def in_shard(user_id, bounds: Tuple[int, int]) -> bool:
+    value = uuid.UUID(str(user_id)).int
+    return bounds[0] <= value < bounds[1]
+
+
+def _str_or_none(value) -> Optional[str]:
+    return str(value) if value is not None else None
+
+
+def batch_percentiles(scores: np.ndarray) -> np.ndarray:
+    """
+    Every user's overall percentile among the others at once: the same value as
+    ScoreDistribution.percentile(score, exclude=score) over the whole population.
+    """
+    scores = np.clip(np.asarray(scores, dtype=np.int64), 0, MAX_SCORE)
+    total = scores.shape[0] - 1
+    if total <= 0:
+        return np.full(scores.shape[0], 50, dtype=np.int64)
+    below = np.cumsum(np.bincount(scores, minlength=MAX_SCORE + 1))[scores] - 1
+    return np.clip(np.round(100 * below / total), 1, 99).astype(np.int64)
+
+
+class SocialGraphResultStore:
+    def __init__(self, db: Session, redis_client=None):
+        self.db = db
+        self._r = redis_client
+
+    @property
+    def r(self):
+        if self._r is None:
+            import redis
+            self._r = redis.from_url(REDIS_URL, decode_responses=True)
+        return self._r
+
+    @staticmethod
+    def _key(user_id) -> str:
+        return f"{KEY_PREFIX}:{user_id}"
+
+    def write_many(self, results: List[Dict[str, Any]]):
+        """Upsert {"user_id", "vibe_score", "media_id", "data"} rows and commit, then refresh the cache."""
+        if not results:
+            return
+        now = datetime.utcnow()
+        stmt = insert(SocialGraphResult).values([{**r, "computed_at": now} for r in results])
+        self.db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={"vibe_score": stmt.excluded.vibe_score, "media_id": stmt.excluded.media_id,
+                  "data": stmt.excluded.data, "computed_at": stmt.excluded.computed_at},
+        ))
+        self.db.commit()
+        try:
+            pipe = self.r.pipeline(transaction=False)
+            for r in results:
+                value = json.dumps({"vibe_score": r["vibe_score"], "media_id": _str_or_none(r.get("media_id")),
+                                    "data": r["data"]})
+                pipe.setex(self._key(r["user_id"]), SOCIAL_GRAPH_RESULT_MAX_AGE_SECONDS, value)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[social_graph_batch] cache write failed: {e}")
+
+    def get(self, user_id) -> Optional[Dict[str, Any]]:
+        """The stored {"vibe_score", "media_id", "data"} for a user, if fresh; Redis first, then the table."""
+        try:
+            raw = self.r.get(self._key(user_id))
+            if raw:
+                return json.loads(raw)
+        except Exception as e:
+            logger.warning(f"[social_graph_batch] cache read failed for {user_id}: {e}")
+        cutoff = datetime.utcnow() - timedelta(seconds=SOCIAL_GRAPH_RESULT_MAX_AGE_SECONDS)
+        row = (
+            self.db.query(SocialGraphResult)
+            .filter(SocialGraphResult.user_id == user_id, SocialGraphResult.computed_at >= cutoff)
+            .first()
+        )
+        if row is None:
+            return None
+        return {"vibe_score": row.vibe_score, "media_id": _str_or_none(row.media_id), "data": row.data}
+
+    @staticmethod
+    def matches(stored: Optional[Dict[str, Any]], media_id, vibe_score: int) -> bool:
+        """Whether a stored result was computed for this latest vibe media and score."""
+        return bool(stored) and stored.get("media_id") is not None \
+            and stored["media_id"] == _str_or_none(media_id) and stored["vibe_score"] == vibe_score
+
+
+def compute_shard(db: Session, shard: int, shards: int, store: Optional[SocialGraphResultStore] = None) -> int:
+    """Compute and store results for the public users in one shard; returns how many."""
+    from src.agents.social_graph_agent import SocialGraphAgent, SocialGraphOutput
+
+    agent = SocialGraphAgent(db)
+    # A published index is never modified, so the whole sweep ranks against one consistent
+    # snapshot even if the shared index is refreshed meanwhile
+    index = agent._public_index(db)
+    sample_size = len(index) - 1
+    if sample_size < agent.MIN_PUBLIC_USERS:
+        return 0  # cold start: the live path answers from the analytic prior
+
+    users = list(index.users())
+    percentiles = batch_percentiles([u["score"] for u in users])
+    bounds = shard_bounds(shard, shards)
+    store = store or SocialGraphResultStore(db)
+    pending, total = [], 0
+    for user, pct in zip(users, percentiles.tolist()):
+        if not in_shard(user["user_id"], bounds):
+            continue
+        similar, complementary = agent._rank_users(user["score"], user["tags"] or [], index,
+                                                   exclude_user_id=user["user_id"])
+        result = SocialGraphOutput(
+            cold_start=False,
+            sample_size=sample_size,
+            user_vibe_score=user["score"],
+            percentile={"overall": pct},
+            similar_users=similar,
+            complementary_users=complementary,
+        )
+        # JSON mode so UUIDs in the entries land in JSONB as strings
+        pending.append({"user_id": user["user_id"], "vibe_score": user["score"], "media_id": user.get("media_id"),
+                        "data": result.model_dump(mode="json")})
+        if len(pending) >= SOCIAL_GRAPH_WRITE_BATCH:
+            store.write_many(pending)
+            total += len(pending)
+            pending = []
+    store.write_many(pending)
+    return total + len(pending)
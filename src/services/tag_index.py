@@ -0,0 +1,316 @@
+"""
+In-memory index over public users' latest vibe score and tags, for the social graph's
+similar/complementary rankings without scoring and sorting every public user.
+
+- Tags are interned to ids; each user has a bitset row (uint64 words) and the tag's
+  postings list, so the users sharing any tag with the query are one postings union.
+- Users are also bucketed by score (0-100). Users sharing no tag all have Jaccard 0, so
+  their rank depends only on the score gap and is read off the nearest buckets.
+- Candidates from both paths are scored with NumPy and cut to k with a bounded heap.
+
+Results (including tie order: earlier-indexed users first) match scoring every user
+with SocialGraphAgent's formulas and sorting.
+"""
+import heapq
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import numpy as np
+
+TAG_INDEX_MIN_REFRESH_SECONDS = int(os.getenv("TAG_INDEX_MIN_REFRESH_SECONDS", "60"))
+TAG_INDEX_MAX_AGE_SECONDS = int(os.getenv("TAG_INDEX_MAX_AGE_SECONDS", "900"))
+# More changed users than this since the cached version: reload instead of patching
+TAG_INDEX_MAX_DELTA = int(os.getenv("TAG_INDEX_MAX_DELTA", "2000"))
+
+MAX_SCORE = 100
+SIMILAR_GAP_SCALE = 100.0        # similar: score term is 1 - gap/100
+COMPLEMENTARY_GAP_SCALE = 20.0   # complementary: score term is 1 - gap/20, zero from a gap of 20
+
+_popcount = getattr(np, "bitwise_count", None)  # NumPy >= 2.0
+
+
+def _bit_count(words: np.ndarray) -> np.ndarray:
+    """Set bits per row of a (rows, words) uint64 array."""
+    if _popcount is not None:
+        return _popcount(words).sum(axis=1, dtype=np.int64)
+    return np.unpackbits(np.ascontiguousarray(words).view(np.uint8), axis=1).sum(axis=1, dtype=np.int64)
+
+
+def _score(value) -> int:
+    return max(0, min(MAX_SCORE, int(round(value))))
+
+
+class TagIndex:
+    def __init__(self):
+        self._tag_ids: Dict[str, int] = {}
+        self._row_of: Dict[str, int] = {}
+        self.entries: List[Optional[Dict[str, Any]]] = []  # row -> baseline entry, None once removed
+        self._scores = np.zeros(0, dtype=np.int64)
+        self._tag_counts = np.zeros(0, dtype=np.int64)
+        self._bits = np.zeros((0, 1), dtype=np.uint64)
+        self._postings: Dict[int, List[int]] = defaultdict(list)   # tag id -> sorted rows
+        self._buckets: List[List[int]] = [[] for _ in range(MAX_SCORE + 1)]  # score -> sorted rows
+        self._size = 0
+        self.lsh = None  # optional MinHashLSH over the same users (SOCIAL_GRAPH_LSH)
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict[str, Any]]) -> "TagIndex":
+        index = cls()
+        for entry in entries:
+            index.upsert(entry)
+        return index
+
+    def copy(self) -> "TagIndex":
+        """Independent copy (entries are replaced, never mutated, so they are shared)."""
+        other = TagIndex()
+        other._tag_ids = dict(self._tag_ids)
+        other._row_of = dict(self._row_of)
+        other.entries = list(self.entries)
+        other._scores = self._scores.copy()
+        other._tag_counts = self._tag_counts.copy()
+        other._bits = self._bits.copy()
+        other._postings = defaultdict(list, {tid: list(rows) for tid, rows in self._postings.items()})
+        other._buckets = [list(rows) for rows in self._buckets]
+        other._size = self._size
+        other.lsh = self.lsh.copy() if self.lsh is not None else None
+        return other
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, user_id) -> bool:
+        row = self._row_of.get(str(user_id))
+        return row is not None and self.entries[row] is not None
+
+    def get(self, user_id) -> Optional[Dict[str, Any]]:
+        return self._public(self._row_of[str(user_id)]) if user_id in self else None
+
+    def users(self) -> Iterator[Dict[str, Any]]:
+        return (self._public(row) for row, e in enumerate(self.entries) if e is not None)
+
+    def scores(self) -> Iterator[int]:
+        return (e["score"] for e in self.entries if e is not None)
+
+    # -----------------------
+    # Maintenance
+    # -----------------------
+    def _intern(self, tag: str) -> int:
+        tid = self._tag_ids.get(tag)
+        if tid is None:
+            tid = self._tag_ids[tag] = len(self._tag_ids)
+            if tid // 64 >= self._bits.shape[1]:
+                pad = np.zeros((self._bits.shape[0], self._bits.shape[1]), dtype=np.uint64)
+                self._bits = np.hstack([self._bits, pad])
+        return tid
+
+    def _grow(self, rows: int):
+        cap = self._scores.shape[0]
+        if rows <= cap:
+            return
+        new_cap = max(16, cap * 2, rows)
+        self._scores = np.concatenate([self._scores, np.zeros(new_cap - cap, dtype=np.int64)])
+        self._tag_counts = np.concatenate([self._tag_counts, np.zeros(new_cap - cap, dtype=np.int64)])
+        self._bits = np.vstack([self._bits, np.zeros((new_cap - cap, self._bits.shape[1]), dtype=np.uint64)])
+
+    def _unlink(self, row: int):
+        entry = self.entries[row]
+        if entry is None:
+            return
+        for tid in entry["_tag_ids"]:
+            rows = self._postings[tid]
+            del rows[bisect_left(rows, row)]
+        bucket = self._buckets[entry["score"]]
+        del bucket[bisect_left(bucket, row)]
+        self._bits[row] = 0
+        self.entries[row] = None
+        self._size -= 1
+
+    def upsert(self, entry: Dict[str, Any]):
+        """Add a user or refresh their score/tags; they keep their position for tie-breaks."""
+        uid = str(entry["user_id"])
+        row = self._row_of.get(uid)
+        if row is None:
+            row = self._row_of[uid] = len(self.entries)
+            self.entries.append(None)
+            self._grow(row + 1)
+        else:
+            self._unlink(row)
+
+        score = _score(entry["score"])
+        tag_ids = sorted({self._intern(t) for t in entry.get("tags") or []})
+        for tid in tag_ids:
+            self._bits[row, tid // 64] |= np.uint64(1 << (tid % 64))
+            insort(self._postings[tid], row)
+        insort(self._buckets[score], row)
+        self._scores[row] = score
+        self._tag_counts[row] = len(tag_ids)
+        self.entries[row] = {**entry, "score": score, "_tag_ids": tag_ids}
+        self._size += 1
+
+    def remove(self, user_id):
+        row = self._row_of.get(str(user_id))
+        if row is not None:
+            self._unlink(row)
+
+    # -----------------------
+    # Queries
+    # -----------------------
+    def _query(self, tags: List[str], exclude_user_id) -> Tuple[np.ndarray, np.ndarray, int, Set[int]]:
+        """Query bitset, rows sharing a tag, query tag count and rows to leave out."""
+        me = np.zeros(self._bits.shape[1], dtype=np.uint64)
+        tids = [self._tag_ids[t] for t in set(tags) if t in self._tag_ids]
+        for tid in tids:
+            me[tid // 64] |= np.uint64(1 << (tid % 64))
+
+        skip = set()
+        if exclude_user_id is not None and exclude_user_id in self:
+            skip.add(self._row_of[str(exclude_user_id)])
+        postings = [self._postings[t] for t in tids if self._postings[t]]
+        overlap = np.unique(np.concatenate(postings)) if postings else np.zeros(0, dtype=np.int64)
+        if skip:
+            overlap = overlap[~np.isin(overlap, list(skip))]
+        return me, overlap, len(set(tags)), skip
+
+    def _jaccard(self, rows: np.ndarray, me: np.ndarray, n_me: int) -> np.ndarray:
+        inter = _bit_count(self._bits[rows] & me)
+        union = n_me + self._tag_counts[rows] - inter
+        return np.divide(inter, union, out=np.zeros(len(rows)), where=union > 0)
+
+    def _nearest(self, score: int, skip: Set[int], k: int, max_gap: int = MAX_SCORE) -> List[Tuple[int, int]]:
+        """Up to k (gap, row) outside `skip`, by score gap then row, walking buckets outward from `score`."""
+        out = []
+        for gap in range(max_gap + 1):
+            if score - gap < 0 and score + gap > MAX_SCORE:
+                break
+            sides = [self._buckets[s] for s in {score - gap, score + gap} if 0 <= s <= MAX_SCORE]
+            for row in heapq.merge(*sides):
+                if row not in skip:
+                    out.append((gap, row))
+                    if len(out) == k:
+                        return out
+        return out
+
+    def nearest_by_score(self, score, k: int, exclude_user_id=None, max_gap: int = MAX_SCORE) -> List[Dict[str, Any]]:
+        """Up to k users closest to `score`, ignoring tags."""
+        skip = {self._row_of[str(exclude_user_id)]} if exclude_user_id is not None and exclude_user_id in self else set()
+        return [self._public(row) for _, row in self._nearest(_score(score), skip, k, max_gap)]
+
+    @staticmethod
+    def _top(candidates: Iterable[Tuple[float, int]], k: int) -> List[int]:
+        return [row for _, row in heapq.nsmallest(k, candidates, key=lambda c: (-c[0], c[1]))]
+
+    def similar(self, score, tags: List[str], k: int = 5, exclude_user_id=None) -> List[Dict[str, Any]]:
+        """Top k by 0.7 * jaccard + 0.3 * (1 - gap/100)."""
+        score = _score(score)
+        me, overlap, n_me, skip = self._query(tags, exclude_user_id)
+        candidates = []
+        if overlap.size:
+            gap = np.abs(score - self._scores[overlap])
+            values = 0.7 * self._jaccard(overlap, me, n_me) + 0.3 * np.maximum(0.0, 1.0 - (gap / SIMILAR_GAP_SCALE))
+            candidates.extend(zip(values.tolist(), overlap.tolist()))
+        # Users sharing no tag: the value falls with the gap, so only the k nearest can place
+        for gap, row in self._nearest(score, skip | set(overlap.tolist()), k):
+            candidates.append((0.3 * max(0.0, 1.0 - (gap / SIMILAR_GAP_SCALE)), row))
+        return [self._public(r) for r in self._top(candidates, k)]
+
+    def complementary(self, score, tags: List[str], k: int = 5, exclude_user_id=None) -> List[Dict[str, Any]]:
+        """Top k by 0.7 * (1 - jaccard) + 0.3 * max(0, 1 - gap/20)."""
+        score = _score(score)
+        me, overlap, n_me, skip = self._query(tags, exclude_user_id)
+        candidates = []
+        if overlap.size:
+            gap = np.abs(score - self._scores[overlap])
+            values = (1.0 - self._jaccard(overlap, me, n_me)) * 0.7 \
+                + np.maximum(0.0, 1.0 - (gap / COMPLEMENTARY_GAP_SCALE)) * 0.3
+            candidates.extend(zip(values.tolist(), overlap.tolist()))
+
+        # Users sharing no tag: nearest first inside the score band, then all tie at 0.7
+        skip = skip | set(overlap.tolist())
+        band = self._nearest(score, skip, k, max_gap=int(COMPLEMENTARY_GAP_SCALE) - 1)
+        for gap, row in band:
+            candidates.append((0.7 + max(0.0, 1.0 - (gap / COMPLEMENTARY_GAP_SCALE)) * 0.3, row))
+        needed = k - len(band)
+        if needed > 0:
+            # Outside the band everyone ties at 0.7, so the earliest rows of the far buckets win
+            gap = int(COMPLEMENTARY_GAP_SCALE)
+            far = [self._buckets[s] for s in range(MAX_SCORE + 1) if abs(score - s) >= gap]
+            for row in heapq.merge(*far):
+                if row in skip:
+                    continue
+                candidates.append((0.7, row))
+                needed -= 1
+                if needed == 0:
+                    break
+        return [self._public(r) for r in self._top(candidates, k)]
+
+    def _public(self, row: int) -> Dict[str, Any]:
+        return {k: v for k, v in self.entries[row].items() if k != "_tag_ids"}
+
+
+class SharedTagIndex:
+    """
+    One TagIndex per process. When the shared score version moves, `apply_changes`
+    (if given) patches a copy of the index with just the users changed since the index's
+    version and returns the new version; without it, or when it returns None (the change
+    log no longer reaches back far enough), the index is rebuilt through `load`, at most
+    every TAG_INDEX_MIN_REFRESH_SECONDS. It is always rebuilt once older than
+    TAG_INDEX_MAX_AGE_SECONDS. `load_lsh`, if given, is rebuilt with it.
+
+    A published index is never modified: the patched copy or rebuilt index replaces it,
+    so callers query whatever get() returned without locking. One thread refreshes at a
+    time; the others keep using the current index meanwhile (only the very first build
+    is waited for).
+    """
+    _index: Optional[TagIndex] = None
+    _version: Optional[int] = None
+    _built_at = 0.0
+    _refresh_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, load: Callable[[], Iterable[Dict[str, Any]]], version: Optional[int] = None,
+            load_lsh: Optional[Callable[[], Any]] = None,
+            apply_changes: Optional[Callable[[TagIndex, int], Optional[int]]] = None) -> TagIndex:
+        index = cls._index
+        if not cls._behind(version) or not cls._refresh_lock.acquire(blocking=index is None):
+            return index
+        try:
+            if cls._behind(version):  # another thread may have caught up meanwhile
+                current, since = cls._index, cls._version
+                applied = None
+                if apply_changes is not None and current is not None and since is not None \
+                        and time.monotonic() - cls._built_at <= TAG_INDEX_MAX_AGE_SECONDS:
+                    patched = current.copy()
+                    applied = apply_changes(patched, since)
+                    if applied is not None:
+                        cls._index, cls._version = patched, applied
+                if applied is None and cls._stale(version):
+                    cls._rebuild(load, version, load_lsh)
+            return cls._index
+        finally:
+            cls._refresh_lock.release()
+
+    @classmethod
+    def _rebuild(cls, load, version, load_lsh):
+        index = TagIndex.from_entries(load())
+        index.lsh = load_lsh() if load_lsh is not None else None
+        cls._index, cls._version, cls._built_at = index, version, time.monotonic()
+
+    @classmethod
+    def _behind(cls, version: Optional[int]) -> bool:
+        return cls._stale(version) or (version is not None and version != cls._version)
+
+    @classmethod
+    def _stale(cls, version: Optional[int]) -> bool:
+        age = time.monotonic() - cls._built_at
+        return (
+            cls._index is None
+            or age > TAG_INDEX_MAX_AGE_SECONDS
+            or (version != cls._version and age > TAG_INDEX_MIN_REFRESH_SECONDS)
+        )
+
+    @classmethod
+    def reset(cls):
+        cls._index, cls._version, cls._built_at = None, None, 0.0
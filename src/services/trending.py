@@ -0,0 +1,86 @@
+"""
+Stored trending score for media (Media.trending_score), so the trending feed is an
+index range scan instead of a per-row ORDER BY expression.
+
+Scores are set by the pipeline when a social result lands and recomputed in batches
+by refresh_trending_scores_async. Media older than TRENDING_WINDOW_DAYS drop out of
+trending (score NULL) rather than keep a stale value.
+"""
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from src.db.expressions import SOCIAL_PERCENTILE_SQL
+
+TRENDING_DECAY = os.getenv("TRENDING_DECAY", "linear")  # linear | exponential
+# linear: percentile + (100 - age_hours) * TRENDING_LINEAR_WEIGHT  (the original feed formula)
+TRENDING_LINEAR_WEIGHT = float(os.getenv("TRENDING_LINEAR_WEIGHT", "0.1"))
+# exponential: percentile * 0.5 ** (age_hours / TRENDING_HALF_LIFE_HOURS)
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24"))
+# Scores are rounded to this step; rows whose bucket did not change are not rewritten
+TRENDING_BUCKET = float(os.getenv("TRENDING_BUCKET", "0.5"))
+TRENDING_WINDOW_DAYS = int(os.getenv("TRENDING_WINDOW_DAYS", "14"))
+TRENDING_BATCH_SIZE = int(os.getenv("TRENDING_BATCH_SIZE", "5000"))
+
+
+def trending_score(percentile: Optional[float], created_at: datetime, now: Optional[datetime] = None) -> Optional[float]:
+    """Python twin of _score_sql(), used by the pipeline for freshly scored media."""
+    now = now or datetime.utcnow()
+    if percentile is None or created_at is None or created_at < now - timedelta(days=TRENDING_WINDOW_DAYS):
+        return None
+    age_hours = max(0.0, (now - created_at).total_seconds() / 3600)
+    if TRENDING_DECAY == "exponential":
+        raw = percentile * math.pow(0.5, age_hours / TRENDING_HALF_LIFE_HOURS)
+    else:
+        raw = percentile + (100 - age_hours) * TRENDING_LINEAR_WEIGHT
+    return round(raw / TRENDING_BUCKET) * TRENDING_BUCKET
+
+
+def _score_sql() -> str:
+    age_hours = "GREATEST(0, EXTRACT(EPOCH FROM (:now - media.created_at)) / 3600)"
+    if TRENDING_DECAY == "exponential":
+        raw = f"{SOCIAL_PERCENTILE_SQL} * power(0.5, {age_hours} / :half_life)"
+    else:
+        raw = f"{SOCIAL_PERCENTILE_SQL} + (100 - {age_hours}) * :weight"
+    return f"(round(({raw}) / :bucket) * :bucket)::double precision"
+
+
+def refresh_trending_scores(db: Session, batch_size: int = TRENDING_BATCH_SIZE, now: Optional[datetime] = None) -> dict:
+    """
+    Recompute scores for media inside the window in id-ordered batches, committing per
+    batch, then clear scores that aged out. Returns counts of rows written.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=TRENDING_WINDOW_DAYS)
+    params = {
+        "now": now, "cutoff": cutoff, "bucket": TRENDING_BUCKET,
+        "weight": TRENDING_LINEAR_WEIGHT, "half_life": TRENDING_HALF_LIFE_HOURS,
+    }
+    update = text(f"""
+        UPDATE media SET trending_score = s.score
+        FROM (SELECT id, {_score_sql()} AS score FROM media WHERE id = ANY(:ids)) s
+        WHERE media.id = s.id AND media.trending_score IS DISTINCT FROM s.score
+    """)
+    next_ids = text("""
+        SELECT id FROM media
+        WHERE created_at >= :cutoff AND (CAST(:after AS uuid) IS NULL OR id > CAST(:after AS uuid))
+        ORDER BY id LIMIT :n
+    """)
+
+    updated, after = 0, None
+    while True:
+        ids = list(db.execute(next_ids, {"cutoff": cutoff, "after": after, "n": batch_size}).scalars())
+        if not ids:
+            break
+        updated += db.execute(update, {**params, "ids": ids}).rowcount
+        db.commit()
+        after = str(ids[-1])
+
+    expired = db.execute(
+        text("UPDATE media SET trending_score = NULL WHERE trending_score IS NOT NULL AND created_at < :cutoff"),
+        {"cutoff": cutoff},
+    ).rowcount
+    db.commit()
+    return {"updated": updated, "expired": expired}
@@ -1,13 +1,14 @@
 import os
 import random
 from .base import BaseTool, ToolInput, ToolResult
+from src.db.models import EMBED_DIM
 
 class EmbedTool(BaseTool):
     name = 'embed'
 
     def run(self, input: ToolInput) -> ToolResult:
         mode = os.getenv("LIFEMIRROR_MODE", "mock")
-        dims = input.options.get("dims", 8)
+        dims = input.options.get("dims", EMBED_DIM)
 
         if mode == "mock":
             seed = hash(input.media_id) % (2**32)
@@ -28,7 +29,8 @@ class EmbedTool(BaseTool):
             # Option 2: If we want image embeddings, use CLIP or another vision model later.
             response = client.embeddings.create(
                 model="text-embedding-3-large",
-                input=input.url
+                input=input.url,
+                dimensions=dims  # shortened to fit the vector(EMBED_DIM) column
             )
             vector = response.data[0].embedding
             return ToolResult(success=True, data={"vector": vector, "model": "text-embedding-3-large"})
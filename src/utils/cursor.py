@@ -0,0 +1,51 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Optional, Tuple
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"t": value.isoformat()}
+    if isinstance(value, (Decimal, float, int)) and not isinstance(value, bool):
+        return {"n": str(value)}  # as text so Decimals round-trip exactly
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "t" in value:
+        return datetime.fromisoformat(value["t"])
+    if isinstance(value, dict) and "n" in value:
+        return Decimal(value["n"])
+    return value
+
+
+def encode_cursor(sort_by: str, key: Any, row_id: Any) -> str:
+    """Opaque keyset cursor for the row a page ended on: (sort key, id) plus the sort it belongs to."""
+    raw = json.dumps({"s": sort_by, "k": _encode_value(key), "id": str(row_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str) -> Tuple[Any, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        key, row_id = _decode_value(data["k"]), data["id"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor("Malformed cursor") from e
+    if data.get("s") != sort_by:
+        raise InvalidCursor(f"Cursor was issued for sort_by={data.get('s')!r}, not {sort_by!r}")
+    return key, row_id
+
+
+def next_cursor(sort_by: str, rows, limit: int, key_of, id_of) -> Optional[str]:
+    """Cursor for the page after `rows`, or None when this was the last page."""
+    if len(rows) < limit or not rows:
+        return None
+    last = rows[-1]
+    return encode_cursor(sort_by, key_of(last), id_of(last))
@@ -11,4 +11,29 @@ celery_app.conf.beat_schedule = {
         "task": "src.workers.tasks.check_notifications_async",
         "schedule": crontab(minute=0, hour="*/6"),  # every 6 hours
     },
+    "submit-llm-batches": {
+        "task": "src.workers.tasks.submit_llm_batches_async",
+        "schedule": int(os.getenv("LLM_BATCH_SUBMIT_SECONDS", "600")),
+    },
+    "poll-llm-batches": {
+        "task": "src.workers.tasks.poll_llm_batches_async",
+        "schedule": int(os.getenv("LLM_BATCH_POLL_SECONDS", "300")),
+    },
+    "refresh-trending-scores": {
+        "task": "src.workers.tasks.refresh_trending_scores_async",
+        "schedule": int(os.getenv("TRENDING_REFRESH_SECONDS", "900")),
+    },
+    "refresh-leaderboard": {
+        "task": "src.workers.tasks.refresh_leaderboard_async",
+        "schedule": int(os.getenv("LEADERBOARD_REFRESH_SECONDS", "3600")),
+    },
+    # Just ahead of the notification sweep, which reads these results
+    "social-graph-batch": {
+        "task": "src.workers.tasks.social_graph_batch_async",
+        "schedule": crontab(minute=30, hour="5-23/6"),
+    },
+    "rebuild-score-distribution": {
+        "task": "src.workers.tasks.rebuild_score_distribution_async",
+        "schedule": int(os.getenv("SCORE_DISTRIBUTION_REBUILD_SECONDS", "3600")),
+    },
 }
@@ -1,172 +1,388 @@
+from celery import group
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.utils.log import get_task_logger
+from sqlalchemy.orm import Session
+from src.workers.celery_app import celery_app
+from src.db.session import session_scope
+from src.db.models import Media
+from src.db.media_repository import latest_media
 from src.services.perception import PerceptionAggregator
-from src.agents.social_agent import SocialAgent, AgentInput
-from src.agents.vibe_compare_agent import VibeComparisonAgent, AgentInputfrom src.agents.perception_history_agent import PerceptionHistoryAgent, AgentInput
+from src.services.history_state import HistoryStateStore
+from src.services.perception_facts import FACT_KEYS, PerceptionFactsWriter
+from src.agents.face_agent import FaceAgent
+from src.agents.posture_agent import PostureAgent
+from src.agents.fashion_agent import FashionAgent
+from src.agents.detect_agent import DetectAgent
+from src.agents.social_agent import SocialAgent
+from src.agents.vibe_compare_agent import VibeComparisonAgent
+from src.agents.perception_history_agent import PerceptionHistoryAgent
 from src.agents.notification_agent import NotificationAgent
 from src.agents.base_agent import AgentInput
-from src.db.models import User
-from celery import shared_task
+from src.agents.embedder_agent import EmbedderAgent
+from src.services.similarity import store_embedding
+from src.services.media_objects import MediaObjectsWriter
+from src.services.leaderboard import LeaderboardStore
+from src.services.response_cache import invalidate_public_caches
+from src.services.search import media_search_text
+from src.services.score_distribution import ScoreDistributionStore, sync_user_score
+from src.services.minhash import SOCIAL_GRAPH_LSH, sync_user_signature
+from src.services.social_graph_batch import SOCIAL_GRAPH_SHARDS, compute_shard
+from src.services.notification_sweep import NOTIFICATION_DISPATCH_CHUNKS, SweepCheckpoint, active_user_ids, iter_chunks
+from src.services.trending import refresh_trending_scores, trending_score
+from src.services.llm_batch import LLM_BATCH_MODE, LLMBatchQueue, get_backend, submit_batch, fan_out
+
+logger = get_task_logger(__name__)
+
+
+def _update_media_metadata(db: Session, media_id, patch: dict):
+    """Merge `patch` into Media.metadata (reassigned so the JSON column is flagged dirty)."""
+    media = db.query(Media).filter(Media.id == media_id).first()
+    if not media:
+        return None
+    md = dict(media.metadata or {})
+    md.update(patch)
+    media.metadata = md
+    if FACT_KEYS & patch.keys():
+        PerceptionFactsWriter(db).record_media(media)
+    public_change = False
+    if "social" in patch:
+        pct = ((patch["social"] or {}).get("percentile") or {}).get("overall")
+        media.trending_score = trending_score(pct, media.created_at)
+        media.search_text = media_search_text(media.user.public_alias, md)
+        # sync_user returns the row only for opted-in users, i.e. when public pages change
+        public_change = LeaderboardStore(db).sync_user(media.user_id) is not None
+    db.commit()
+    if public_change:
+        invalidate_public_caches()
+    if "vibe_analysis" in patch:
+        sync_user_score(db, media.user_id)
+        if SOCIAL_GRAPH_LSH:
+            sync_user_signature(db, media.user_id)
+    return media
 
 
 @celery_app.task(rate_limit="30/m", time_limit=180, soft_time_limit=150)
 def process_media_async(media_id: int, storage_url: str):
     logger.info(f"[process_media_async] Start for media_id={media_id}, url={storage_url}")
-    db = next(get_db())
-
-    try:
-        # Run agents sequentially
-        face_res = FaceAgent().run({"media_id": media_id, "url": storage_url})
-        logger.info(f"FaceAgent output: {face_res.dict()}")
-        if face_res.success:
-            face_crops = []
-            for f in face_res.data.get("faces", []):
-                if f.get("crop_url"):
-                    face_crops.append({
-                        "crop_url": f["crop_url"],
-                        "gender": f.get("gender"),
-                        "age": f.get("age"),
-                        "expression": f.get("expression")
-                    })
-            _update_media_metadata(db, media_id, {"faces": face_crops})
-
-        posture_res = PostureAgent().run({"media_id": media_id, "url": storage_url})
-        logger.info(f"PostureAgent output: {posture_res.dict()}")
-        if posture_res.success:
-            posture_crops = []
-            crop_url = posture_res.data.get("crop_url")
-            if crop_url:
-                posture_crops.append({
-                    "crop_url": crop_url,
-                    "alignment_score": posture_res.data.get("alignment_score"),
-                    "tips": posture_res.data.get("tips", [])
-                })
-            _update_media_metadata(db, media_id, {"posture_crops": posture_crops})
-
-        fashion_res = FashionAgent().run({"media_id": media_id, "url": storage_url})
-        logger.info(f"FashionAgent output: {fashion_res.dict()}")
-        if fashion_res.success:
-            fashion_crops = []
-            for itm in fashion_res.data.get("items", []):
-                if itm.get("crop_url"):
-                    fashion_crops.append({
-                        "type": itm.get("type"),
-                        "score": itm.get("score"),
-                        "crop_url": itm.get("crop_url")
+    with session_scope() as db:
+        try:
+            # Run agents sequentially
+            face_res = FaceAgent().run(AgentInput(media_id=media_id, url=storage_url))
+            logger.info(f"FaceAgent output: {face_res.dict()}")
+            if face_res.success:
+                MediaObjectsWriter(db).record_faces(media_id, face_res.data.get("faces", []))
+                face_crops = []
+                for f in face_res.data.get("faces", []):
+                    if f.get("crop_url"):
+                        face_crops.append({
+                            "crop_url": f["crop_url"],
+                            "gender": f.get("gender"),
+                            "age": f.get("age"),
+                            "expression": f.get("expression")
+                        })
+                _update_media_metadata(db, media_id, {"faces": face_crops})
+
+            posture_res = PostureAgent().run(AgentInput(media_id=media_id, url=storage_url))
+            logger.info(f"PostureAgent output: {posture_res.dict()}")
+            if posture_res.success:
+                posture_crops = []
+                crop_url = posture_res.data.get("crop_url")
+                if crop_url:
+                    posture_crops.append({
+                        "crop_url": crop_url,
+                        "alignment_score": posture_res.data.get("alignment_score"),
+                        "tips": posture_res.data.get("tips", [])
                     })
-            _update_media_metadata(db, media_id, {"fashion_crops": fashion_crops})
-
-        detect_res = DetectAgent().run({"media_id": media_id, "url": storage_url})
-        logger.info(f"DetectAgent output: {detect_res.dict()}")
-        if detect_res.success:
-            _update_media_metadata(db, media_id, {"objects": detect_res.data.get("detections", [])})
-
-        embed_res = EmbedAgent().run({"media_id": media_id, "url": storage_url})
-        logger.info(f"EmbedAgent output: {embed_res.dict()}")
-        if embed_res.success:
-            _update_media_metadata(db, media_id, {"embedding": embed_res.data.get("embedding")})
-
-        # --- Step 11: Build perception profile ---
-        agg = PerceptionAggregator(db)
-        perception_profile = agg.build_profile(media_id)
-
-        # --- Step 12: Social Intelligence Agent ---
-        social_agent = SocialAgent()
-        social_result = social_agent.run(
-            AgentInput(
-                media_id=media_id,
-                url=None,
-                data={"perception_data": perception_profile}
+                _update_media_metadata(db, media_id, {"posture_crops": posture_crops})
+
+            fashion_res = FashionAgent().run(AgentInput(media_id=media_id, url=storage_url))
+            logger.info(f"FashionAgent output: {fashion_res.dict()}")
+            if fashion_res.success:
+                MediaObjectsWriter(db).record_detections(media_id, fashion_res.data.get("items", []), source="fashion")
+                fashion_crops = []
+                for itm in fashion_res.data.get("items", []):
+                    if itm.get("crop_url"):
+                        fashion_crops.append({
+                            "type": itm.get("type"),
+                            "score": itm.get("score"),
+                            "crop_url": itm.get("crop_url")
+                        })
+                _update_media_metadata(db, media_id, {"fashion_crops": fashion_crops})
+
+            detect_res = DetectAgent().run(AgentInput(media_id=media_id, url=storage_url))
+            logger.info(f"DetectAgent output: {detect_res.dict()}")
+            if detect_res.success:
+                detections = detect_res.data.get("detections", [])
+                MediaObjectsWriter(db).record_detections(media_id, detections)
+                _update_media_metadata(db, media_id, {"objects": detections})
+
+            embed_res = EmbedderAgent().run(AgentInput(media_id=media_id, url=storage_url))
+            logger.info(f"EmbedderAgent model: {embed_res.data.get('model')}")
+            if embed_res.success:
+                # Vectors live in the pgvector table; metadata only records which model produced them
+                media = db.query(Media).filter(Media.id == media_id).first()
+                store_embedding(db, media_id, media.user_id, embed_res.data["vector"], embed_res.data.get("model"), media.created_at)
+                _update_media_metadata(db, media_id, {"embedding_model": embed_res.data.get("model")})
+
+            # --- Step 11: Build perception profile ---
+            agg = PerceptionAggregator(db)
+            perception_profile = agg.build_profile(media_id)
+
+            # --- Step 12: Social Intelligence Agent ---
+            social_agent = SocialAgent()
+            social_result = social_agent.run(
+                AgentInput(
+                    media_id=media_id,
+                    url=None,
+                    data={"perception_data": perception_profile}
+                )
             )
-        )
 
-        if social_result.success:
-            _update_media_metadata(db, media_id, {"social": social_result.data})
-        else:
-            _update_media_metadata(db, media_id, {"social": {"error": social_result.error}})
+            if social_result.success:
+                _update_media_metadata(db, media_id, {"social": social_result.data})
+            else:
+                _update_media_metadata(db, media_id, {"social": {"error": social_result.error}})
 
-        logger.info(f"[process_media_async] Completed for media_id={media_id}")
+            logger.info(f"[process_media_async] Completed for media_id={media_id}")
 
-        # Trigger perception history update for the user
-        media = db.query(Media).filter(Media.id == media_id).first()
-        if media and media.user_id:
-            update_perception_history_async.delay(media.user_id)
+            # Fold the new result into the user's rolling history, then refresh the summary
+            media = db.query(Media).filter(Media.id == media_id).first()
+            if media and media.user_id:
+                HistoryStateStore(db).apply_media(media)
+                update_perception_history_async.delay(media.user_id)
 
 
-    except Exception as e:
-        logger.exception(f"process_media_async failed: {e}")
+        except Exception as e:
+            logger.exception(f"process_media_async failed: {e}")
 
 
 
 @celery_app.task(rate_limit="10/m", time_limit=120, soft_time_limit=90)
 def compare_media_vibes_async(media_id_1: int, media_id_2: int):
     logger.info(f"[compare_media_vibes_async] Start for media_id_1={media_id_1}, media_id_2={media_id_2}")
-    db = next(get_db())
-
-    try:
-        agent = VibeComparisonAgent()
-        result = agent.run(AgentInput(media_id=0, url=None, data={
-            "media_id_1": media_id_1,
-            "media_id_2": media_id_2
-        }))
-
-        if result.success:
-            # Store comparison result in both media items' metadata
-            for mid in (media_id_1, media_id_2):
-                _update_media_metadata(db, mid, {
-                    f"vibe_comparison_with_{media_id_2 if mid == media_id_1 else media_id_1}": result.data
-                })
-        else:
-            logger.error(f"VibeComparisonAgent failed: {result.error}")
+    with session_scope() as db:
+        try:
+            agent = VibeComparisonAgent()
+            result = agent.run(AgentInput(media_id=0, url=None, data={
+                "media_id_1": media_id_1,
+                "media_id_2": media_id_2
+            }))
+
+            if result.success:
+                # Store comparison result in both media items' metadata
+                for mid in (media_id_1, media_id_2):
+                    _update_media_metadata(db, mid, {
+                        f"vibe_comparison_with_{media_id_2 if mid == media_id_1 else media_id_1}": result.data
+                    })
+            else:
+                logger.error(f"VibeComparisonAgent failed: {result.error}")
 
-        logger.info(f"[compare_media_vibes_async] Completed for {media_id_1} vs {media_id_2}")
+            logger.info(f"[compare_media_vibes_async] Completed for {media_id_1} vs {media_id_2}")
 
-    except Exception as e:
-        logger.exception(f"compare_media_vibes_async failed: {e}")
+        except Exception as e:
+            logger.exception(f"compare_media_vibes_async failed: {e}")
 
 
 
 @celery_app.task(rate_limit="60/m", time_limit=90, soft_time_limit=60)
 def update_perception_history_async(user_id: int):
     logger.info(f"[update_perception_history_async] Start for user_id={user_id}")
-    db = next(get_db())
+    with session_scope() as db:
+        try:
+            agent = PerceptionHistoryAgent()
 
-    try:
-        agent = PerceptionHistoryAgent()
-        result = agent.run(AgentInput(media_id=0, url=None, data={"user_id": user_id}))
-
-        if result.success:
-            # Store the latest history summary in a special metadata field for the latest media
-            latest_media = (
-                db.query(Media)
-                .filter(Media.user_id == user_id)
-                .order_by(Media.created_at.desc())
-                .first()
-            )
-            if latest_media:
-                _update_media_metadata(db, latest_media.id, {
-                    "history_summary": result.data
-                })
-        else:
-            logger.error(f"PerceptionHistoryAgent failed: {result.error}")
+            latest = latest_media(db, user_id)
+
+            # Background refresh: hand the prompt to the batch queue instead of calling the LLM now
+            if LLM_BATCH_MODE and latest:
+                req = agent.build_batch_request(user_id, latest.id)
+                if req:
+                    LLMBatchQueue().enqueue(req)
+                    logger.info(f"[update_perception_history_async] Queued batch request {req.custom_id}")
+                return
 
-        logger.info(f"[update_perception_history_async] Completed for user_id={user_id}")
+            result = agent.run(AgentInput(media_id=0, url=None, data={"user_id": user_id}))
 
-    except Exception as e:
-        logger.exception(f"update_perception_history_async failed: {e}")
+            if result.success:
+                # Store the latest history summary in a special metadata field for the latest media
+                if latest:
+                    _update_media_metadata(db, latest.id, {
+                        "history_summary": result.data
+                    })
+            else:
+                logger.error(f"PerceptionHistoryAgent failed: {result.error}")
 
+            logger.info(f"[update_perception_history_async] Completed for user_id={user_id}")
 
+        except Exception as e:
+            logger.exception(f"update_perception_history_async failed: {e}")
 
-@celery_app.task(rate_limit="6/h", time_limit=120, soft_time_limit=90)
-def check_notifications_async():
-    logger.info("[check_notifications_async] Starting periodic notification check...")
-    db = next(get_db())
-    users = db.query(User).all()
 
-    for u in users:
+
+@celery_app.task(rate_limit="6/h", time_limit=900, soft_time_limit=840)
+def check_notifications_async():
+    """
+    Coordinator: stream active user ids and dispatch them in chunks to
+    notify_users_chunk_async, checkpointing after each group. Only one coordinator runs
+    at a time; one that hits its time limit re-enqueues itself to continue the sweep.
+    """
+    checkpoint = SweepCheckpoint()
+    token = checkpoint.acquire()
+    if token is None:
+        logger.info("[check_notifications_async] Another coordinator holds the sweep lock, skipping")
+        return
+
+    cut_off = False
+    try:
+        state = checkpoint.resume()
+        sweep_id = state["sweep_id"]
+        logger.info(f"[check_notifications_async] Sweep {sweep_id}, resuming after {state['after_id']}")
+
+        def dispatch(chunks):
+            if not chunks:
+                return
+            group(notify_users_chunk_async.s(sweep_id, chunk) for chunk in chunks).apply_async()
+            checkpoint.advance(chunks[-1][-1], sum(len(c) for c in chunks))
+
+        with session_scope() as db:
+            pending = []
+            for chunk in iter_chunks(active_user_ids(db, after_id=state["after_id"])):
+                pending.append(chunk)
+                if len(pending) >= NOTIFICATION_DISPATCH_CHUNKS:
+                    dispatch(pending)
+                    pending = []
+            dispatch(pending)
+        checkpoint.finish()
+        logger.info(f"[check_notifications_async] Sweep {sweep_id} dispatched: {checkpoint.progress()}")
+    except SoftTimeLimitExceeded:
+        cut_off = True
+        logger.warning(f"[check_notifications_async] Cut off, continuing from {checkpoint.progress()}")
+    finally:
+        checkpoint.release(token)
+    if cut_off:
+        check_notifications_async.apply_async(countdown=60)
+
+
+@celery_app.task(time_limit=600, soft_time_limit=540)
+def notify_users_chunk_async(sweep_id: str, user_ids: list):
+    done = failed = 0
+    for uid in user_ids:
         try:
-            NotificationAgent().run(AgentInput(data={"user_id": str(u.id)}))
+            NotificationAgent().run(AgentInput(data={"user_id": uid}))
+            done += 1
         except Exception as e:
-            logger.exception(f"Notification check failed for user {u.id}: {e}")
+            failed += 1
+            logger.exception(f"Notification check failed for user {uid}: {e}")
+    SweepCheckpoint().record(sweep_id, done, failed)
 
-    logger.info("[check_notifications_async] Done.")
 
+# Agents whose prompts can be deferred to the batch API, by agent name
+BATCH_PARSERS = {
+    PerceptionHistoryAgent.name: lambda req, raw: PerceptionHistoryAgent().apply_batch_result(req, raw),
+}
 
+
+@celery_app.task(time_limit=300, soft_time_limit=240)
+def submit_llm_batches_async():
+    queue = LLMBatchQueue()
+    requests = queue.drain()
+    if not requests:
+        return
+    try:
+        batch_id = submit_batch(get_backend(), requests)
+    except Exception:
+        # Drained but not submitted: put them back for the next run
+        queue.requeue(requests)
+        raise
+    queue.mark_submitted(batch_id, requests)
+    logger.info(f"[submit_llm_batches_async] Submitted {batch_id} with {len(requests)} requests")
+
+
+@celery_app.task(time_limit=600, soft_time_limit=540)
+def poll_llm_batches_async():
+    queue = LLMBatchQueue()
+    backend = get_backend()
+    with session_scope() as db:
+        def store(media_id, key, data):
+            try:
+                _update_media_metadata(db, media_id, {key: data})
+            except Exception:
+                db.rollback()  # keep the session usable for the rest of the batch
+                raise
+
+        for batch_id, requests in queue.submitted().items():
+            try:
+                status = backend.status(batch_id)
+                if status == "in_progress":
+                    continue
+                if status == "completed":
+                    results = backend.results(batch_id)
+                    # fan_out handles per-request failures, so results are applied once
+                    counts = fan_out(requests, results, BATCH_PARSERS, store)
+                    logger.info(f"[poll_llm_batches_async] {batch_id}: {counts}")
+                else:
+                    logger.error(f"[poll_llm_batches_async] {batch_id} {status}, {len(requests)} requests dropped")
+                queue.mark_done(batch_id)
+            except Exception as e:
+                logger.exception(f"poll_llm_batches_async failed for {batch_id}: {e}")
+
+
+@celery_app.task(time_limit=3600, soft_time_limit=3500)
+def backfill_perception_facts_async(chunk_size: int = 1000):
+    from src.db.backfill import backfill_perception_facts
+    with session_scope() as db:
+        total = backfill_perception_facts(db, chunk_size=chunk_size)
+        logger.info(f"[backfill_perception_facts_async] Done, {total} media processed")
+
+
+@celery_app.task(time_limit=3600, soft_time_limit=3500)
+def backfill_media_objects_async(chunk_size: int = 1000):
+    from src.db.backfill import backfill_media_objects
+    with session_scope() as db:
+        total = backfill_media_objects(db, chunk_size=chunk_size)
+        logger.info(f"[backfill_media_objects_async] Done, {total} media processed")
+
+
+@celery_app.task(time_limit=3600, soft_time_limit=3500)
+def backfill_tag_signatures_async(chunk_size: int = 1000):
+    from src.db.backfill import backfill_tag_signatures
+    with session_scope() as db:
+        total = backfill_tag_signatures(db, chunk_size=chunk_size)
+        logger.info(f"[backfill_tag_signatures_async] Done, {total} users processed")
+
+
+@celery_app.task(time_limit=900, soft_time_limit=840)
+def refresh_leaderboard_async():
+    """Consistency pass over leaderboard_entries; the pipeline keeps it current in between."""
+    with session_scope() as db:
+        counts = LeaderboardStore(db).refresh_all()
+        logger.info(f"[refresh_leaderboard_async] {counts}")
+
+
+@celery_app.task(time_limit=900, soft_time_limit=840)
+def rebuild_score_distribution_async():
+    """Rebuild the shared vibe score distribution; the pipeline updates it per user in between."""
+    with session_scope() as db:
+        n = ScoreDistributionStore().rebuild(db)
+        logger.info(f"[rebuild_score_distribution_async] {n} public users")
+
+
+@celery_app.task(time_limit=60, soft_time_limit=50)
+def social_graph_batch_async(shards: int = SOCIAL_GRAPH_SHARDS):
+    """Fan the social-graph sweep out as one task per user id range."""
+    group(social_graph_shard_async.s(i, shards) for i in range(shards)).apply_async()
+    logger.info(f"[social_graph_batch_async] Dispatched {shards} shards")
+
+
+@celery_app.task(time_limit=1800, soft_time_limit=1740)
+def social_graph_shard_async(shard: int, shards: int):
+    with session_scope() as db:
+        n = compute_shard(db, shard, shards)
+        logger.info(f"[social_graph_shard_async] shard {shard}/{shards}: {n} users")
+
+
+@celery_app.task(time_limit=900, soft_time_limit=840)
+def refresh_trending_scores_async():
+    with session_scope() as db:
+        counts = refresh_trending_scores(db)
+        logger.info(f"[refresh_trending_scores_async] {counts}")
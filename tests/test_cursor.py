@@ -0,0 +1,37 @@
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from src.agents.public_feed_agent import PublicFeedAgent
+from src.utils.cursor import InvalidCursor, decode_cursor, encode_cursor, next_cursor
+
+
+def test_round_trip_keeps_key_types():
+    ts = datetime(2025, 3, 1, 12, 30, 5, 123456)
+    assert decode_cursor(encode_cursor("newest", ts, "m1"), "newest") == (ts, "m1")
+    key, _ = decode_cursor(encode_cursor("trending", Decimal("87.1234567890123"), "m2"), "trending")
+    assert key == Decimal("87.1234567890123")
+
+
+def test_rejects_garbage_and_sort_mismatch():
+    with pytest.raises(InvalidCursor):
+        decode_cursor("not-a-cursor", "newest")
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor("highest", 10, "m1"), "newest")
+
+
+def test_next_cursor_only_for_full_pages():
+    rows = [("a", 3), ("b", 2)]
+    assert next_cursor("highest", rows, 3, key_of=lambda r: r[1], id_of=lambda r: r[0]) is None
+    cur = next_cursor("highest", rows, 2, key_of=lambda r: r[1], id_of=lambda r: r[0])
+    assert decode_cursor(cur, "highest") == (Decimal(2), "b")
+
+
+def test_relevance_cursor_is_bound_to_the_query():
+    token = PublicFeedAgent._sort_token("relevance", "Calm ")
+    cur = encode_cursor(token, 0.5, "m1")
+    assert decode_cursor(cur, PublicFeedAgent._sort_token("relevance", "calm")) == (Decimal("0.5"), "m1")
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cur, PublicFeedAgent._sort_token("relevance", "bold"))
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cur, PublicFeedAgent._sort_token("newest", "calm"))
+    assert PublicFeedAgent._sort_token("newest", "calm") == "newest"
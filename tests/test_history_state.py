@@ -0,0 +1,111 @@
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from src.db.models import PerceptionHistoryMedia, PerceptionHistoryState
+from src.services.history_state import HistoryStateStore
+
+T0 = datetime(2026, 1, 1, 12, 0)
+
+
+class _ReplayStore(HistoryStateStore):
+    """The facts-table replay query is Postgres-only (array_agg); serve its rows from a list."""
+    def __init__(self, db, rows):
+        super().__init__(db)
+        self.rows = rows
+
+    def _replay_rows(self, user_id):
+        return list(self.rows)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    PerceptionHistoryState.__table__.create(engine)
+    PerceptionHistoryMedia.__table__.create(engine)
+    return Session(engine)
+
+
+def _media(user_id, hours, score=7.0, tags=("calm",)):
+    social = {"social_score": score, "tags": list(tags)} if score is not None else {"tags": list(tags)}
+    return SimpleNamespace(id=uuid.uuid4(), user_id=user_id, created_at=T0 + timedelta(hours=hours),
+                           metadata={"social": social})
+
+
+def test_bootstrap_replays_facts_once(db):
+    user_id = uuid.uuid4()
+    rows = [(uuid.uuid4(), T0 + timedelta(hours=h), 5.0 + h, ["calm", "bold"][: h + 1]) for h in range(2)]
+    store = _ReplayStore(db, rows)
+
+    state = store.bootstrap(user_id)
+    assert state.media_count == 2
+    assert [p["score"] for p in state.score_series] == [5.0, 6.0]
+    assert state.tag_counts == {"calm": 2, "bold": 1}
+    assert state.last_media_at == rows[-1][1]
+
+    again = store.bootstrap(user_id)  # already-applied media are skipped
+    assert again.media_count == 2 and len(again.pending) == 2
+
+
+def test_bootstrap_without_scored_media_stores_nothing(db):
+    assert _ReplayStore(db, []).bootstrap(uuid.uuid4()) is None
+    assert db.query(PerceptionHistoryState).count() == 0
+
+
+def test_apply_is_idempotent_and_counts_late_older_uploads(db):
+    user_id = uuid.uuid4()
+    first = _media(user_id, 0)
+    store = _ReplayStore(db, [(first.id, first.created_at, 7.0, ["calm"])])
+    store.apply_media(first)  # no state yet: bootstraps
+
+    newer, older = _media(user_id, 5, score=9.0, tags=("bold",)), _media(user_id, 2, score=3.0)
+    store.apply_media(newer)
+    store.apply_media(older)  # finished after `newer` but is older: still counted
+    state = store.apply_media(newer)  # retry: ignored
+
+    assert state.media_count == 3
+    assert [p["score"] for p in state.score_series] == [7.0, 3.0, 9.0]
+    assert state.tag_counts == {"calm": 2, "bold": 1}
+    assert state.last_media_at == newer.created_at
+
+
+def test_apply_skips_unscored_media_like_bootstrap(db):
+    user_id = uuid.uuid4()
+    first = _media(user_id, 0)
+    store = _ReplayStore(db, [(first.id, first.created_at, 7.0, ["calm"])])
+    store.apply_media(first)
+    assert store.apply_media(_media(user_id, 1, score=None)) is None
+    assert store.get(user_id).media_count == 1
+
+
+def test_record_summary_clears_only_the_entries_it_covered(db):
+    user_id = uuid.uuid4()
+    first = _media(user_id, 0)
+    store = _ReplayStore(db, [(first.id, first.created_at, 7.0, ["calm"])])
+    store.apply_media(first)
+    newer = _media(user_id, 5)
+    state = store.apply_media(newer)
+    covered = store.pending_ids(state)  # a summary is built from these two
+
+    older = _media(user_id, 2)  # finished while the summary was in flight, but is older
+    state = store.apply_media(older)
+    assert store.pending_ids(state) == [str(first.id), str(older.id), str(newer.id)]
+
+    store.record_summary(state, {"summary": "covered two"}, covered=covered)
+    assert store.pending_ids(state) == [str(older.id)]
+    assert store.pending_entries(state)[0] == {"timestamp": older.created_at.isoformat(), "score": 7.0, "tags": ["calm"]}
+    assert state.last_summary == {"summary": "covered two"}
+
+    store.record_summary(state, {"summary": "all"})
+    assert state.pending == []
+
+
+def test_applied_tags_are_normalized_like_replayed_ones(db):
+    user_id = uuid.uuid4()
+    first = _media(user_id, 0)
+    store = _ReplayStore(db, [(first.id, first.created_at, 7.0, ["calm"])])
+    store.apply_media(first)
+    state = store.apply_media(_media(user_id, 1, tags=(" Calm", "calm", "")))
+    assert state.tag_counts == {"calm": 2}
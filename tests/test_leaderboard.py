@@ -0,0 +1,123 @@
+import re
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from sqlalchemy.dialects import postgresql
+from src.db.models import LeaderboardEntry
+from src.services import leaderboard
+from src.services.leaderboard import PRUNE_SQL, REFRESH_SQL, LeaderboardStore, sort_keys
+
+
+def test_trending_key_orders_like_the_recency_formula():
+    now = datetime(2025, 6, 1, 12, 0)
+    users = [(90.0, now - timedelta(hours=300)), (70.0, now - timedelta(hours=2)), (None, now)]
+
+    def legacy(p, t):
+        return (p if p is not None else -1) + (100 - (now - t).total_seconds() / 3600) * 0.1
+
+    by_key = sorted(users, key=lambda u: sort_keys(*u)[1], reverse=True)
+    assert by_key == sorted(users, key=lambda u: legacy(*u), reverse=True)
+    assert sort_keys(None, now)[0] == -1.0
+
+
+class _ScriptedResult:
+    def __init__(self, rows, rowcount=0):
+        self.rows, self.rowcount = rows, rowcount
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def scalars(self):
+        return iter(self.rows)
+
+
+class _ScriptedDB:
+    """Answers each execute() with the next scripted result and records the compiled SQL."""
+    def __init__(self, *results):
+        self.results = list(results)
+        self.statements = []
+
+    def execute(self, stmt):
+        self.statements.append(stmt)
+        return self.results.pop(0) if self.results else _ScriptedResult([])
+
+    def sql(self, i):
+        return str(self.statements[i].compile(dialect=postgresql.dialect()))
+
+
+def _columns(sql_list: str):
+    return [c.strip() for c in sql_list.split(",")]
+
+
+def test_refresh_sql_writes_real_columns_and_only_changed_rows():
+    sql = REFRESH_SQL.text
+    model_columns = set(LeaderboardEntry.__table__.columns.keys())
+    inserted = _columns(re.search(r"INSERT INTO leaderboard_entries\s*\(([^)]*)\)", sql).group(1))
+    updated = re.findall(r"^\s*(\w+) = EXCLUDED\.\1", sql, flags=re.M)
+    assert set(inserted) <= model_columns and set(updated) == set(inserted) - {"user_id"}
+    # an alias change alone must pass the IS DISTINCT FROM guard
+    guard = re.search(r"IS DISTINCT FROM \(([^)]*)\)", sql).group(1)
+    assert "EXCLUDED.alias" in _columns(guard)
+    assert "JOIN users u ON u.id = m.user_id AND u.opt_in_public_analysis" in sql
+
+
+def test_prune_sql_drops_opted_out_and_media_less_users():
+    sql = " ".join(PRUNE_SQL.text.split())
+    assert sql.startswith("DELETE FROM leaderboard_entries le")
+    assert "NOT EXISTS (SELECT 1 FROM users u WHERE u.id = le.user_id AND u.opt_in_public_analysis)" in sql
+    assert "OR NOT EXISTS (SELECT 1 FROM media m WHERE m.user_id = le.user_id)" in sql
+
+
+def test_refresh_all_runs_refresh_then_prune():
+    db = _ScriptedDB(_ScriptedResult([], rowcount=3), _ScriptedResult([], rowcount=1))
+    assert LeaderboardStore(db).refresh_all() == {"upserted": 3, "pruned": 1}
+    assert db.statements == [REFRESH_SQL, PRUNE_SQL]
+
+
+def test_sync_user_removes_opted_out_user(monkeypatch):
+    uid = uuid.uuid4()
+    monkeypatch.setattr(leaderboard, "latest_media", lambda db, user_id: SimpleNamespace(created_at=datetime(2026, 1, 1)))
+    db = _ScriptedDB(_ScriptedResult([SimpleNamespace(public_alias="Ava", opt_in_public_analysis=False)]))
+
+    assert LeaderboardStore(db).sync_user(uid) is None
+    assert len(db.statements) == 2
+    assert db.sql(1).startswith("DELETE FROM leaderboard_entries WHERE leaderboard_entries.user_id =")
+
+
+def test_sync_user_removes_user_without_media(monkeypatch):
+    monkeypatch.setattr(leaderboard, "latest_media", lambda db, user_id: None)
+    db = _ScriptedDB(_ScriptedResult([SimpleNamespace(public_alias="Ava", opt_in_public_analysis=True)]))
+    assert LeaderboardStore(db).sync_user(uuid.uuid4()) is None
+    assert db.sql(1).startswith("DELETE FROM leaderboard_entries")
+
+
+def test_sync_user_upserts_alias_change(monkeypatch):
+    uid, media_id = uuid.uuid4(), uuid.uuid4()
+    uploaded = datetime(2026, 1, 1, 9, 30)
+    monkeypatch.setattr(leaderboard, "latest_media", lambda db, user_id: SimpleNamespace(created_at=uploaded))
+    db = _ScriptedDB(
+        _ScriptedResult([SimpleNamespace(public_alias="Nova", opt_in_public_analysis=True)]),
+        _ScriptedResult([SimpleNamespace(media_id=media_id, percentile=82.0)]),
+        _ScriptedResult(["bold", "calm"]),
+    )
+
+    row = LeaderboardStore(db).sync_user(uid)
+    assert row["alias"] == "Nova" and row["search_text"] == "nova bold calm"
+    assert (row["score_key"], row["trending_key"]) == sort_keys(82.0, uploaded)
+    assert row["media_id"] == media_id and row["tags"] == ["bold", "calm"]
+
+    upsert = db.sql(3)
+    assert upsert.startswith("INSERT INTO leaderboard_entries")
+    assert "ON CONFLICT (user_id) DO UPDATE SET alias = excluded.alias" in upsert
+    assert "user_id = excluded.user_id" not in upsert
+
+
+def test_sync_user_without_a_score_keeps_the_row_with_null_percentile(monkeypatch):
+    uploaded = datetime(2026, 1, 1)
+    monkeypatch.setattr(leaderboard, "latest_media", lambda db, user_id: SimpleNamespace(created_at=uploaded))
+    db = _ScriptedDB(_ScriptedResult([SimpleNamespace(public_alias=None, opt_in_public_analysis=True)]), _ScriptedResult([]))
+
+    row = LeaderboardStore(db).sync_user(uuid.uuid4())
+    assert row["percentile"] is None and row["tags"] == [] and row["score_key"] == -1.0
+    assert row["search_text"] is None
+    assert len(db.statements) == 3  # no tag lookup without a scored media
@@ -0,0 +1,34 @@
+from sqlalchemy import create_engine, text
+from src.db.leak_detector import ConnectionLeakDetector
+
+
+def test_reports_connections_held_past_threshold():
+    engine = create_engine("sqlite://")
+    detector = ConnectionLeakDetector(threshold_seconds=0)
+    detector.attach(engine)
+
+    conn = engine.connect()
+    conn.execute(text("select 1"))
+    assert detector.checked_out() == 1
+    assert len(detector.report()) == 1
+
+    conn.close()
+    assert detector.checked_out() == 0
+    assert detector.report() == []
+
+
+def test_invalidated_and_detached_connections_are_released():
+    engine = create_engine("sqlite://")
+    detector = ConnectionLeakDetector(threshold_seconds=0)
+    detector.attach(engine)
+
+    conn = engine.connect()
+    conn.invalidate()  # checkin then passes dbapi_connection=None
+    conn.close()
+    assert detector.checked_out() == 0
+
+    conn = engine.connect()
+    conn.detach()
+    assert detector.checked_out() == 0
+    conn.close()
+    assert detector.report() == []
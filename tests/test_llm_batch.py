@@ -0,0 +1,133 @@
+import json
+from types import SimpleNamespace
+from src.services.llm_batch import (
+    BatchRequest, LLMBatchQueue, LocalFileBatchBackend, submit_batch, fan_out, new_custom_id,
+)
+
+
+def _req(media_id, text):
+    return BatchRequest(
+        custom_id=new_custom_id("echo_agent"),
+        agent="echo_agent",
+        media_id=media_id,
+        metadata_key="echo",
+        body={"model": "gpt-4o-mini", "messages": [{"role": "user", "content": text}]},
+    )
+
+
+def test_local_backend_round_trip(tmp_path):
+    def responder(body):
+        text = body["messages"][-1]["content"]
+        if text == "boom":
+            raise RuntimeError("provider error")
+        return json.dumps({"echo": text})
+
+    backend = LocalFileBatchBackend(root_dir=str(tmp_path / "batches"), responder=responder)
+    requests = [_req("m1", "hello"), _req("m2", "boom"), _req("m3", "world")]
+
+    batch_id = submit_batch(backend, requests, work_dir=str(tmp_path / "spool"))
+    assert backend.status(batch_id) == "completed"
+
+    stored = {}
+    parsers = {"echo_agent": lambda req, raw: SimpleNamespace(success=True, data=json.loads(raw))}
+    counts = fan_out(requests, backend.results(batch_id), parsers, lambda mid, key, data: stored.__setitem__(mid, {key: data}))
+
+    assert counts == {"stored": 2, "failed": 1}
+    assert stored == {"m1": {"echo": {"echo": "hello"}}, "m3": {"echo": {"echo": "world"}}}
+
+
+def test_local_backend_waits_for_output_without_responder(tmp_path):
+    backend = LocalFileBatchBackend(root_dir=str(tmp_path))
+    batch_id = submit_batch(backend, [_req("m1", "hi")], work_dir=str(tmp_path / "spool"))
+    assert backend.status(batch_id) == "in_progress"
+    assert backend.status("batch_missing") == "failed"
+
+
+def test_fan_out_counts_bad_requests_and_keeps_going():
+    requests = [_req("m1", "a"), _req("m2", "b"), _req("m3", "c")]
+    requests[0].agent = "retired_agent"
+    results = {r.custom_id: {"content": json.dumps({"echo": r.media_id})} for r in requests}
+    stored = {}
+
+    def store(mid, key, data):
+        if mid == "m2":
+            raise RuntimeError("db error")
+        stored[mid] = data
+
+    parsers = {"echo_agent": lambda req, raw: SimpleNamespace(success=True, data=json.loads(raw))}
+    assert fan_out(requests, results, parsers, store) == {"stored": 1, "failed": 2}
+    assert stored == {"m3": {"echo": "m3"}}
+
+
+class _FakeListRedis:
+    def __init__(self):
+        self.items = []
+        self.hash = {}
+
+    def hset(self, key, field, value):
+        new = field not in self.hash
+        self.hash[field] = value
+        return int(new)
+
+    def hsetnx(self, key, field, value):
+        return self.hset(key, field, value) if field not in self.hash else 0
+
+    def rpush(self, key, *values):
+        self.items.extend(values)
+
+    def lpush(self, key, *values):
+        for v in values:
+            self.items.insert(0, v)
+
+    def pipeline(self):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, r):
+        self.r, self.ops = r, []
+
+    def lrange(self, key, start, end):
+        self.ops.append(lambda: list(self.r.items[start:end + 1]))
+
+    def ltrim(self, key, start, end):
+        def op():
+            self.r.items = self.r.items[start:]
+        self.ops.append(op)
+
+    def hmget(self, key, fields):
+        self.ops.append(lambda: [self.r.hash.get(f) for f in fields])
+
+    def hdel(self, key, *fields):
+        self.ops.append(lambda: sum(self.r.hash.pop(f, None) is not None for f in fields))
+
+    def execute(self):
+        return [op() for op in self.ops]
+
+
+def test_requeue_restores_drained_requests_in_order():
+    queue = LLMBatchQueue(redis_client=_FakeListRedis())
+    reqs = [_req(f"m{i}", "x") for i in range(5)]
+    for r in reqs:
+        queue.enqueue(r)
+    drained = queue.drain(max_n=3)
+    queue.requeue(drained)  # e.g. the submit failed
+    assert [r.custom_id for r in queue.drain()] == [r.custom_id for r in reqs]
+
+
+def test_keyed_requests_replace_each_other_until_drained():
+    queue = LLMBatchQueue(redis_client=_FakeListRedis())
+    first, plain, second = _req("m1", "old"), _req("m2", "x"), _req("m3", "new")
+    first.dedupe_key = second.dedupe_key = "perception_history:u1"
+    for r in (first, plain, second):
+        queue.enqueue(r)
+
+    drained = queue.drain()
+    assert [r.custom_id for r in drained] == [second.custom_id, plain.custom_id]  # latest, in the first slot
+
+    newer = _req("m4", "newer")
+    newer.dedupe_key = first.dedupe_key
+    queue.enqueue(newer)  # arrives after the drain: queued again
+    queue.requeue(drained)  # the submit failed: the newer request for the key wins
+    assert [r.custom_id for r in queue.drain()] == [plain.custom_id, newer.custom_id]
+    assert queue.drain() == []
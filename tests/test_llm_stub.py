@@ -0,0 +1,54 @@
+import json
+from typing import List
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, Field
+from benchmarks.llm_stub import create_app, request_key
+
+
+class EchoOutput(BaseModel):
+    summary: str
+    tags: List[str]
+    score: float = Field(..., ge=0, le=10)
+
+
+SCHEMAS = {"You are an echo bot.": ("echo_agent", EchoOutput)}
+
+
+def _body(text):
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [{"role": "system", "content": "You are an echo bot."}, {"role": "user", "content": text}],
+        "response_format": {"type": "json_object"},
+    }
+
+
+def test_replays_recording_and_validates_schema(tmp_path):
+    cassette = tmp_path / "llm.jsonl"
+    good, bad = _body("good"), _body("bad")
+    with open(cassette, "w") as f:
+        f.write(json.dumps({"key": request_key(good), "agent": "echo_agent",
+                            "content": json.dumps({"summary": "hi", "tags": ["a"], "score": 7})}) + "\n")
+        f.write(json.dumps({"key": request_key(bad), "agent": "echo_agent",
+                            "content": json.dumps({"summary": "hi", "tags": ["a"], "score": 42})}) + "\n")
+
+    client = TestClient(create_app(mode="replay", cassette_path=str(cassette), schemas=SCHEMAS, on_miss="error"))
+    resp = client.post("/v1/chat/completions", json=good)
+    assert resp.status_code == 200
+    assert json.loads(resp.json()["choices"][0]["message"]["content"])["score"] == 7
+
+    client.post("/v1/chat/completions", json=bad)
+    assert client.post("/v1/chat/completions", json=_body("unknown")).status_code == 404
+    assert client.get("/stub/stats").json() == {
+        "requests": 3, "hits": 2, "misses": 1, "schema_failures:echo_agent": 1
+    }
+
+
+def test_synthesizes_valid_output_and_simulates_rate_limits(tmp_path):
+    app = create_app(mode="replay", cassette_path=str(tmp_path / "none.jsonl"), schemas=SCHEMAS,
+                     rate_limit_p=0.5, seed="t")
+    client = TestClient(app)
+    codes = [client.post("/v1/chat/completions", json=_body(str(i))).status_code for i in range(40)]
+    assert set(codes) == {200, 429}
+    stats = client.get("/stub/stats").json()
+    assert stats["synthesized"] == codes.count(200)
+    assert "schema_failures:echo_agent" not in stats
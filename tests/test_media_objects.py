@@ -0,0 +1,43 @@
+from src.services.media_objects import detection_rows, face_rows
+
+
+def test_detection_rows_normalize_labels_and_skip_unlabelled():
+    rows = detection_rows("m1", [
+        {"label": " Jacket ", "score": 0.9, "bbox": [1, 2, 3, 4]},
+        {"type": "sneakers", "score": 0.7},
+        {"score": 0.5},
+    ], source="fashion")
+    assert [(r["label"], r["bbox"], r["source"]) for r in rows] == [
+        ("jacket", [1.0, 2.0, 3.0, 4.0], "fashion"),
+        ("sneakers", None, "fashion"),
+    ]
+
+
+def _tool_face(**attributes):
+    """A face as FaceTool returns it."""
+    return {"bbox": [100, 50, 80, 80], "landmarks": {"nose": [140, 90]}, "crop_url": "s3://crop.jpg",
+            "attributes": {"gender": None, "age": None, "expression": None, **attributes}}
+
+
+def test_face_rows_require_bbox():
+    rows = face_rows("m1", [
+        _tool_face(gender="Woman", age=27, expression="happy"),
+        {"crop_url": "s3://crop.jpg", "attributes": {"gender": "Man"}},  # legacy crop-only metadata
+    ])
+    assert len(rows) == 1
+    assert rows[0]["bbox"] == [100.0, 50.0, 80.0, 80.0] and rows[0]["landmarks"] == {"nose": [140, 90]}
+    assert (rows[0]["gender"], rows[0]["age"], rows[0]["expression"]) == ("Woman", 27, "happy")
+
+
+def test_face_rows_reduce_deepface_scores_to_the_dominant_label():
+    [row] = face_rows("m1", [_tool_face(gender={"Woman": 2.5, "Man": 97.5}, age=31.0)])
+    assert row["gender"] == "Man" and row["age"] == 31 and row["expression"] is None
+
+    [row] = face_rows("m1", [_tool_face(gender="x" * 40)])
+    assert row["gender"] == "x" * 16  # faces.gender is String(16)
+
+
+def test_face_rows_read_face_agent_output():
+    agent_face = {"bbox": [1, 2, 3, 4], "gender": "Woman", "age": 40, "age_range": "35-45", "expression": "neutral"}
+    [row] = face_rows("m1", [agent_face])
+    assert (row["gender"], row["age"], row["expression"]) == ("Woman", 40, "neutral")
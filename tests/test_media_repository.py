@@ -0,0 +1,104 @@
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy.dialects import postgresql
+from src.db import media_repository
+
+T0 = datetime(2026, 1, 1)
+
+
+class _RecordingDB:
+    def __init__(self):
+        self.sql = None
+
+    def execute(self, stmt):
+        self.sql = str(stmt.compile(dialect=postgresql.dialect()))
+        return iter([])
+
+
+class _Result(list):
+    def first(self):
+        return self[0] if self else None
+
+
+class _MediaRowsDB:
+    """
+    Runs the repository's statements (user filter, `?` key filters, `->` projections,
+    created_at DESC, LIMIT) against in-memory media rows, since the JSONB operators
+    have no SQLite equivalent.
+    """
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, stmt):
+        assert [str(o) for o in stmt._order_by_clauses] == ["media.created_at DESC"]
+        user_id, required = None, []
+        for clause in stmt.whereclause.clauses if hasattr(stmt.whereclause, "clauses") else [stmt.whereclause]:
+            if clause.left.key == "user_id":
+                user_id = clause.right.value
+            else:
+                assert clause.operator.opstring == "?"
+                required.append(clause.right.value)
+
+        names = list(stmt.selected_columns.keys())
+        Row = namedtuple("Row", names)
+        matching = sorted(
+            (r for r in self.rows if r["user_id"] == user_id and all(k in r["metadata"] for k in required)),
+            key=lambda r: r["created_at"], reverse=True,
+        )
+        out = _Result()
+        for r in matching[:stmt._limit]:
+            values = [r[c.name] if c.name in ("id", "created_at") else r["metadata"].get(c.element.right.value)
+                      for c in stmt.selected_columns]
+            out.append(Row(*values))
+        return out
+
+
+def _rows(user_id, other_user):
+    metas = [{"social": {"s": 1}}, {"vibe_analysis": {"v": 2}}, {"social": {"s": 3}, "fixit_suggestions": ["x"]}]
+    rows = [{"id": uuid.uuid4(), "user_id": user_id, "created_at": T0 + timedelta(hours=h), "metadata": m}
+            for h, m in enumerate(metas)]
+    rows.append({"id": uuid.uuid4(), "user_id": other_user, "created_at": T0 + timedelta(days=9),
+                 "metadata": {"social": {"s": 9}}})
+    return rows
+
+
+def test_recent_media_projects_only_requested_keys():
+    db = _RecordingDB()
+    assert media_repository.recent_media(db, "u1", 3, with_key="social", keys=("fixit_suggestions",)) == []
+
+    select_list = db.sql.split("FROM")[0]
+    assert "media.metadata ->" in select_list
+    assert "AS social" in select_list and "AS fixit_suggestions" in select_list
+    assert "media.metadata," not in select_list
+    assert "media.metadata ?" in db.sql
+    assert "ORDER BY media.created_at DESC" in db.sql
+
+
+def test_latest_media_returns_the_newest_row_with_the_requested_keys():
+    user_id, other = uuid.uuid4(), uuid.uuid4()
+    rows = _rows(user_id, other)
+    db = _MediaRowsDB(rows)
+
+    latest = media_repository.latest_media(db, user_id, keys=("social", "vibe_analysis"))
+    assert latest._fields == ("id", "created_at", "social", "vibe_analysis")
+    assert latest.id == rows[2]["id"] and latest.social == {"s": 3} and latest.vibe_analysis is None
+    assert media_repository.latest_media(db, uuid.uuid4()) is None
+
+
+def test_recent_media_filters_on_with_key_and_orders_newest_first():
+    user_id, other = uuid.uuid4(), uuid.uuid4()
+    rows = _rows(user_id, other)
+    db = _MediaRowsDB(rows)
+
+    social = media_repository.recent_media(db, user_id, 5, with_key="social", keys=("fixit_suggestions", "social"))
+    assert [r._fields for r in social] == [("id", "created_at", "social", "fixit_suggestions")] * 2
+    assert [r.id for r in social] == [rows[2]["id"], rows[0]["id"]]
+    assert [r.fixit_suggestions for r in social] == [["x"], None]
+
+    both = media_repository.recent_media(db, user_id, 5, with_key=["social", "fixit_suggestions"])
+    assert [r.id for r in both] == [rows[2]["id"]]
+
+    newest_two = media_repository.recent_media(db, user_id, 2)
+    assert [r.id for r in newest_two] == [rows[2]["id"], rows[1]["id"]]
+    assert newest_two[0]._fields == ("id", "created_at")
@@ -0,0 +1,74 @@
+import random
+import numpy as np
+from src.agents.social_graph_agent import SocialGraphAgent
+from src.services.minhash import MinHashLSH, estimated_jaccard, from_bytes, signature, to_bytes
+from src.services.tag_index import TagIndex
+
+TAGS = [f"tag{i}" for i in range(40)]
+
+
+def test_signature_is_deterministic_and_round_trips():
+    sig = signature(["calm", "bold", "calm"])
+    assert sig.dtype == np.uint32 and sig.shape == (64,)
+    assert np.array_equal(sig, signature(["bold", "calm"]))
+    raw = to_bytes(sig)
+    assert len(raw) == 64 * 4
+    assert np.array_equal(from_bytes(raw), sig)
+
+
+def test_estimated_jaccard_tracks_true_jaccard():
+    rng = random.Random(3)
+    errors = []
+    for _ in range(200):
+        a, b = set(rng.sample(TAGS, 8)), set(rng.sample(TAGS, 8))
+        true = len(a & b) / len(a | b)
+        est = estimated_jaccard(signature(a), signature(b)[None, :])[0]
+        errors.append(abs(est - true))
+    assert np.mean(errors) < 0.06
+
+
+def test_query_update_and_remove():
+    lsh = MinHashLSH()
+    lsh.add("a", signature(["calm", "bold", "warm"]))
+    lsh.add("b", signature(["calm", "bold", "warm", "chic"]))
+    lsh.add("c", signature(["sporty", "nerdy"]))
+    lsh.add("empty", signature([]))
+    assert len(lsh) == 3  # no tags, nothing to index
+
+    assert lsh.query(["calm", "bold", "warm"])[0] == "a"
+    assert "a" not in lsh.query(["calm", "bold", "warm"], exclude_user_id="a")
+    assert lsh.query([]) == []
+
+    lsh.add("c", signature(["calm", "bold", "warm"]))
+    assert "c" in lsh.query(["calm", "bold", "warm"])
+    lsh.remove("a")
+    assert "a" not in lsh.query(["calm", "bold", "warm"]) and len(lsh) == 2
+
+
+def test_copy_is_independent():
+    lsh = MinHashLSH()
+    lsh.add("a", signature(["calm", "bold"]))
+    other = lsh.copy()
+    other.remove("a")
+    other.add("b", signature(["calm", "bold"]))
+    assert lsh.query(["calm", "bold"]) == ["a"] and other.query(["calm", "bold"]) == ["b"]
+
+
+def test_rank_users_with_lsh_reranks_exactly():
+    rng = random.Random(9)
+    users = [
+        {"user_id": f"u{i}", "alias": f"User {i}", "score": rng.randint(0, 100),
+         "tags": rng.sample(TAGS[:10], rng.randint(1, 4)), "media_id": f"m{i}"}
+        for i in range(120)
+    ]
+    index = TagIndex.from_entries(users)
+    exact = SocialGraphAgent._rank_users(50, ["tag1", "tag2"], index, exclude_user_id="u0")
+
+    index.lsh = MinHashLSH()
+    for u in users:
+        index.lsh.add(u["user_id"], signature(u["tags"]))
+    similar, complementary = SocialGraphAgent._rank_users(50, ["tag1", "tag2"], index, exclude_user_id="u0")
+    # The default shortlist covers this whole population, so the re-rank matches the exact values
+    sim = lambda u: 0.7 * SocialGraphAgent._jaccard(["tag1", "tag2"], u["tags"]) + 0.3 * (1 - abs(50 - u["score"]) / 100)
+    assert [round(sim(u), 9) for u in similar] == [round(sim(u), 9) for u in exact[0]]
+    assert len(complementary) == 5 and all(u["user_id"] != "u0" for u in similar + complementary)
@@ -0,0 +1,121 @@
+import os
+import time
+from contextlib import contextmanager
+from src.services import notification_sweep
+from src.services.notification_sweep import SweepCheckpoint, iter_chunks
+
+
+class _FakeRedis:
+    """Just the hash, lock and script commands the checkpoint uses."""
+    def __init__(self):
+        self.hashes, self.strings = {}, {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+
+    def eval(self, script, numkeys, key, token):  # the compare-and-delete release script
+        if self.strings.get(key) == token:
+            del self.strings[key]
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        h = self.hashes.setdefault(key, {})
+        if field is not None:
+            h[field] = str(value)
+        for k, v in (mapping or {}).items():
+            h[k] = str(v)
+
+    def hincrby(self, key, field, n):
+        h = self.hashes.setdefault(key, {})
+        h[field] = str(int(h.get(field, 0)) + n)
+
+    def delete(self, key):
+        self.hashes.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        return []
+
+
+def test_iter_chunks():
+    assert list(iter_chunks(range(7), 3)) == [["0", "1", "2"], ["3", "4", "5"], ["6"]]
+    assert list(iter_chunks([], 3)) == []
+
+
+def test_checkpoint_resumes_an_unfinished_sweep():
+    r = _FakeRedis()
+    first = SweepCheckpoint(r).resume()
+    assert first["after_id"] is None
+
+    cp = SweepCheckpoint(r)
+    cp.advance("id-200", 200)
+    cp.record(first["sweep_id"], done=150, failed=2)
+    cp.record("an-older-sweep", done=99, failed=0)  # ignored
+    again = SweepCheckpoint(r).resume()
+    assert again == {"sweep_id": first["sweep_id"], "after_id": "id-200"}
+    assert cp.progress() == {"sweep_id": first["sweep_id"], "after_id": "id-200", "dispatched": 200,
+                             "done": 150, "failed": 2, "dispatched_all": False}
+
+    cp.finish()
+    fresh = SweepCheckpoint(r).resume()
+    assert fresh["sweep_id"] != first["sweep_id"] and fresh["after_id"] is None
+    assert cp.progress()["dispatched"] == 0
+
+
+def test_stale_checkpoint_starts_over():
+    r = _FakeRedis()
+    first = SweepCheckpoint(r).resume()
+    SweepCheckpoint(r).advance("id-9", 9)
+    r.hashes[notification_sweep.KEY]["started_at"] = str(time.time() - notification_sweep.NOTIFICATION_SWEEP_MAX_AGE_SECONDS - 1)
+    assert SweepCheckpoint(r).resume()["sweep_id"] != first["sweep_id"]
+
+
+def test_only_one_coordinator_holds_the_lock():
+    r = _FakeRedis()
+    first = SweepCheckpoint(r).acquire()
+    assert first and SweepCheckpoint(r).acquire() is None
+
+    SweepCheckpoint(r).release("someone-else")  # not the owner: lock stays
+    assert SweepCheckpoint(r).acquire() is None
+    SweepCheckpoint(r).release(first)
+    assert SweepCheckpoint(r).acquire()
+
+
+def test_coordinator_skips_while_locked_and_continues_when_cut_off(monkeypatch):
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    from celery.exceptions import SoftTimeLimitExceeded
+    from src.workers import tasks
+
+    r, requeued = _FakeRedis(), []
+
+    @contextmanager
+    def session_scope():
+        yield None
+
+    def active_user_ids(db, after_id=None):
+        yield "u1"
+        raise SoftTimeLimitExceeded()
+
+    monkeypatch.setattr(tasks, "SweepCheckpoint", lambda: SweepCheckpoint(r))
+    monkeypatch.setattr(tasks, "session_scope", session_scope)
+    monkeypatch.setattr(tasks, "active_user_ids", active_user_ids)
+    monkeypatch.setattr(tasks.check_notifications_async, "apply_async", lambda **kw: requeued.append(kw))
+
+    held = SweepCheckpoint(r).acquire()
+    tasks.check_notifications_async()
+    assert requeued == [] and "after_id" not in r.hashes.get(notification_sweep.KEY, {})
+
+    SweepCheckpoint(r).release(held)
+    tasks.check_notifications_async()
+    assert requeued == [{"countdown": 60}]
+    assert SweepCheckpoint(r).acquire()  # released for the continuation
@@ -0,0 +1,74 @@
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+from sqlalchemy.dialects import postgresql
+from src.services.perception_facts import TAG_NAME_MAX, PerceptionFactsWriter, extract_facts, normalize_tags
+
+
+class _FactsDB:
+    """Records statements; answers the tag id lookup as if every name were already stored."""
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, stmt):
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+        self.statements.append((sql, stmt))
+        if sql.startswith("SELECT tags.id, tags.name"):
+            names = stmt.compile().params.values()
+            return iter([(i, n) for i, n in enumerate(sorted(v for p in names for v in p), start=1)])
+        return iter([])
+
+
+def test_normalize_tags():
+    long_tag = "A" * (TAG_NAME_MAX + 20)
+    assert normalize_tags([" Calm", "calm", "", "  ", "Bold ", long_tag]) == ["a" * TAG_NAME_MAX, "bold", "calm"]
+    assert normalize_tags(None) == []
+
+
+def test_extract_facts():
+    facts = extract_facts({
+        "social": {"social_score": 7, "percentile": {"overall": 81}, "tags": ["Warm", "warm", "x" * 200]},
+        "vibe_analysis": {"vibe_score": 64.5, "vibe_tags": ["Confident"]},
+    })
+    assert facts["social_score"] == 7.0 and facts["vibe_score"] == 64.5 and facts["percentile"] == 81.0
+    assert facts["tags"] == {"social": ["warm", "x" * TAG_NAME_MAX], "vibe": ["confident"]}
+    assert all(len(t) <= TAG_NAME_MAX for names in facts["tags"].values() for t in names)
+
+
+def test_extract_facts_ignores_errors_and_non_numbers():
+    facts = extract_facts({"social": {"error": "timeout", "social_score": 5}, "vibe_analysis": {"vibe_score": True}})
+    assert facts == {"social_score": None, "vibe_score": None, "percentile": None, "tags": {"social": [], "vibe": []}}
+    assert extract_facts(None)["tags"] == {"social": [], "vibe": []}
+
+
+def test_writer_upserts_scores_and_replaces_tags():
+    db = _FactsDB()
+    media = SimpleNamespace(id=uuid.uuid4(), user_id=uuid.uuid4(), created_at=datetime(2026, 1, 1), metadata={
+        "social": {"social_score": 7, "tags": ["Calm", "y" * 120]},
+        "vibe_analysis": {"vibe_score": 70, "vibe_tags": ["calm"]},
+    })
+    unsaved = SimpleNamespace(id=uuid.uuid4(), user_id=None, created_at=None, metadata={})
+    PerceptionFactsWriter(db).record_many([media, unsaved])
+
+    sqls = [sql for sql, _ in db.statements]
+    assert sqls[0].startswith("INSERT INTO perception_scores") and "ON CONFLICT (media_id) DO UPDATE" in sqls[0]
+    assert sqls[1].startswith("INSERT INTO tags") and "ON CONFLICT (name) DO NOTHING" in sqls[1]
+    assert sqls[3].startswith("DELETE FROM perception_tags")
+    assert sqls[4].startswith("INSERT INTO perception_tags")
+
+    # Only the media with an owner and timestamp is written, with tags that fit tags.name
+    score_params = db.statements[0][1].compile().params
+    assert media.id in score_params.values() and unsaved.id not in score_params.values()
+    tag_names = [v for k, v in db.statements[1][1].compile().params.items() if k.startswith("name")]
+    assert sorted(tag_names) == ["calm", "y" * TAG_NAME_MAX]
+    tag_rows = db.statements[4][1].compile().params
+    assert sorted(v for k, v in tag_rows.items() if k.startswith("source")) == ["social", "social", "vibe"]
+
+
+def test_writer_skips_tag_insert_without_tags():
+    db = _FactsDB()
+    media = SimpleNamespace(id=uuid.uuid4(), user_id=uuid.uuid4(), created_at=datetime(2026, 1, 1),
+                            metadata={"social": {"social_score": 4}})
+    PerceptionFactsWriter(db).record_media(media)
+    sqls = [sql for sql, _ in db.statements]
+    assert len(sqls) == 2 and sqls[1].startswith("DELETE FROM perception_tags")
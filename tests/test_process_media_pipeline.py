@@ -0,0 +1,111 @@
+"""
+Mock-mode smoke test: process_media_async runs every agent and fires each pipeline hook.
+The DB session and the hooks' own writers are replaced by recorders.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from src.workers import tasks
+
+
+class _FakeQuery:
+    def __init__(self, media):
+        self.media = media
+
+    def filter(self, *args):
+        return self
+
+    def first(self):
+        return self.media
+
+
+class _FakeDB:
+    def __init__(self, media):
+        self.media, self.commits = media, 0
+
+    def query(self, *args):
+        return _FakeQuery(self.media)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    media = SimpleNamespace(
+        id=uuid.uuid4(), user_id=uuid.uuid4(), metadata=None, created_at=datetime.utcnow(),
+        user=SimpleNamespace(public_alias="Ava"), trending_score=None, search_text=None,
+    )
+    db = _FakeDB(media)
+    calls = []
+
+    @contextmanager
+    def session_scope():
+        yield db
+
+    class Objects:
+        def __init__(self, db):
+            pass
+
+        def record_faces(self, media_id, faces):
+            calls.append(("faces", list(faces)))
+
+        def record_detections(self, media_id, items, source="detect"):
+            calls.append(("detections", source))
+
+    class Facts:
+        def __init__(self, db):
+            pass
+
+        def record_media(self, m):
+            calls.append(("facts", sorted(m.metadata)))
+
+    class Leaderboard:
+        def __init__(self, db):
+            pass
+
+        def sync_user(self, user_id):
+            calls.append(("leaderboard", user_id))
+            return object()
+
+    class History:
+        def __init__(self, db):
+            pass
+
+        def apply_media(self, m):
+            calls.append(("history", m.id))
+
+    monkeypatch.setattr(tasks, "session_scope", session_scope)
+    monkeypatch.setattr(tasks, "MediaObjectsWriter", Objects)
+    monkeypatch.setattr(tasks, "PerceptionFactsWriter", Facts)
+    monkeypatch.setattr(tasks, "LeaderboardStore", Leaderboard)
+    monkeypatch.setattr(tasks, "HistoryStateStore", History)
+    monkeypatch.setattr(tasks, "PerceptionAggregator", lambda db: SimpleNamespace(build_profile=lambda mid: {}))
+    monkeypatch.setattr(tasks, "store_embedding", lambda *a: calls.append(("embedding", len(a[3]))))
+    monkeypatch.setattr(tasks, "invalidate_public_caches", lambda: calls.append(("invalidate",)))
+    monkeypatch.setattr(tasks.update_perception_history_async, "delay", lambda uid: calls.append(("history_refresh", uid)))
+    return media, calls
+
+
+def test_process_media_runs_every_hook(pipeline):
+    media, calls = pipeline
+    tasks.process_media_async(str(media.id), "https://example.com/a.jpg")
+
+    kinds = [c[0] for c in calls]
+    assert ("detections", "fashion") in calls and ("detections", "detect") in calls
+    for kind in ("faces", "embedding", "facts", "leaderboard", "invalidate", "history", "history_refresh"):
+        assert kind in kinds, kind
+
+    md = media.metadata
+    assert {"faces", "posture_crops", "fashion_crops", "objects", "embedding_model", "social"} <= md.keys()
+    assert md["social"]["tags"]
+    assert media.search_text.startswith("ava ")
+    assert kinds.index("history") > kinds.index("leaderboard")
@@ -0,0 +1,66 @@
+import json
+from src.services.prompt_serializer import serialize_for_agent, count_tokens
+
+PROFILE = {
+    "media_id": 7,
+    "media_url": "https://bucket/media/7.jpg?X-Amz-Signature=abc",
+    "faces": [{"bbox": [0.1, 0.2, 0.3, 0.4], "crop_url": "https://x", "gender": "female", "age": 27.123456}],
+    "posture": [{"crop_url": "https://y", "alignment_score": 8.456789, "keypoints": [[0.1, 0.2]] * 33, "tips": []}],
+    "fashion": [{"type": "jacket", "score": 0.912345, "crop_url": "https://z", "dominant_color": "#112233"}],
+    "environment": {"objects": [{"label": "person", "score": 0.98, "bbox": [1, 2, 3, 4]}], "embedding": [0.01] * 3072},
+    "summaries": {"style_summary": None, "posture_grade": "Excellent", "overall_score": 8},
+}
+
+
+def test_social_projection_drops_noise_and_rounds():
+    payload = serialize_for_agent("social_agent", PROFILE)
+    data = json.loads(payload.text)
+    assert "embedding" not in payload.text
+    assert "https://" not in payload.text
+    assert data["faces"] == [{"gender": "female", "age": 27.12}]
+    assert data["posture"] == [{"alignment_score": 8.46}]
+    assert data["summaries"] == {"posture_grade": "Excellent", "overall_score": 8}
+    assert " " not in payload.text
+    assert payload.tokens == count_tokens(payload.text)
+    assert not payload.truncated
+
+
+def test_comparison_profiles_keyed_by_media_id():
+    payload = serialize_for_agent("vibe_comparison_agent", {"profiles": {"1": PROFILE, "2": PROFILE}})
+    data = json.loads(payload.text)
+    assert set(data["profiles"]) == {"1", "2"}
+    assert data["profiles"]["2"]["fashion"][0]["type"] == "jacket"
+
+
+def test_history_is_trimmed_to_budget_keeping_latest(monkeypatch):
+    monkeypatch.setenv("PROMPT_TOKEN_BUDGET_PERCEPTION_HISTORY_AGENT", "200")
+    history = [
+        {"timestamp": f"2025-01-{i % 28 + 1:02d}T10:00:00", "score": i / 3, "tags": ["confident", "stylish"]}
+        for i in range(200)
+    ]
+    payload = serialize_for_agent("perception_history_agent", {"new_entries": history})
+    data = json.loads(payload.text)
+    assert payload.truncated
+    assert payload.tokens <= 200
+    assert data["new_entries"][-1]["score"] == round(199 / 3, 2)
+
+
+def test_trim_estimates_instead_of_popping_one_at_a_time(monkeypatch):
+    from src.services import prompt_serializer
+
+    monkeypatch.setenv("PROMPT_TOKEN_BUDGET_PERCEPTION_HISTORY_AGENT", "300")
+    calls = []
+    real_count = prompt_serializer.count_tokens
+    monkeypatch.setattr(prompt_serializer, "count_tokens", lambda t: calls.append(1) or real_count(t))
+    history = [
+        {"timestamp": f"2025-01-{i % 28 + 1:02d}T10:00:00", "score": i / 3, "tags": ["confident", "stylish"]}
+        for i in range(2000)
+    ]
+    payload = serialize_for_agent("perception_history_agent", {"new_entries": history})
+    kept = json.loads(payload.text)["new_entries"]
+
+    assert payload.tokens <= 300 and len(calls) < 20
+    # At most one item fewer than popping one at a time would keep
+    monkeypatch.setenv("PROMPT_TOKEN_BUDGET_PERCEPTION_HISTORY_AGENT", "100000")
+    wider = serialize_for_agent("perception_history_agent", {"new_entries": history[-(len(kept) + 2):]})
+    assert wider.tokens > 300
@@ -0,0 +1,152 @@
+import asyncio
+import time
+from datetime import datetime
+from redis.exceptions import ConnectionError as RedisConnectionError
+from src.services.response_cache import ResponseCache, invalidate_public_caches, normalize_params
+
+
+class FakeAsyncRedis:
+    """Just the commands ResponseCache uses, over a dict (expiry is not modelled)."""
+
+    def __init__(self, store=None):
+        self.store = {} if store is None else store
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and key in self.store:
+            return None
+        self.store[key] = value
+        return True
+
+    async def delete(self, key):
+        self.store.pop(key, None)
+
+    async def incr(self, key):
+        self.store[key] = str(int(self.store.get(key, 0)) + 1)
+
+    async def hincrby(self, key, field, n):
+        h = self.store.setdefault(key, {})
+        h[field] = str(int(h.get(field, 0)) + n)
+
+    async def hincrbyfloat(self, key, field, n):
+        h = self.store.setdefault(key, {})
+        h[field] = str(float(h.get(field, 0)) + n)
+
+    async def hgetall(self, key):
+        return dict(self.store.get(key, {}))
+
+
+class FakeSyncRedis:
+    def __init__(self, store):
+        self.store = store
+
+    def incr(self, key):
+        self.store[key] = str(int(self.store.get(key, 0)) + 1)
+
+    def hincrby(self, key, field, n):
+        h = self.store.setdefault(key, {})
+        h[field] = str(int(h.get(field, 0)) + n)
+
+
+class DownRedis:
+    def __getattr__(self, name):
+        async def fail(*args, **kwargs):
+            raise RedisConnectionError("redis down")
+        return fail
+
+
+def test_normalize_params_ignores_order_search_case_and_unset():
+    a = normalize_params({"tags": ["funny", "cute"], "search": " Cat ", "days": None, "sort_by": "newest"})
+    b = normalize_params({"sort_by": "newest", "search": "cat", "tags": ["cute", "funny"]})
+    assert a == b
+    assert a != normalize_params({"sort_by": "highest", "search": "cat", "tags": ["cute", "funny"]})
+    # tag matching is case-sensitive, so the cache key must be too
+    assert a != normalize_params({"sort_by": "newest", "search": "cat", "tags": ["cute", "Funny"]})
+
+
+def test_hit_after_miss_and_invalidation():
+    cache = ResponseCache("feed", ttl=15, redis_client=FakeAsyncRedis())
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"items": [{"created_at": datetime(2026, 1, 1)}], "next_cursor": None}
+
+    async def scenario():
+        first = await cache.get_or_compute({"sort_by": "newest"}, compute)
+        second = await cache.get_or_compute({"sort_by": "newest"}, compute)
+        await cache.invalidate()
+        third = await cache.get_or_compute({"sort_by": "newest"}, compute)
+        return first, second, third, await cache.stats()
+
+    first, second, third, stats = asyncio.run(scenario())
+    assert first == second == third
+    assert first["items"][0]["created_at"] == "2026-01-01T00:00:00"
+    assert len(calls) == 2
+    assert stats["hits"] == 1 and stats["misses"] == 2 and stats["invalidations"] == 1
+    assert stats["hit_ratio"] == 1 / 3
+    assert stats["mean_hit_age_seconds"] >= 0
+
+
+def test_concurrent_misses_compute_once():
+    cache = ResponseCache("leaderboard", ttl=30, redis_client=FakeAsyncRedis())
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"items": [1, 2, 3]}
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_compute({"sort_by": "highest"}, compute) for _ in range(10)))
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(r == {"items": [1, 2, 3]} for r in results)
+
+
+def test_waits_for_other_workers_lock():
+    store = {}
+    cache = ResponseCache("feed", ttl=15, redis_client=FakeAsyncRedis(store))
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"items": []}
+
+    async def scenario():
+        key = await cache._key({"sort_by": "newest"})
+        store[f"{key}:lock"] = "1"  # another worker is filling this page
+
+        async def other_worker():
+            await asyncio.sleep(0.05)
+            store[key] = '{"stored_at": %f, "body": {"items": ["theirs"]}}' % time.time()
+
+        result, _ = await asyncio.gather(cache.get_or_compute({"sort_by": "newest"}, compute), other_worker())
+        return result
+
+    assert asyncio.run(scenario()) == {"items": ["theirs"]}
+    assert calls == []
+
+
+def test_redis_down_serves_uncached():
+    cache = ResponseCache("feed", ttl=15, redis_client=DownRedis())
+
+    async def compute():
+        return {"items": ["fresh"]}
+
+    assert asyncio.run(cache.get_or_compute({"sort_by": "newest"}, compute)) == {"items": ["fresh"]}
+
+
+def test_stats_report_unavailable_when_redis_is_down():
+    cache = ResponseCache("feed", ttl=15, redis_client=DownRedis())
+    assert asyncio.run(cache.stats()) == {"error": "cache unavailable", "ttl_seconds": 15}
+
+
+def test_sync_invalidation_bumps_both_namespaces():
+    store = {}
+    invalidate_public_caches(FakeSyncRedis(store))
+    assert store["rc:feed:version"] == "1"
+    assert store["rc:leaderboard:version"] == "1"
@@ -0,0 +1,92 @@
+import random
+from src.services.score_distribution import ScoreDistribution, ScoreDistributionStore, normal_percentile
+
+
+def _linear_percentile(value, population):
+    if not population:
+        return 50
+    below = sum(1 for s in population if s <= value)
+    return max(1, min(99, int(round(100 * below / len(population)))))
+
+
+def test_prefix_sum_percentile_matches_linear_scan():
+    rng = random.Random(1)
+    population = [rng.randint(0, 100) for _ in range(3000)]
+    dist = ScoreDistribution.from_scores(population)
+    assert dist.total == 3000
+    for value in range(0, 101, 7):
+        assert dist.percentile(value) == _linear_percentile(value, population)
+    assert ScoreDistribution().percentile(40) == 50
+
+
+def test_exclude_drops_the_callers_own_entry():
+    population = [10, 20, 30, 40, 50]
+    dist = ScoreDistribution.from_scores(population)
+    assert dist.percentile(30, exclude=30) == _linear_percentile(30, [10, 20, 40, 50])
+    assert dist.percentile(30, exclude=50) == _linear_percentile(30, [10, 20, 30, 40])
+    dist.add(60)
+    assert dist.percentile(55) == _linear_percentile(55, population + [60])
+
+
+def test_analytic_cold_start_matches_sampled_prior():
+    rng = random.Random(2)
+    samples = [int(max(0, min(100, round(rng.gauss(60, 15))))) for _ in range(200_000)]
+    for value in (0, 30, 45, 60, 75, 90, 100):
+        assert abs(normal_percentile(value) - _linear_percentile(value, samples)) <= 1
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.version, self.counts, self.hgetall_calls = "1", {"50": "3", "70": "1"}, 0
+
+    def get(self, key):
+        return self.version
+
+    def hgetall(self, key):
+        self.hgetall_calls += 1
+        return dict(self.counts)
+
+
+def test_store_reuses_local_copy_until_version_changes():
+    r = _FakeRedis()
+    store = ScoreDistributionStore(redis_client=r, prefix="test_dist")
+    assert store.get().percentile(50) == 75
+    assert store.get().total == 4 and r.hgetall_calls == 1
+
+    r.version, r.counts["80"] = "2", "4"
+    assert store.get().total == 8 and r.hgetall_calls == 2
+
+
+class _ChangeLogRedis:
+    """GET version + ZRANGEBYSCORE over a {member: score} change log, via a pipeline."""
+    def __init__(self, version, log):
+        self.version, self.log, self.calls = str(version), log, []
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def get(self, key):
+        self.calls.append(("get", key))
+
+    def zrangebyscore(self, key, lo, hi):
+        self.calls.append(("zrangebyscore", lo))
+
+    def execute(self):
+        lo = int(self.calls[-1][1].lstrip("("))
+        return [self.version, [m for m, v in sorted(self.log.items(), key=lambda i: i[1]) if v > lo]]
+
+
+def test_changes_since_returns_each_changed_user_once():
+    log = {"4:u1": 4, "5:u2": 5, "6:u1": 6}
+    store = ScoreDistributionStore(redis_client=_ChangeLogRedis(6, log), prefix="test_dist")
+    assert store.changes_since(3) == (6, ["u1", "u2"])
+    assert store.changes_since(5) == (6, ["u1"])
+    assert store.changes_since(6) == (6, [])
+
+
+def test_changes_since_reports_gaps():
+    # versions 2-3 were trimmed from the log, and a rebuild clears it entirely
+    trimmed = ScoreDistributionStore(redis_client=_ChangeLogRedis(6, {"4:u1": 4, "5:u2": 5, "6:u1": 6}))
+    assert trimmed.changes_since(1) is None
+    rebuilt = ScoreDistributionStore(redis_client=_ChangeLogRedis(7, {}))
+    assert rebuilt.changes_since(6) is None
@@ -0,0 +1,44 @@
+from src.services.search import InMemorySearchIndex, media_search_text, search_text, similarity, word_similarity
+
+
+def _index():
+    index = InMemorySearchIndex()
+    index.add("m1", search_text("Alex", ["confident", "stylish"]))
+    index.add("m2", search_text("Alexandra", ["warm"]))
+    index.add("m3", search_text("Sam", ["funny", "energetic"]))
+    index.add("m4", search_text(None, ["approachable"]))
+    return index
+
+
+def test_search_text_folds_alias_and_tags():
+    assert search_text("Riya", ["Warm", "funny"]) == "riya warm funny"
+    assert search_text(None, []) is None
+    assert media_search_text("Sam", {"social": {"tags": ["cute"]}}) == "sam cute"
+    assert media_search_text("Sam", {"social": {"tags": "not-a-list"}}) == "sam"
+
+
+def test_substring_matches_like_ilike():
+    index = _index()
+    assert index.matches("ALEX") == {"m1", "m2"}
+    assert index.matches("ergetic") == {"m3"}
+    assert index.matches("proach") == {"m4"}
+    assert index.matches("xyz") == set()
+    # Shorter than a trigram: falls back to scanning, same results as ILIKE
+    assert index.matches("am") == {"m3"}
+
+
+def test_search_ranks_closer_matches_first():
+    index = _index()
+    assert [d for d, _ in index.search("alex")] == ["m1", "m2"]
+    assert [d for d, _ in index.search("alexandra")] == ["m2"]
+    assert word_similarity("alex", "alex confident") == 1.0
+    assert 0 < similarity("alex", "alexandra") < 1
+
+
+def test_readd_and_remove_update_postings():
+    index = _index()
+    index.add("m1", search_text("Jordan", ["stylish"]))
+    assert index.matches("alex") == {"m2"}
+    assert index.matches("jordan") == {"m1"}
+    index.remove("m2")
+    assert index.matches("alex") == set()
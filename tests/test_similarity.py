@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+from src.services import similarity
+from src.services.similarity import (
+    HNSW_EF_SEARCH, HNSW_FILTER_OVERSAMPLE, NumpyIndex, PgVectorIndex, SharedNumpyIndex,
+)
+
+
+def _index():
+    now = datetime.utcnow()
+    index = NumpyIndex()
+    index.add("m1", "alice", [1.0, 0.0, 0.0], now, public=True)
+    index.add("m2", "alice", [0.9, 0.1, 0.0], now, public=True)
+    index.add("m3", "bob", [0.95, 0.05, 0.0], now - timedelta(days=30), public=True)
+    index.add("m4", "carol", [0.8, 0.2, 0.0], now, public=False)
+    index.add("m5", "dave", [0.0, 0.0, 1.0], now, public=True)
+    return index
+
+
+def test_similar_media_orders_by_cosine_distance_and_filters():
+    index = _index()
+    assert [h["media_id"] for h in index.similar_media("m1", k=3)] == ["m3", "m2", "m4"]
+    assert [h["media_id"] for h in index.similar_media("m1", k=3, public_only=True)] == ["m3", "m2", "m5"]
+    assert [h["media_id"] for h in index.similar_media("m1", k=2, days=7)] == ["m2", "m4"]
+    assert index.similar_media("missing") is None
+
+
+def test_similar_users_keeps_best_match_per_user_and_excludes_self():
+    index = _index()
+    hits = index.similar_users("alice", k=5, public_only=False)
+    assert [h["user_id"] for h in hits] == ["bob", "carol", "dave"]
+    assert [h["user_id"] for h in index.similar_users("alice", k=5)] == ["bob", "dave"]
+
+
+class _SettingsDB:
+    def __init__(self):
+        self.settings = []
+
+    def execute(self, stmt):
+        sql = str(stmt)
+        if sql.startswith("SET LOCAL"):
+            self.settings.append(sql)
+        return iter([])
+
+
+def test_filtered_pgvector_search_oversamples_and_scans_iteratively():
+    db = _SettingsDB()
+    PgVectorIndex(db)._search([1.0, 0.0], 20, exclude_user="alice", public_only=True)
+    assert db.settings == [f"SET LOCAL hnsw.ef_search = {max(HNSW_EF_SEARCH, 20 * HNSW_FILTER_OVERSAMPLE)}",
+                           "SET LOCAL hnsw.iterative_scan = strict_order"]
+
+    db = _SettingsDB()
+    PgVectorIndex(db)._search([1.0, 0.0], 10, exclude_media="m1")
+    assert db.settings == [f"SET LOCAL hnsw.ef_search = {max(HNSW_EF_SEARCH, 11)}"]
+
+    db = _SettingsDB()
+    PgVectorIndex(db)._search([1.0, 0.0], 5000, public_only=True)
+    assert db.settings[0] == "SET LOCAL hnsw.ef_search = 1000"
+
+
+def test_shared_numpy_index_is_reused_until_stale(monkeypatch):
+    SharedNumpyIndex.reset()
+    loads = []
+
+    def load():
+        loads.append(1)
+        return _index()
+
+    first = SharedNumpyIndex.get(load)
+    assert SharedNumpyIndex.get(load) is first and len(loads) == 1
+    monkeypatch.setattr(similarity, "NUMPY_INDEX_MAX_AGE_SECONDS", -1)
+    assert SharedNumpyIndex.get(load) is not first and len(loads) == 2
+    SharedNumpyIndex.reset()
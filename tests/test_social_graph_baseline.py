@@ -0,0 +1,78 @@
+import uuid
+from types import SimpleNamespace
+from sqlalchemy.dialects import postgresql
+from src.agents.social_graph_agent import SocialGraphAgent
+
+
+class _RecordingDB:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    def execute(self, stmt):
+        self.statements.append(stmt)
+        return iter(self.rows)
+
+
+def test_baseline_is_one_streamed_distinct_on_query():
+    uid = uuid.uuid4()
+    rows = [
+        SimpleNamespace(user_id=uid, public_alias=None, media_id=uuid.uuid4(), vibe_score=71.6, tags=["calm", "warm"]),
+        SimpleNamespace(user_id=uuid.uuid4(), public_alias="Sam", media_id=uuid.uuid4(), vibe_score=40.0, tags=None),
+    ]
+    db = _RecordingDB(rows)
+
+    baseline = SocialGraphAgent()._collect_public_baseline(db, exclude_user_id="me")
+
+    assert len(db.statements) == 1
+    stmt = db.statements[0]
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert "DISTINCT ON (perception_scores.user_id)" in sql
+    assert "array_agg(tags.name ORDER BY tags.name)" in sql
+    assert "users.opt_in_public_analysis IS true" in sql
+    assert stmt.get_execution_options()["yield_per"] > 0
+
+    assert baseline[0]["alias"] == f"User {str(uid)[:8]}"
+    assert baseline[0]["score"] == 72 and baseline[0]["tags"] == ["calm", "warm"]
+    assert baseline[1]["alias"] == "Sam" and baseline[1]["tags"] == []
+
+
+def test_score_changes_patch_the_index_and_lsh(monkeypatch):
+    from src.agents import social_graph_agent
+    from src.services.minhash import MinHashLSH
+    from src.services.tag_index import TagIndex
+
+    kept, dropped, added = (str(uuid.uuid4()) for _ in range(3))
+    index = TagIndex.from_entries([{"user_id": kept, "score": 40, "tags": ["calm"]},
+                                   {"user_id": dropped, "score": 60, "tags": ["bold"]}])
+    index.lsh = MinHashLSH()
+
+    class Store:
+        def changes_since(self, since):
+            assert since == 4
+            return 7, [kept, dropped, added]
+
+    def latest(db, user_ids):
+        assert sorted(map(str, user_ids)) == sorted([kept, dropped, added])
+        return [{"user_id": uuid.UUID(u), "alias": None, "media_id": None, "score": s, "tags": ["warm"]}
+                for u, s in ((kept, 81.6), (added, 30.0))]
+
+    monkeypatch.setattr(social_graph_agent, "ScoreDistributionStore", Store)
+    monkeypatch.setattr(social_graph_agent, "public_latest_vibes", latest)
+
+    assert SocialGraphAgent()._apply_score_changes(None, index, 4) == 7
+    assert index.get(kept)["score"] == 82 and index.get(kept)["tags"] == ["warm"]
+    assert dropped not in index and added in index
+    assert set(index.lsh.query(["warm"])) == {kept, added}
+
+
+def test_too_many_score_changes_ask_for_a_reload(monkeypatch):
+    from src.agents import social_graph_agent
+
+    class Store:
+        def changes_since(self, since):
+            return since + 5, [str(uuid.uuid4()) for _ in range(5)]
+
+    monkeypatch.setattr(social_graph_agent, "ScoreDistributionStore", Store)
+    monkeypatch.setattr(social_graph_agent, "TAG_INDEX_MAX_DELTA", 4)
+    assert SocialGraphAgent()._apply_score_changes(None, None, 1) is None
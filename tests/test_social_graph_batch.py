@@ -0,0 +1,106 @@
+import random
+import uuid
+from src.agents.social_graph_agent import SocialGraphAgent
+from src.services.score_distribution import ScoreDistribution
+from src.services import social_graph_batch
+from src.services.social_graph_batch import (
+    SocialGraphResultStore, batch_percentiles, compute_shard, in_shard, shard_bounds,
+)
+from src.services.tag_index import SharedTagIndex, TagIndex
+
+TAGS = ["calm", "warm", "bold", "funny", "stylish", "quiet", "sporty", "nerdy"]
+
+
+class FakeStore:
+    def __init__(self):
+        self.rows = []
+
+    def write_many(self, results):
+        self.rows.extend(results)
+
+
+def _population(rng, n):
+    return [
+        {"user_id": str(uuid.UUID(int=rng.getrandbits(128))), "alias": f"User {i}",
+         "score": rng.randint(0, 100), "tags": rng.sample(TAGS, rng.randint(0, 3)), "media_id": f"m{i}"}
+        for i in range(n)
+    ]
+
+
+def test_shards_partition_the_id_space():
+    ids = [uuid.UUID(int=random.Random(i).getrandbits(128)) for i in range(500)] + [uuid.UUID(int=0)]
+    shards = 7
+    for uid in ids:
+        assert sum(in_shard(uid, shard_bounds(s, shards)) for s in range(shards)) == 1
+    assert shard_bounds(shards - 1, shards)[1] == 1 << 128
+
+
+def test_batch_percentiles_match_distribution_with_own_entry_excluded():
+    rng = random.Random(4)
+    for n in (1, 2, 50, 700):
+        scores = [rng.randint(0, 100) for _ in range(n)]
+        dist = ScoreDistribution.from_scores(scores)
+        assert batch_percentiles(scores).tolist() == [dist.percentile(s, exclude=s) for s in scores]
+
+
+def test_compute_shard_covers_every_user_once(monkeypatch):
+    rng = random.Random(8)
+    users = _population(rng, 80)
+    index = TagIndex.from_entries(users)
+    monkeypatch.setattr(SocialGraphAgent, "_public_index", lambda self, db: index)
+
+    store = FakeStore()
+    counts = [compute_shard(None, s, 3, store=store) for s in range(3)]
+    assert sum(counts) == len(users) == len(store.rows)
+    assert sorted(r["user_id"] for r in store.rows) == sorted(u["user_id"] for u in users)
+
+    dist = ScoreDistribution.from_scores(u["score"] for u in users)
+    row = store.rows[0]
+    me = index.get(row["user_id"])
+    assert row["data"]["percentile"]["overall"] == dist.percentile(me["score"], exclude=me["score"])
+    similar, _ = SocialGraphAgent._rank_users(me["score"], me["tags"], index, exclude_user_id=me["user_id"])
+    assert [u["user_id"] for u in row["data"]["similar_users"]] == [u["user_id"] for u in similar]
+    assert row["data"]["sample_size"] == len(users) - 1 and not row["data"]["cold_start"]
+    assert row["media_id"] == me["media_id"]
+
+
+def test_compute_shard_ranks_against_one_snapshot_while_the_shared_index_refreshes(monkeypatch):
+    SharedTagIndex.reset()
+    users = _population(random.Random(3), 40)
+    monkeypatch.setattr(SocialGraphAgent, "_public_index",
+                        lambda self, db: SharedTagIndex.get(lambda: users, version=1))
+    monkeypatch.setattr(social_graph_batch, "SOCIAL_GRAPH_WRITE_BATCH", 10)
+
+    def drop_everyone(index, since):
+        for u in users:
+            index.remove(u["user_id"])
+        return since + 1
+
+    class RefreshingStore(FakeStore):
+        def write_many(self, results):  # a request refreshes the shared index mid-sweep
+            super().write_many(results)
+            SharedTagIndex.get(lambda: [], version=len(self.rows) + 1, apply_changes=drop_everyone)
+
+    store = RefreshingStore()
+    assert compute_shard(None, 0, 1, store=store) == len(users)
+    assert len(SharedTagIndex.get(lambda: [], version=None)) == 0  # the refreshes did land
+    assert all(r["data"]["sample_size"] == len(users) - 1 for r in store.rows)
+    assert all(len(r["data"]["similar_users"]) == 5 for r in store.rows)
+    SharedTagIndex.reset()
+
+
+def test_compute_shard_skips_cold_start(monkeypatch):
+    index = TagIndex.from_entries(_population(random.Random(1), 5))
+    monkeypatch.setattr(SocialGraphAgent, "_public_index", lambda self, db: index)
+    store = FakeStore()
+    assert compute_shard(None, 0, 1, store=store) == 0 and store.rows == []
+
+
+def test_stored_result_only_matches_the_media_and_score_it_was_computed_for():
+    media_id = uuid.uuid4()
+    stored = {"vibe_score": 72, "media_id": str(media_id), "data": {}}
+    assert SocialGraphResultStore.matches(stored, media_id, 72)
+    assert not SocialGraphResultStore.matches(stored, uuid.uuid4(), 72)  # new upload, same score
+    assert not SocialGraphResultStore.matches(stored, media_id, 73)
+    assert not SocialGraphResultStore.matches({"vibe_score": 72, "media_id": None, "data": {}}, media_id, 72)
+    assert not SocialGraphResultStore.matches(None, media_id, 72)
@@ -0,0 +1,94 @@
+"""
+The SSE routes in mock mode: event order, the error event, and `done` closing every stream.
+DB access (session_scope / latest_media / metadata writes) is replaced by recorders.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import json
+from contextlib import contextmanager
+from types import SimpleNamespace
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.api.routes import fixit, full_chain, vibe_compare
+
+
+def _events(response):
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for frame in response.text.split("\n\n"):
+        if not frame.strip():
+            continue
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def client(monkeypatch):
+    writes = []
+    state = {"latest": SimpleNamespace(id=42), "profiles": {}}
+
+    @contextmanager
+    def session_scope():
+        yield object()
+
+    for module in (full_chain, fixit):
+        monkeypatch.setattr(module, "session_scope", session_scope)
+        monkeypatch.setattr(module, "latest_media", lambda db, user_id: state["latest"])
+        monkeypatch.setattr(module, "_update_media_metadata", lambda db, mid, data: writes.append((mid, sorted(data))))
+    monkeypatch.setattr(vibe_compare, "session_scope", session_scope)
+    monkeypatch.setattr(vibe_compare, "PerceptionAggregator", lambda db: SimpleNamespace(
+        build_profile=lambda mid: state["profiles"].get(mid, {"summaries": {"face": f"media {mid}"}})))
+
+    app = FastAPI()
+    for module in (full_chain, fixit, vibe_compare):
+        app.include_router(module.router)
+    return TestClient(app), writes, state
+
+
+def test_full_analysis_stream_sends_each_step_then_done(client):
+    c, writes, _ = client
+    assert c.get("/full-analysis/stream", params={"user_id": 1}).status_code == 405  # POST like /full-analysis
+
+    events = _events(c.post("/full-analysis/stream", params={"user_id": 1}))
+    assert [e for e, _ in events] == ["fixit_suggestions", "reverse_analysis", "vibe_analysis", "done"]
+    assert writes == [(42, ["fixit_suggestions"]), (42, ["reverse_analysis"]), (42, ["vibe_analysis"])]
+    assert events[1][1]["goal"].startswith("Improve in areas:")
+
+
+def test_full_analysis_stream_reports_missing_media_as_error_event(client):
+    c, writes, state = client
+    state["latest"] = None
+    events = _events(c.post("/full-analysis/stream", params={"user_id": 1}))
+    assert events == [("error", {"detail": "No media found for this user."}), ("done", {})]
+    assert writes == []
+
+
+def test_fixit_stream(client):
+    c, writes, _ = client
+    events = _events(c.get("/fixit-suggestions/stream", params={"user_id": 1}))
+    assert [e for e, _ in events] == ["fixit_suggestions", "done"]
+
+    events = _events(c.get("/fixit-suggestions/stream", params={"user_id": 1, "with_reverse_analysis": True}))
+    assert [e for e, _ in events] == ["fixit_suggestions", "reverse_analysis", "done"]
+    assert events[1][1]["recommended_changes"]
+    assert writes[-1] == (42, ["reverse_analysis"])
+
+
+def test_vibe_comparison_stream(client):
+    c, _, _ = client
+    events = _events(c.get("/vibe-comparison/stream", params={"media_id_1": 1, "media_id_2": 2}))
+    assert [e for e, _ in events] == ["profile", "profile", "comparison", "done"]
+    assert [d["media_id"] for e, d in events[:2]] == [1, 2]
+    assert events[2][1]["better_media_id"] == 1
+
+
+def test_vibe_comparison_stream_stops_at_missing_media(client):
+    c, _, state = client
+    state["profiles"][2] = {"error": "not found"}
+    events = _events(c.get("/vibe-comparison/stream", params={"media_id_1": 1, "media_id_2": 2}))
+    assert [e for e, _ in events] == ["profile", "error", "done"]
+    assert events[1][1] == {"detail": "Media 2: not found"}
@@ -0,0 +1,133 @@
+import random
+from src.services import tag_index
+from src.services.tag_index import SharedTagIndex, TagIndex
+
+TAGS = ["calm", "warm", "bold", "funny", "stylish", "quiet", "sporty", "nerdy", "artsy", "chic"]
+
+
+def _jaccard(a, b):
+    sa, sb = set(a), set(b)
+    if not sa and not sb:
+        return 0.0
+    return len(sa & sb) / len(sa | sb)
+
+
+def _full_sort(me_score, me_tags, candidates):
+    """The original score-everyone-and-sort ranking."""
+    def sim(u):
+        return 0.7 * _jaccard(me_tags, u["tags"]) + 0.3 * max(0.0, 1.0 - (abs(me_score - u["score"]) / 100.0))
+
+    def comp(u):
+        return (1.0 - _jaccard(me_tags, u["tags"])) * 0.7 + max(0.0, 1.0 - (abs(me_score - u["score"]) / 20.0)) * 0.3
+
+    return sorted(candidates, key=sim, reverse=True)[:5], sorted(candidates, key=comp, reverse=True)[:5]
+
+
+def _population(rng, n):
+    return [
+        {"user_id": f"u{i}", "alias": f"User {i}", "score": rng.randint(0, 100),
+         "tags": rng.sample(TAGS, rng.randint(0, 3)), "media_id": f"m{i}"}
+        for i in range(n)
+    ]
+
+
+def _ids(users):
+    return [u["user_id"] for u in users]
+
+
+def test_matches_full_sort_including_ties():
+    rng = random.Random(11)
+    for n in (0, 3, 40, 600):
+        users = _population(rng, n)
+        index = TagIndex.from_entries(users)
+        for _ in range(25):
+            me_score, me_tags = rng.randint(0, 100), rng.sample(TAGS + ["unseen"], rng.randint(0, 3))
+            similar, complementary = _full_sort(me_score, me_tags, users)
+            assert _ids(index.similar(me_score, me_tags)) == _ids(similar)
+            assert _ids(index.complementary(me_score, me_tags)) == _ids(complementary)
+
+
+def test_upsert_and_remove_keep_rankings_exact():
+    rng = random.Random(5)
+    users = _population(rng, 300)
+    index = TagIndex.from_entries(users)
+
+    users[10] = {**users[10], "score": 55, "tags": ["calm", "chic"]}
+    index.upsert(users[10])
+    index.remove("u20")
+    remaining = [u for u in users if u["user_id"] != "u20"]
+    assert len(index) == 299 and "u20" not in index
+    assert index.get("u10")["tags"] == ["calm", "chic"]
+
+    similar, complementary = _full_sort(55, ["calm", "chic"], [u for u in remaining if u["user_id"] != "u10"])
+    assert _ids(index.similar(55, ["calm", "chic"], exclude_user_id="u10")) == _ids(similar)
+    assert _ids(index.complementary(55, ["calm", "chic"], exclude_user_id="u10")) == _ids(complementary)
+
+
+def test_bitsets_grow_past_one_word():
+    index = TagIndex.from_entries(
+        {"user_id": f"u{i}", "score": 50, "tags": [f"t{i}", f"t{i + 1}"]} for i in range(100)
+    )
+    assert _ids(index.similar(50, ["t70", "t71"])[:1]) == ["u70"]
+
+
+def test_complementary_fills_from_far_buckets_in_row_order():
+    users = [{"user_id": f"u{i}", "score": s, "tags": ["calm"] if i % 3 == 0 else []}
+             for i, s in enumerate([5, 95, 10, 90, 0, 100, 48, 52, 30, 70])]
+    index = TagIndex.from_entries(users)
+    for me_score in (0, 50, 100):
+        _, complementary = _full_sort(me_score, ["calm"], [u for u in users if u["user_id"] != "u1"])
+        assert _ids(index.complementary(me_score, ["calm"], exclude_user_id="u1")) == _ids(complementary)
+
+
+def _shared(version, apply_changes=None, loads=None):
+    def load():
+        loads.append(version)
+        return [{"user_id": "u1", "score": 40, "tags": ["calm"]}]
+    return SharedTagIndex.get(load, version=version, apply_changes=apply_changes)
+
+
+def test_shared_index_applies_changes_instead_of_reloading(monkeypatch):
+    SharedTagIndex.reset()
+    loads, applied = [], []
+
+    def apply_changes(index, since):
+        applied.append(since)
+        index.upsert({"user_id": "u2", "score": 70, "tags": ["bold"]})
+        return 9
+
+    index = _shared(3, apply_changes, loads)
+    patched = _shared(9, apply_changes, loads)
+    assert loads == [3] and applied == [3] and "u2" in patched
+    assert "u2" not in index  # a copy was patched; the snapshot callers hold is unchanged
+    assert _shared(9, apply_changes, loads) is patched and applied == [3]  # caught up
+
+    # A gap in the change log falls back to a (throttled) full reload
+    monkeypatch.setattr(tag_index, "TAG_INDEX_MIN_REFRESH_SECONDS", -1)
+    reloaded = _shared(12, lambda index, since: None, loads)
+    assert reloaded is not patched and loads == [3, 12] and "u2" not in reloaded
+
+    # Past the max age it is reloaded even if changes could be applied
+    monkeypatch.setattr(tag_index, "TAG_INDEX_MAX_AGE_SECONDS", -1)
+    assert _shared(13, apply_changes, loads) is not reloaded and loads == [3, 12, 13]
+    SharedTagIndex.reset()
+
+
+def test_shared_index_serves_the_current_snapshot_while_another_thread_refreshes():
+    SharedTagIndex.reset()
+    loads = []
+    index = _shared(3, loads=loads)
+    with SharedTagIndex._refresh_lock:  # a refresh is in progress elsewhere
+        assert _shared(4, lambda index, since: 4, loads) is index
+    assert loads == [3]
+    SharedTagIndex.reset()
+
+
+def test_copy_is_independent():
+    index = TagIndex.from_entries([{"user_id": "u1", "score": 40, "tags": ["calm"]}])
+    other = index.copy()
+    other.upsert({"user_id": "u1", "score": 90, "tags": ["bold"]})
+    other.upsert({"user_id": "u2", "score": 41, "tags": ["calm"]})
+    assert index.get("u1")["score"] == 40 and "u2" not in index
+    assert _ids(index.similar(40, ["calm"])) == ["u1"]
+    assert _ids(other.similar(40, ["calm"])) == ["u2", "u1"]
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from src.services import trending
+
+
+def test_linear_matches_feed_formula_bucketed():
+    now = datetime(2025, 6, 1, 12, 0)
+    score = trending.trending_score(80, now - timedelta(hours=10), now)
+    assert score == round((80 + (100 - 10) * 0.1) / trending.TRENDING_BUCKET) * trending.TRENDING_BUCKET
+
+
+def test_exponential_decay_and_window(monkeypatch):
+    now = datetime(2025, 6, 1, 12, 0)
+    monkeypatch.setattr(trending, "TRENDING_DECAY", "exponential")
+    monkeypatch.setattr(trending, "TRENDING_HALF_LIFE_HOURS", 24.0)
+    monkeypatch.setattr(trending, "TRENDING_BUCKET", 1.0)
+    assert trending.trending_score(80, now, now) == 80
+    assert trending.trending_score(80, now - timedelta(hours=24), now) == 40
+    assert trending.trending_score(80, now - timedelta(days=trending.TRENDING_WINDOW_DAYS + 1), now) is None
+    assert trending.trending_score(None, now, now) is None
+
+
+class _TrendingDB:
+    """Serves the id batches and records each UPDATE with its parameters."""
+    def __init__(self, ids, expired=3):
+        self.ids, self.expired, self.updates, self.commits = sorted(ids), expired, [], 0
+
+    def execute(self, stmt, params):
+        sql = " ".join(str(stmt).split())
+        if sql.startswith("SELECT id FROM media"):
+            after = params["after"]
+            batch = [i for i in self.ids if after is None or i > after][:params["n"]]
+            return SimpleNamespace(scalars=lambda: batch)
+        self.updates.append((sql, params))
+        return SimpleNamespace(rowcount=len(params["ids"]) if "ids" in params else self.expired)
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_refresh_updates_in_id_batches_then_expires(monkeypatch):
+    monkeypatch.setattr(trending, "TRENDING_DECAY", "linear")
+    now = datetime(2025, 6, 1, 12, 0)
+    ids = [f"{i:08d}-0000-0000-0000-000000000000" for i in range(5)]
+    db = _TrendingDB(ids)
+
+    assert trending.refresh_trending_scores(db, batch_size=2, now=now) == {"updated": 5, "expired": 3}
+    batches = [params["ids"] for sql, params in db.updates[:-1]]
+    assert batches == [ids[0:2], ids[2:4], ids[4:]]
+    assert db.commits == 4  # one per batch, then the expiry
+
+    sql, params = db.updates[0]
+    assert "IS DISTINCT FROM s.score" in sql and "(100 - GREATEST(0," in sql and ":weight" in sql
+    assert params["now"] == now and params["cutoff"] == now - timedelta(days=trending.TRENDING_WINDOW_DAYS)
+    sql, params = db.updates[-1]
+    assert sql.startswith("UPDATE media SET trending_score = NULL") and params == {"cutoff": now - timedelta(days=trending.TRENDING_WINDOW_DAYS)}
+
+
+def test_refresh_uses_the_configured_decay(monkeypatch):
+    monkeypatch.setattr(trending, "TRENDING_DECAY", "exponential")
+    db = _TrendingDB(["00000000-0000-0000-0000-000000000000"])
+    trending.refresh_trending_scores(db, now=datetime(2025, 6, 1))
+    assert "power(0.5," in db.updates[0][0] and ":half_life" in db.updates[0][0]